@@ -1,4 +1,6 @@
 # app/__init__.py
+from functools import partial
+
 from flask import Flask
 
 def create_app():
@@ -7,8 +9,57 @@ def create_app():
     # Register Blueprints (we’ll create a blueprint in routes.py)
     from app.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
+    from app.api import api as api_blueprint
+    app.register_blueprint(api_blueprint)
     
+    # Bring the SQLite schema up to date before anything reads it
+    from app.database import migrate, release_connection
+    migrate()
+    # Each request hands its SQLite connection back to the pool when it ends
+    app.teardown_request(lambda error=None: release_connection())
+
+    # Genres are reference data: loaded from SQLite, then refreshed in the background
+    from app.genres import init_genres, genre_names, refresh as refresh_genres, REFRESH_INTERVAL
+    genres_loaded = init_genres()
+
+    # Background jobs: the app serves whatever SQLite holds right away, the import runs behind it
+    from app.scheduler import scheduler, ENABLED as SCHEDULER_ENABLED
+    from app.models import fill_db_from_tmdb, SYNC_INTERVAL
+    from app.warming import warmer, GENRES_INTERVAL
+    scheduler.add("media_sync", partial(fill_db_from_tmdb, incremental=True), SYNC_INTERVAL, shared=True)
+    scheduler.add("genres", refresh_genres, REFRESH_INTERVAL, first_run=None if genres_loaded else 0)
+    if warmer.rate > 0:
+        # Prefetch of the first pages of every genre (what users browse next is queued by the routes)
+        scheduler.add("genre_warming", warmer.warm_genres, GENRES_INTERVAL, first_run=0)
+    if SCHEDULER_ENABLED:
+        # Started by the first request a process serves, not here: the reloader's parent process,
+        # CLI commands and scripts calling create_app() never serve one, so they never run the jobs
+        app.before_request(scheduler.start)
+
+    # Request timings and the /metrics endpoint (Prometheus format)
+    from app.metrics import init_metrics
+    init_metrics(app)
+
     # Optionally add any global jinja2 functions
-    app.jinja_env.globals.update({'max': max, 'min': min})
+    from app.images import image_url, image_srcset
+    app.jinja_env.globals.update({'max': max, 'min': min, 'genre_names': genre_names,
+                                  'image_url': image_url, 'image_srcset': image_srcset})
     
+    @app.cli.command("run-scheduler")
+    def run_scheduler():
+        """Run the background jobs in this process, e.g. beside web workers started with SCHEDULER_ENABLED=0."""
+        scheduler.run()
+
+    @app.cli.command("check-plans")
+    def check_plans():
+        """Fail if a hot query of models.py falls back to a table scan."""
+        from app.database import check_query_plans, QueryPlanError
+        from app.models import hot_queries
+        try:
+            check_query_plans(hot_queries())
+        except QueryPlanError as e:
+            print(e)
+            raise SystemExit(1)
+        print("All hot queries use an index.")
+
     return app
@@ -0,0 +1,228 @@
+# app/api.py
+import base64
+import gzip
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Blueprint, make_response, request
+from werkzeug.exceptions import BadRequest
+
+from app.tmdb import get_movies, get_tv_shows, get_movie_detail, get_tv_show_detail, IMAGE_BASE_URL
+from app.models import fetch_medias_page, search_medias, fetch_media, iter_towatchs, towatch_version
+from app.warming import warmer
+from app.metrics import count_fallback
+from app.pagecache import cached_page, limit_page_ttl, LISTING_TTL, SEARCH_TTL, NOW_PLAYING_TTL, DETAIL_TTL, FALLBACK_TTL
+
+# Dépendances optionnelles : sérialisation et compression plus rapides si elles sont installées
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Arguments de requête lus par les listes de l'API (clé du cache de pages)
+LISTING_ARGS = ('cursor', 'query', 'genre_id', 'fields')
+# En dessous, compresser coûte plus que ça ne fait gagner
+MIN_COMPRESS_SIZE = 512
+# Niveaux rapides : au-delà, le gain de taille ne paie plus le temps CPU
+GZIP_LEVEL = 3
+BROTLI_QUALITY = 4
+# Corps compressés gardés par (ETag, encodage), pour ne pas recompresser une page servie depuis le cache
+COMPRESSED_ITEMS = 512
+
+_compressed = OrderedDict()
+_compressed_lock = threading.Lock()
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def json_response(obj, status=200):
+    return make_response(dumps(obj), status, {"Content-Type": "application/json"})
+
+
+def encode_api_cursor(source, position):
+    """Opaque cursor: a TMDB page number, or a cursor of the local catalogue."""
+    raw = json.dumps([source, position], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_api_cursor(cursor):
+    """Returns (source, position), (None, None) without a cursor. Raises BadRequest if it is invalid."""
+    if not cursor:
+        return None, None
+    try:
+        source, position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise BadRequest("invalid cursor") from None
+    if not (source == "tmdb" and isinstance(position, int) and position >= 1
+            or source == "local" and isinstance(position, str)):
+        raise BadRequest("invalid cursor")
+    return source, position
+
+
+def requested_fields():
+    """Sparse fieldset from ?fields=a,b,c, or None for every field."""
+    fields = request.args.get('fields', '')
+    return [field for field in (name.strip() for name in fields.split(',')) if field] or None
+
+
+def project(item, fields):
+    if fields is None:
+        return item
+    return {field: item[field] for field in fields if field in item}
+
+
+def local_item(media):
+    """A Media record of the local catalogue with the keys of the TMDB items."""
+    item = media.to_dict()
+    item["name"] = item["title"]
+    item["original_name"] = item["original_title"]
+    item["poster_url"] = f"{IMAGE_BASE_URL}{item['poster_path']}" if item["poster_path"] else None
+    return item
+
+
+def listing(media_type, now_playing=False):
+    """One page of a TMDB listing, or of the local catalogue when TMDB returns nothing."""
+    query = request.args.get('query', '').strip()
+    genre_id = request.args.get('genre_id', None, type=int)
+    fields = requested_fields()
+    source, position = decode_api_cursor(request.args.get('cursor'))
+
+    if source != "local":
+        page = position or 1
+        if media_type == "movie":
+            data = get_movies(search=query, page=page, genre_id=genre_id, now_playing=now_playing)
+        else:
+            data = get_tv_shows(search=query, page=page, genre_id=genre_id)
+        warmer.after_listing(media_type, data, page=page, query=query, genre_id=genre_id, now_playing=now_playing)
+        if data.get("results"):
+            return {
+                "source": "tmdb",
+                "results": [project(item, fields) for item in data["results"]],
+                "next_cursor": encode_api_cursor("tmdb", page + 1) if page < data.get("total_pages", 0) else None,
+                "prev_cursor": encode_api_cursor("tmdb", page - 1) if page > 1 else None,
+            }
+
+    # TMDB indisponible (ou sans résultat) : catalogue local, depuis le début si le curseur venait de TMDB
+    limit_page_ttl(FALLBACK_TTL)
+    count_fallback("listing")
+    cursor = position if source == "local" else None
+    if query:
+        data = search_medias(query, media_type, cursor=cursor, now_playing=now_playing, genre_id=genre_id)
+    else:
+        data = fetch_medias_page(media_type, cursor=cursor, now_playing=now_playing, genre_id=genre_id)
+    return {
+        "source": "local",
+        "results": [project(local_item(media), fields) for media in data["results"]],
+        "next_cursor": data["next_cursor"] and encode_api_cursor("local", data["next_cursor"]),
+        "prev_cursor": data["prev_cursor"] and encode_api_cursor("local", data["prev_cursor"]),
+    }
+
+
+def detail(id, loader):
+    doc = loader(id)
+    if doc.get("id"):
+        return json_response(project(doc, requested_fields()))
+    limit_page_ttl(FALLBACK_TTL)
+    count_fallback("detail")
+    media = fetch_media(id)
+    if media is None:
+        return json_response({"error": "not found"}, 404)
+    return json_response(project(local_item(media), requested_fields()))
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return json_response({"error": error.description}, 400)
+
+
+@api.after_request
+def compress(response):
+    """gzip or brotli, as negotiated by Accept-Encoding."""
+    response.vary.add("Accept-Encoding")
+    if (response.status_code != 200 or response.direct_passthrough or "Content-Encoding" in response.headers
+            or response.content_length is None or response.content_length < MIN_COMPRESS_SIZE):
+        return response
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        encoding = "br"
+    elif accepted["gzip"]:
+        encoding = "gzip"
+    else:
+        return response
+
+    etag, weak = response.get_etag()
+    body = compressed_body(response.get_data(), encoding, etag)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    # Same validator for every encoding: weak, like compressing proxies do
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def compressed_body(body, encoding, etag=None):
+    """Compress body, reusing the result for a body already compressed under the same ETag."""
+    key = (etag, encoding)
+    if etag:
+        with _compressed_lock:
+            if key in _compressed:
+                _compressed.move_to_end(key)
+                return _compressed[key]
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, GZIP_LEVEL)
+    if etag:
+        with _compressed_lock:
+            _compressed[key] = compressed
+            while len(_compressed) > COMPRESSED_ITEMS:
+                _compressed.popitem(last=False)
+    return compressed
+
+
+@api.route('/movies')
+@cached_page(LISTING_TTL, args=LISTING_ARGS, search_ttl=SEARCH_TTL)
+def movies():
+    return json_response(listing("movie"))
+
+
+@api.route('/now-playing')
+@cached_page(NOW_PLAYING_TTL, args=LISTING_ARGS)
+def now_playing():
+    return json_response(listing("movie", now_playing=True))
+
+
+@api.route('/tv-shows')
+@cached_page(LISTING_TTL, args=LISTING_ARGS, search_ttl=SEARCH_TTL)
+def tv_shows():
+    return json_response(listing("tv"))
+
+
+@api.route('/movie/<int:movie_id>')
+@cached_page(DETAIL_TTL, args=('fields',))
+def movie_detail(movie_id):
+    return detail(movie_id, get_movie_detail)
+
+
+@api.route('/tv/<int:tv_id>')
+@cached_page(DETAIL_TTL, args=('fields',))
+def tv_detail(tv_id):
+    return detail(tv_id, get_tv_show_detail)
+
+
+@api.route('/to-watch')
+@cached_page(DETAIL_TTL, args=('fields',), version=towatch_version)
+def towatch():
+    fields = requested_fields()
+    return json_response({"results": [project(local_item(media), fields) for media in iter_towatchs()]})
@@ -0,0 +1,133 @@
+# app/breaker.py
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+WINDOW = int(os.environ.get("TMDB_BREAKER_WINDOW", 20))
+MIN_CALLS = int(os.environ.get("TMDB_BREAKER_MIN_CALLS", 5))
+FAILURE_RATIO = float(os.environ.get("TMDB_BREAKER_FAILURE_RATIO", 0.5))
+SLOW_CALL = float(os.environ.get("TMDB_BREAKER_SLOW_CALL", 3))
+OPEN_SECONDS = float(os.environ.get("TMDB_BREAKER_OPEN_SECONDS", 30))
+PROBES = int(os.environ.get("TMDB_BREAKER_PROBES", 3))
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    Closed: calls go through and their outcome is kept in a rolling window.
+    A call counts as failed when it errors or takes longer than slow_call.
+    Once the window holds min_calls outcomes with failure_ratio or more
+    failures, the circuit opens and calls are refused for open_seconds.
+    Then it turns half-open and lets `probes` calls through: all of them
+    succeeding closes it, any failure opens it again.
+
+    allow() hands out the breaker's generation, which changes with every
+    state change, and record() ignores outcomes of an older generation: a
+    slow call let through while closed and finishing after the circuit
+    opened is not taken for a probe.
+    """
+
+    def __init__(self, name, window=WINDOW, min_calls=MIN_CALLS, failure_ratio=FAILURE_RATIO,
+                 slow_call=SLOW_CALL, open_seconds=OPEN_SECONDS, probes=PROBES):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = CLOSED
+        self.opened_at = None
+        self.generation = 1
+        self._outcomes = deque(maxlen=window)  # (failed, duration)
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns the current generation (truthy) if a call may be made now, else None.
+
+        Every allowed call must be followed by record() with that generation.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    return None
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes_started >= self.probes:
+                    return None
+                self._probes_started += 1
+            return self.generation
+
+    def record(self, success, duration, generation):
+        failed = not success or duration > self.slow_call
+        with self._lock:
+            if generation != self.generation:
+                # Allowed before the last state change: says nothing about the current state
+                return
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._transition(OPEN)
+                else:
+                    self._probes_succeeded += 1
+                    if self._probes_succeeded >= self.probes:
+                        self._transition(CLOSED)
+                return
+
+            self._outcomes.append((failed, duration))
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for outcome in self._outcomes if outcome[0])
+                if failures / len(self._outcomes) >= self.failure_ratio:
+                    self._transition(OPEN)
+
+    def _transition(self, state):
+        previous, self.state = self.state, state
+        self.generation += 1
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state in (OPEN, HALF_OPEN):
+            self._probes_started = 0
+            self._probes_succeeded = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        transitions.append({"time": time.time(), "endpoint": self.name, "from": previous, "to": state})
+        print(f"Circuit breaker for {self.name}: {previous} -> {state}")
+
+    def snapshot(self):
+        with self._lock:
+            outcomes = list(self._outcomes)
+        failures = sum(1 for outcome in outcomes if outcome[0])
+        return {
+            "state": self.state,
+            "calls": len(outcomes),
+            "error_rate": failures / len(outcomes) if outcomes else 0.0,
+            "avg_latency": sum(outcome[1] for outcome in outcomes) / len(outcomes) if outcomes else 0.0,
+        }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+transitions = deque(maxlen=100)
+
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_states():
+    """Current state of every breaker plus the most recent state changes."""
+    return {
+        "endpoints": {name: breaker.snapshot() for name, breaker in list(_breakers.items())},
+        "transitions": list(transitions),
+    }
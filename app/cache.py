@@ -0,0 +1,146 @@
+# app/cache.py
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Durées de vie par endpoint (secondes), la première règle qui correspond l'emporte
+DEFAULT_TTL_RULES = [
+    (r"^/genre/[^/]+/list$", 24 * 3600),
+    (r"/changes$", 0),  # flux de modifications : jamais mis en cache
+    (r"^/movie/now_playing$", 60),
+    (r"^/search/", 300),
+    (r"^/discover/", 600),
+    (r"^/(movie|tv)/\d+$", 3600),
+]
+DEFAULT_TTL = 300
+
+
+class ResponseCache:
+    """
+    Bounded read-through cache for raw TMDB response bodies.
+
+    Entries are evicted least-recently-used first once the total size of the
+    stored bodies exceeds max_bytes. An entry past its TTL is still served
+    for stale_factor * ttl more seconds while a background refresh runs.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_rules=None, default_ttl=DEFAULT_TTL, stale_factor=1.0):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stale_factor = stale_factor
+        self.ttl_rules = [(re.compile(pattern), ttl) for pattern, ttl in (ttl_rules or DEFAULT_TTL_RULES)]
+        self._entries = OrderedDict()  # key -> (body, size, fresh_until, stale_until)
+        self._size = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def make_key(endpoint, params):
+        """Key on (endpoint, language, params) with params sorted and stringified."""
+        language = params.get("language")
+        normalized = tuple(sorted((str(k), str(v)) for k, v in params.items() if k != "language" and v is not None))
+        return (endpoint, language, normalized)
+
+    def ttl_for(self, endpoint):
+        for pattern, ttl in self.ttl_rules:
+            if pattern.search(endpoint):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key):
+        """Returns (body, state) where state is "fresh", "stale" or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            body, size, fresh_until, stale_until = entry
+            if now >= stale_until:
+                self._drop(key)
+                self.misses += 1
+                return None, None
+            self._entries.move_to_end(key)
+            if now < fresh_until:
+                self.hits += 1
+                return body, "fresh"
+            self.stale_hits += 1
+            return body, "stale"
+
+    def set(self, key, body, ttl=None):
+        if ttl is None:
+            ttl = self.ttl_for(key[0])
+        size = len(body)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (body, size, now + ttl, now + ttl * (1 + self.stale_factor))
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def refresh_in_background(self, key, loader):
+        """Re-run loader for a stale key in a daemon thread, at most once at a time per key."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            body = None
+            try:
+                body = loader()
+                if body is not None:
+                    self.set(key, body)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+                    if body is not None:
+                        self.refreshes += 1
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._size = 0
+            elif key in self._entries:
+                self._drop(key)
+
+    def _drop(self, key):
+        body, size, _, _ = self._entries.pop(key)
+        self._size -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache(
+    max_bytes=int(os.environ.get("TMDB_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    stale_factor=float(os.environ.get("TMDB_CACHE_STALE_FACTOR", 1.0)),
+)
@@ -1,35 +1,194 @@
 # app/database.py
 
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from app import metrics
+
+DB_PATH = os.environ.get("DB_PATH", "database.db")
+
+# Taille du cache de requêtes préparées de chaque connexion (sqlite3 le gère en LRU)
+STATEMENT_CACHE_SIZE = 256
+
+# Pragmas appliqués à l'ouverture de chaque connexion
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",       # readers are never blocked by the importer's writes
+    "PRAGMA synchronous = NORMAL",     # safe with WAL, one fsync per checkpoint instead of per commit
+    "PRAGMA cache_size = -20000",      # ~20 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # map up to 256 MB of the file
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 10000",
+)
+
+# Connexions inactives gardées entre deux requêtes (au-delà, une connexion rendue est fermée)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+
+_local = threading.local()
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """Cursor reporting the execution time of each statement to app.metrics."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - start)
+
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _open():
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=10,
+        isolation_level=None,  # autocommit, transactions are explicit (see transaction())
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+        factory=_TimedConnection if metrics.ENABLED else sqlite3.Connection,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
 
-DB_PATH = "database.db"
 
 def connection():
-    """Returns a new connection to the SQLite database."""
-    return sqlite3.connect(DB_PATH, check_same_thread=False, timeout=10)
+    """
+    Returns this thread's connection to the SQLite database.
 
-def does_db_exist():
-    """Check if the database file exists."""
+    The first call in a thread takes an idle connection from the pool, or
+    opens one. The thread keeps it until release_connection(), so a
+    request runs all its statements on one connection.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            conn = _open()
+        _local.conn = conn
+        _local.depth = 0
+    return conn
+
+
+def release_connection():
+    """
+    Give this thread's connection back to the pool (called at the end of each request).
+
+    Threaded servers start a thread per request: without this, each request
+    would open a new connection and run the pragmas again.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.depth:
+        return
+    _local.conn = None
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
     try:
-        conn = connection()
-        c = conn.cursor()
-        c.execute('''
-            SHOW TABLES
-        ''')
-        tables = c.fetchall()
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def close_connection():
+    """Close this thread's connection and the idle ones (the next call to connection() opens a new one)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
         conn.close()
-        return len(tables) > 0
+        _local.conn = None
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+def _reset_after_fork():
+    # Une connexion SQLite ne doit pas être partagée entre processus
+    global _local, _pool
+    _local = threading.local()
+    _pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def transaction():
+    """
+    Run a block of statements in one transaction on this thread's connection.
+
+    Commits when the block exits normally and rolls back on an exception.
+    Nested calls become savepoints of the outer transaction.
+    """
+    conn = connection()
+    depth = _local.depth
+    if depth == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    else:
+        conn.execute(f"SAVEPOINT sp{depth}")
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth = depth
+        if depth == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO sp{depth}")
+            conn.execute(f"RELEASE sp{depth}")
+        raise
+    _local.depth = depth
+    if depth == 0:
+        conn.execute("COMMIT")
+    else:
+        conn.execute(f"RELEASE sp{depth}")
+
+
+def does_db_exist():
+    """Check if the database tables exist."""
+    try:
+        row = connection().execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'media'"
+        ).fetchone()
+        return row is not None
     except sqlite3.Error:
         return False
 
-def create_db():
-    """Create the database and tables if they do not exist."""
+# ================================================================
+# SCHEMA MIGRATIONS
+# ================================================================
 
-    conn = connection()
-    c = conn.cursor()
-    c.execute("DROP TABLE IF EXISTS media") # This would be replaced with an importing script which would do a comparaison in a real-world scenario
-    c.execute('''
-        CREATE TABLE media (
+# Each migration runs once, in order, in its own transaction; the schema
+# version is stored in PRAGMA user_version. Statements use IF NOT EXISTS so
+# databases created before migrations existed are upgraded in place.
+MIGRATIONS = [
+    (1, "base tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS media (
             media_id INTEGER PRIMARY KEY AUTOINCREMENT,
             id INTEGER,
             media_type TEXT NOT NULL CHECK(media_type IN ('movie', 'tv')),
@@ -40,10 +199,9 @@ def create_db():
             poster_path TEXT,
             vote_average REAL
         )
-    ''')
-    c.execute("DROP TABLE IF EXISTS towatch") # This would be replaced with an importing script which would do a comparaison in a real-world scenario
-    c.execute('''
-        CREATE TABLE towatch (
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS towatch (
             media_id INTEGER PRIMARY KEY AUTOINCREMENT,
             id INTEGER,
             media_type TEXT NOT NULL CHECK(media_type IN ('movie', 'tv')),
@@ -53,7 +211,277 @@ def create_db():
             overview TEXT,
             poster_path TEXT,
             vote_average REAL
-        );
-    ''')
-    conn.commit()
-    conn.close()
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS genre (
+            id INTEGER NOT NULL,
+            media_type TEXT NOT NULL CHECK(media_type IN ('movie', 'tv')),
+            name TEXT NOT NULL,
+            PRIMARY KEY (media_type, id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS sync_queue (
+            id INTEGER NOT NULL,
+            media_type TEXT NOT NULL CHECK(media_type IN ('movie', 'tv')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id, media_type)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (2, "unique keys and lookup indexes", [
+        # Keep the latest copy of duplicated rows before adding the unique keys
+        "DELETE FROM media WHERE media_id NOT IN (SELECT MAX(media_id) FROM media GROUP BY id, media_type)",
+        "DELETE FROM towatch WHERE media_id NOT IN (SELECT MAX(media_id) FROM towatch GROUP BY id, media_type)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS media_id_media_type ON media (id, media_type)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS towatch_id_media_type ON towatch (id, media_type)",
+        "CREATE INDEX IF NOT EXISTS media_type_release_date ON media (media_type, release_date)",
+        "CREATE INDEX IF NOT EXISTS media_type_vote_average ON media (media_type, vote_average)",
+    ]),
+    (3, "popularity sort key for keyset pagination", [
+        "ALTER TABLE media ADD COLUMN popularity REAL NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS media_type_popularity ON media (media_type, popularity, media_id)",
+    ]),
+    (4, "media change log for the suggestion sampler", [
+        '''
+        CREATE TABLE IF NOT EXISTS media_change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            media_id INTEGER NOT NULL,
+            old_type TEXT,
+            old_vote REAL,
+            new_type TEXT,
+            new_vote REAL
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_log_insert AFTER INSERT ON media BEGIN
+            INSERT INTO media_change_log (media_id, new_type, new_vote)
+            VALUES (new.media_id, new.media_type, new.vote_average);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_log_update AFTER UPDATE OF media_type, vote_average ON media
+        WHEN old.media_type IS NOT new.media_type OR old.vote_average IS NOT new.vote_average BEGIN
+            INSERT INTO media_change_log (media_id, old_type, old_vote, new_type, new_vote)
+            VALUES (new.media_id, old.media_type, old.vote_average, new.media_type, new.vote_average);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_log_delete AFTER DELETE ON media BEGIN
+            INSERT INTO media_change_log (media_id, old_type, old_vote)
+            VALUES (old.media_id, old.media_type, old.vote_average);
+        END
+        ''',
+    ]),
+    (5, "full-text search index", [
+        # External content table: the index stores tokens only, the text stays in media
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5(
+            title, original_title, overview,
+            content = 'media',
+            content_rowid = 'media_id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '3 4'
+        )
+        ''',
+        # Titles weigh more than the overview in the ranking
+        "INSERT INTO media_fts (media_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')",
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_fts_insert AFTER INSERT ON media BEGIN
+            INSERT INTO media_fts (rowid, title, original_title, overview)
+            VALUES (new.media_id, new.title, new.original_title, new.overview);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_fts_delete AFTER DELETE ON media BEGIN
+            INSERT INTO media_fts (media_fts, rowid, title, original_title, overview)
+            VALUES ('delete', old.media_id, old.title, old.original_title, old.overview);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_fts_update AFTER UPDATE OF title, original_title, overview ON media
+        WHEN old.title IS NOT new.title OR old.original_title IS NOT new.original_title
+            OR old.overview IS NOT new.overview BEGIN
+            INSERT INTO media_fts (media_fts, rowid, title, original_title, overview)
+            VALUES ('delete', old.media_id, old.title, old.original_title, old.overview);
+            INSERT INTO media_fts (rowid, title, original_title, overview)
+            VALUES (new.media_id, new.title, new.original_title, new.overview);
+        END
+        ''',
+        "INSERT INTO media_fts (media_fts) VALUES ('rebuild')",
+    ]),
+    (6, "genre index on media", [
+        # JSON array of TMDB genre ids, as given by the API
+        "ALTER TABLE media ADD COLUMN genre_ids TEXT",
+        # The primary key is the covering index of genre listings: seek (genre_id, media_type),
+        # then walk popularity like media_type_popularity does for unfiltered listings
+        '''
+        CREATE TABLE IF NOT EXISTS media_genre (
+            genre_id INTEGER NOT NULL,
+            media_type TEXT NOT NULL,
+            popularity REAL NOT NULL,
+            media_id INTEGER NOT NULL,
+            PRIMARY KEY (genre_id, media_type, popularity, media_id)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS media_genre_media_id ON media_genre (media_id, genre_id)",
+        # Triggers keep it in step with media, only touching it when genres, type or popularity change
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_genre_insert AFTER INSERT ON media
+        WHEN new.genre_ids IS NOT NULL BEGIN
+            INSERT OR IGNORE INTO media_genre (genre_id, media_type, popularity, media_id)
+            SELECT value, new.media_type, new.popularity, new.media_id FROM json_each(new.genre_ids);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_genre_update_genres AFTER UPDATE OF genre_ids ON media
+        WHEN old.genre_ids IS NOT new.genre_ids BEGIN
+            DELETE FROM media_genre WHERE media_id = new.media_id;
+            INSERT OR IGNORE INTO media_genre (genre_id, media_type, popularity, media_id)
+            SELECT value, new.media_type, new.popularity, new.media_id FROM json_each(new.genre_ids);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_genre_update AFTER UPDATE OF media_type, popularity ON media
+        WHEN old.media_type IS NOT new.media_type OR old.popularity IS NOT new.popularity BEGIN
+            UPDATE media_genre SET media_type = new.media_type, popularity = new.popularity
+            WHERE media_id = new.media_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS media_genre_delete AFTER DELETE ON media BEGIN
+            DELETE FROM media_genre WHERE media_id = old.media_id;
+        END
+        ''',
+        # Existing rows have no genres yet: the next incremental sync runs a full import instead
+        "DELETE FROM sync_state WHERE key IN ('watermark', 'pending_watermark')",
+    ]),
+    (7, "detail document store", [
+        # zlib-compressed JSON of the full TMDB detail payloads (see app/details.py)
+        '''
+        CREATE TABLE IF NOT EXISTS detail_doc (
+            media_type TEXT NOT NULL CHECK(media_type IN ('movie', 'tv')),
+            id INTEGER NOT NULL,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (media_type, id)
+        )
+        ''',
+        # Eviction order, and the store size summed from the index alone
+        "CREATE INDEX IF NOT EXISTS detail_doc_accessed ON detail_doc (accessed_at, size)",
+    ]),
+    (8, "watchlist version", [
+        # Bumped on every watchlist write, whichever process made it (see app/pagecache.py)
+        "INSERT OR IGNORE INTO sync_state (key, value) VALUES ('towatch_version', 0)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS towatch_version_insert AFTER INSERT ON towatch BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE key = 'towatch_version';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS towatch_version_update AFTER UPDATE ON towatch BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE key = 'towatch_version';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS towatch_version_delete AFTER DELETE ON towatch BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE key = 'towatch_version';
+        END
+        ''',
+    ]),
+    (9, "watchlist idempotency keys", [
+        # Outcome of each client write, so a replayed batch item is answered without being applied twice
+        '''
+        CREATE TABLE IF NOT EXISTS towatch_request (
+            key TEXT PRIMARY KEY,
+            id INTEGER NOT NULL,
+            media_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS towatch_request_created_at ON towatch_request (created_at)",
+    ]),
+    (10, "background job state", [
+        # Last runs of the scheduler jobs (see app/scheduler.py); the lease keeps one process per shared job
+        '''
+        CREATE TABLE IF NOT EXISTS job_state (
+            name TEXT PRIMARY KEY,
+            last_started_at REAL,
+            last_finished_at REAL,
+            last_success_at REAL,
+            last_status TEXT,
+            last_error TEXT,
+            last_result TEXT,
+            last_duration REAL,
+            runs INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            consecutive_failures INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_until REAL
+        )
+        ''',
+    ]),
+]
+
+def schema_version():
+    return connection().execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    """Apply the pending migrations. Returns the schema version."""
+    version = schema_version()
+    for number, name, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        with transaction() as conn:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+        print(f"Database migrated to version {number} ({name}).")
+        version = number
+    return version
+
+def create_db():
+    """Create the database and tables if they do not exist."""
+    migrate()
+
+# ================================================================
+# QUERY PLAN CHECKS
+# ================================================================
+
+class QueryPlanError(Exception):
+    pass
+
+def query_plan(query, params=()):
+    """Returns the EXPLAIN QUERY PLAN detail lines of a query."""
+    return [row[3] for row in connection().execute("EXPLAIN QUERY PLAN " + query, params).fetchall()]
+
+def check_query_plans(queries):
+    """
+    Fail if any of the given queries reads a table with a full scan.
+
+    Args:
+        queries (list): (name, query, params) tuples
+
+    Raises:
+        QueryPlanError: listing every query whose plan contains a plain "SCAN <table>"
+    """
+    failures = []
+    for name, query, params in queries:
+        for detail in query_plan(query, params):
+            # "SCAN media" is a full table scan, "SCAN media USING INDEX ..." walks an index instead
+            # and "SCAN media_fts VIRTUAL TABLE INDEX ..." is a full-text lookup
+            if (detail.startswith("SCAN ") and "USING" not in detail and "CONSTANT ROW" not in detail
+                    and "VIRTUAL TABLE" not in detail):
+                failures.append(f"{name}: {detail}")
+    if failures:
+        raise QueryPlanError("Queries falling back to a table scan:\n" + "\n".join(failures))
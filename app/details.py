@@ -0,0 +1,205 @@
+# app/details.py
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from app.database import connection, transaction
+
+# Âge au-delà duquel une fiche est encore servie mais rafraîchie en arrière-plan
+MAX_AGE = int(os.environ.get("DETAIL_MAX_AGE", 24 * 3600))
+MEMORY_ITEMS = int(os.environ.get("DETAIL_MEMORY_ITEMS", 256))
+# Durée pendant laquelle la copie en mémoire est servie sans relire la base
+MEMORY_SECONDS = 300
+STORE_MAX_BYTES = int(os.environ.get("DETAIL_STORE_MAX_BYTES", 256 * 1024 * 1024))
+COMPRESSION_LEVEL = 6
+# accessed_at n'est réécrit qu'une fois par intervalle, pour ne pas écrire à chaque lecture
+TOUCH_INTERVAL = 3600
+
+
+class DetailStore:
+    """
+    Compressed store of full movie and TV detail documents, in front of TMDB.
+
+    Reads go to a small in-memory LRU, then to the detail_doc table (zlib
+    compressed JSON with fetch and access times), then upstream. A stored
+    document older than max_age is still returned while a background
+    refresh fetches a new one, so detail pages render fully whether or not
+    TMDB answers. Once the table holds more than max_bytes of compressed
+    documents, the least recently read ones are evicted. The size of the
+    table is kept as a running total, read once and then adjusted on every
+    write, and recounted exactly when it goes over budget (other workers
+    write to the same table).
+
+    Returned documents are shared between requests and must not be modified.
+    """
+
+    def __init__(self, max_age=MAX_AGE, memory_items=MEMORY_ITEMS, max_bytes=STORE_MAX_BYTES):
+        self.max_age = max_age
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()  # (media_type, id) -> (doc, fetched_at, loaded_at)
+        self._refreshing = set()
+        self._bytes = None  # taille compressée de la table, lue une fois puis tenue à jour
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.upstream = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def get(self, media_type, id, loader):
+        """
+        Returns the detail document of a movie or TV show.
+
+        Args:
+            loader (callable): fetches the normalized document from TMDB; a
+                result without an "id" (an error) is returned as is and not stored
+        """
+        key = (media_type, id)
+        entry = self._from_memory(key)
+        if entry is None:
+            entry = self._read(key)
+            if entry is not None:
+                self.store_hits += 1
+                self._remember(key, *entry)
+        else:
+            self.memory_hits += 1
+
+        if entry is None:
+            self.upstream += 1
+            doc = loader()
+            if doc.get("id"):
+                self.put(media_type, id, doc)
+            return doc
+
+        doc, fetched_at = entry
+        if time.time() - fetched_at > self.max_age:
+            self.refresh_in_background(media_type, id, loader)
+        return doc
+
+    def put(self, media_type, id, doc):
+        key = (media_type, id)
+        body = zlib.compress(json.dumps(doc, separators=(",", ":")).encode(), COMPRESSION_LEVEL)
+        now = time.time()
+        exact = None
+        with transaction() as conn:
+            if self._bytes is None:
+                self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM detail_doc").fetchone()[0]
+            row = conn.execute("SELECT size FROM detail_doc WHERE media_type = ? AND id = ?", key).fetchone()
+            conn.execute("""
+                INSERT INTO detail_doc (media_type, id, body, size, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (media_type, id) DO UPDATE SET
+                    body = excluded.body,
+                    size = excluded.size,
+                    fetched_at = excluded.fetched_at,
+                    accessed_at = excluded.accessed_at
+            """, (media_type, id, body, len(body), now, now))
+            delta = len(body) - (row[0] if row else 0)
+            if self._bytes + delta > self.max_bytes:
+                exact = self._evict(conn)
+        with self._lock:
+            self._bytes = exact if exact is not None else self._bytes + delta
+        self._remember(key, doc, now)
+
+    def refresh_in_background(self, media_type, id, loader):
+        """Re-run loader for a stale document in a daemon thread, at most once at a time per document."""
+        key = (media_type, id)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                doc = loader()
+                if doc.get("id"):
+                    self.put(media_type, id, doc)
+                    self.refreshes += 1
+            except Exception as e:
+                print(f"Could not refresh {media_type} {id} details:", e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _from_memory(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            doc, fetched_at, loaded_at = entry
+            if time.monotonic() - loaded_at > MEMORY_SECONDS:
+                # Another process may have refreshed or invalidated the stored copy
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return doc, fetched_at
+
+    def _remember(self, key, doc, fetched_at):
+        with self._lock:
+            self._memory[key] = (doc, fetched_at, time.monotonic())
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _read(self, key):
+        conn = connection()
+        row = conn.execute(
+            "SELECT body, fetched_at, accessed_at FROM detail_doc WHERE media_type = ? AND id = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        body, fetched_at, accessed_at = row
+        now = time.time()
+        if now - accessed_at > TOUCH_INTERVAL:
+            with transaction() as conn:
+                conn.execute("UPDATE detail_doc SET accessed_at = ? WHERE media_type = ? AND id = ?", (now, *key))
+        return json.loads(zlib.decompress(body)), fetched_at
+
+    def _evict(self, conn):
+        """Evict the least recently read documents if the table is over budget. Returns its size after."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM detail_doc").fetchone()[0]
+        if total <= self.max_bytes:
+            return total
+        # Evict down to 90% of the budget so the next inserts do not evict again right away
+        target = total - self.max_bytes * 0.9
+        victims = []
+        for rowid, size in conn.execute("SELECT rowid, size FROM detail_doc ORDER BY accessed_at"):
+            victims.append((rowid,))
+            total -= size
+            target -= size
+            if target <= 0:
+                break
+        conn.executemany("DELETE FROM detail_doc WHERE rowid = ?", victims)
+        self.evictions += len(victims)
+        return total
+
+    def invalidate(self, media_type, id):
+        """Mark a stored document stale: the next read serves it and refreshes it."""
+        with self._lock:
+            self._memory.pop((media_type, id), None)
+        with transaction() as conn:
+            conn.execute("UPDATE detail_doc SET fetched_at = 0 WHERE media_type = ? AND id = ?", (media_type, id))
+
+    def stats(self):
+        row = connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM detail_doc").fetchone()
+        with self._lock:
+            return {
+                "documents": row[0],
+                "bytes": row[1],
+                "max_bytes": self.max_bytes,
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "upstream": self.upstream,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions,
+            }
+
+
+detail_store = DetailStore()
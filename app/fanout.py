@@ -0,0 +1,54 @@
+# app/fanout.py
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from app import transport
+
+# Jamais moins que le budget d'un appel TMDB : un appel lent finit avant qu'on l'abandonne
+DEADLINE = max(float(os.environ.get("TMDB_FANOUT_DEADLINE", transport.CALL_BUDGET + 1)), transport.CALL_BUDGET + 1)
+
+
+def fetch_all(calls, deadline=None, defaults=None):
+    """
+    Run independent fetches concurrently and wait for all of them under one deadline.
+
+    The last call runs in the calling thread (put cheap in-memory reads
+    there), the others on threads of a pool created for this request only:
+    a call left running past the deadline never holds up another request.
+
+    Args:
+        calls (dict): name -> zero-argument callable (use functools.partial for arguments)
+        deadline (float): seconds shared by all the calls, defaults to TMDB_FANOUT_DEADLINE
+        defaults (dict): name -> value returned for a call that failed or timed out
+
+    Returns:
+        dict: name -> result, with the default (or None) for each failed call
+    """
+    defaults = defaults or {}
+    deadline = deadline or DEADLINE
+    *pooled, (inline_name, inline_call) = calls.items()
+    executor = ThreadPoolExecutor(max_workers=len(pooled), thread_name_prefix="tmdb-fanout") if pooled else None
+    futures = {name: executor.submit(call) for name, call in pooled}
+
+    results = {}
+    try:
+        results[inline_name] = inline_call()
+    except Exception as e:
+        print(f"Fetch '{inline_name}' failed:", e)
+        results[inline_name] = defaults.get(inline_name)
+    if executor is None:
+        return results
+
+    done, not_done = wait(futures.values(), timeout=deadline)
+    # The threads of calls past the deadline finish on their own (within the transport's call budget)
+    executor.shutdown(wait=False, cancel_futures=True)
+    for name, future in futures.items():
+        if future in not_done:
+            print(f"Fetch '{name}' missed the {deadline}s deadline.")
+            results[name] = defaults.get(name)
+        elif future.exception() is not None:
+            print(f"Fetch '{name}' failed:", future.exception())
+            results[name] = defaults.get(name)
+        else:
+            results[name] = future.result()
+    return {name: results[name] for name in calls}
@@ -0,0 +1,91 @@
+# app/genres.py
+import os
+import threading
+import time
+
+from app.database import connection, transaction
+
+REFRESH_INTERVAL = int(os.environ.get("GENRE_REFRESH_INTERVAL", 24 * 3600))
+RETRY_INTERVAL = 60
+
+# Listes en mémoire, remplacées d'un bloc à chaque rafraîchissement
+_genres = {"movie": [], "tv": []}
+_names = {"movie": {}, "tv": {}}
+_lock = threading.Lock()
+_last_attempt = 0.0
+
+
+def _set(media_type, genres):
+    global _genres, _names
+    with _lock:
+        _genres = {**_genres, media_type: genres}
+        _names = {**_names, media_type: {genre["id"]: genre["name"] for genre in genres}}
+
+
+def load_from_db():
+    """Load the last known genre lists from SQLite into memory."""
+    conn = connection()
+    for media_type in ("movie", "tv"):
+        rows = conn.execute("SELECT id, name FROM genre WHERE media_type = ? ORDER BY name", (media_type,)).fetchall()
+        _set(media_type, [{"id": row[0], "name": row[1]} for row in rows])
+
+
+def save_to_db(media_type, genres):
+    with transaction() as conn:
+        conn.execute("DELETE FROM genre WHERE media_type = ?", (media_type,))
+        conn.executemany(
+            "INSERT INTO genre (id, media_type, name) VALUES (?, ?, ?)",
+            [(genre["id"], media_type, genre["name"]) for genre in genres],
+        )
+
+
+def refresh():
+    """
+    Fetch both genre lists from TMDB and store them.
+
+    A list that comes back empty (TMDB down) is ignored so the last known
+    one keeps being served. Returns the number of genres stored per media
+    type, or None if both lists failed.
+    """
+    from app.tmdb import get_movie_genres, get_tv_genres
+
+    global _last_attempt
+    _last_attempt = time.monotonic()
+    counts = {}
+    for media_type, fetch in (("movie", get_movie_genres), ("tv", get_tv_genres)):
+        genres = fetch()
+        if genres:
+            genres = sorted(genres, key=lambda genre: genre["name"])
+            save_to_db(media_type, genres)
+            _set(media_type, genres)
+            counts[media_type] = len(genres)
+        else:
+            print(f"Could not refresh {media_type} genres, keeping the last known list.")
+    return counts or None
+
+
+def init_genres():
+    """Load the last known genres at startup. Returns False if a list is still missing (refresh due now)."""
+    load_from_db()
+    return bool(_genres["movie"] and _genres["tv"])
+
+
+def _ensure_loaded(media_type):
+    # Boot pendant une panne TMDB avec une base vide : on retente de temps en temps
+    if not _genres[media_type] and time.monotonic() - _last_attempt > RETRY_INTERVAL:
+        refresh()
+
+
+def movie_genres():
+    _ensure_loaded("movie")
+    return _genres["movie"]
+
+
+def tv_genres():
+    _ensure_loaded("tv")
+    return _genres["tv"]
+
+
+def genre_names(media_type="movie"):
+    """Returns the in-memory id -> name map for a media type."""
+    return _names[media_type]
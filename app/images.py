@@ -0,0 +1,209 @@
+# app/images.py
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+
+from flask import url_for
+
+from app import transport
+from app.breaker import get_breaker
+
+ORIGIN = os.environ.get("TMDB_IMAGE_BASE_URL", "https://image.tmdb.org/t/p")
+CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "image_cache")
+CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Le dernier accès n'est réécrit qu'une fois par intervalle, pour ne pas toucher le disque à chaque image
+TOUCH_INTERVAL = 3600
+
+# Largeurs servies par TMDB pour chaque type d'image : la première est la taille par défaut (src),
+# toutes vont dans le srcset
+VARIANTS = {
+    "poster": ("w342", "w185", "w500"),
+    "backdrop": ("w1280", "w780"),
+    "profile": ("w185",),
+}
+SIZES = {"w92", "w154", "w185", "w342", "w500", "w780", "w1280", "original"}
+# Noms de fichiers TMDB : jamais de chemin, seulement un identifiant et une extension d'image
+FILENAME = re.compile(r"^[A-Za-z0-9_-]+\.(jpg|jpeg|png|webp)$")
+# Un seul disjoncteur pour le serveur d'images : ouvert, la route redirige tout de suite vers l'origine
+BREAKER_LABEL = "/t/p"
+
+
+class ImageCache:
+    """
+    Disk cache of TMDB images, one file per (size, filename).
+
+    An image is downloaded once, whatever the number of concurrent
+    requests for it, then served from disk. TMDB images never change under
+    a given path, so files are kept until evicted: once they take more than
+    max_bytes, the least recently read ones are deleted. The access time of
+    each file (set explicitly, whatever the mount options) is the LRU order,
+    so every worker sharing the directory sees the same one. Downloads go
+    through the image server's circuit breaker: while it is open, get()
+    returns None at once.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, origin=ORIGIN):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.origin = origin
+        self._size = None
+        self._scanning = False
+        self._flights = {}  # (size, filename) -> threading.Lock of the download in progress
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.downloads = 0
+        self.failures = 0
+        self.evictions = 0
+
+    @staticmethod
+    def valid(size, filename):
+        return size in SIZES and FILENAME.match(filename) is not None
+
+    def path(self, size, filename):
+        return os.path.join(self.directory, size, filename)
+
+    def origin_url(self, size, filename):
+        return f"{self.origin}/{size}/{filename}"
+
+    def get(self, size, filename):
+        """Returns the local path of an image, downloading it on first use, or None if the origin failed."""
+        path = self.path(size, filename)
+        if self._touch(path):
+            self.hits += 1
+            return path
+
+        key = (size, filename)
+        with self._lock:
+            flight = self._flights.setdefault(key, threading.Lock())
+        # Single-flight: the other requests for this image wait for the first download
+        with flight:
+            try:
+                if os.path.exists(path):
+                    self.hits += 1
+                    return path
+                return self._download(size, filename, path)
+            finally:
+                with self._lock:
+                    self._flights.pop(key, None)
+
+    def _touch(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        if now - stat.st_atime > TOUCH_INTERVAL:
+            # Keep the mtime: it is the Last-Modified sent to browsers
+            os.utime(path, (now, stat.st_mtime))
+        return True
+
+    def _download(self, size, filename, path):
+        # Circuit open: no download attempt, the request is redirected to the origin without waiting
+        breaker = get_breaker(BREAKER_LABEL)
+        generation = breaker.allow()
+        if generation is None:
+            self.failures += 1
+            return None
+
+        start = time.monotonic()
+        healthy = False
+        try:
+            response = transport.get(self.origin_url(size, filename), f"/images/{size}")
+            healthy = response is not None and response.status_code < 500 and response.status_code != 429
+        finally:
+            breaker.record(healthy, time.monotonic() - start, generation)
+
+        if response is None or response.status_code != 200:
+            self.failures += 1
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name, then renamed: readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".download-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(response.content)
+        os.replace(tmp, path)
+        self.downloads += 1
+        self._added(len(response.content))
+        return path
+
+    def _files(self):
+        """(atime, size, path) of every cached file."""
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for size in os.scandir(self.directory):
+            if not size.is_dir():
+                continue
+            for entry in os.scandir(size.path):
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    files.append((stat.st_atime, stat.st_size, entry.path))
+        return files
+
+    def _added(self, size):
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+                if self._size <= self.max_bytes:
+                    return
+            # One scan at a time; the lock is not held during it, so downloads and stats() never wait on the disk
+            if self._scanning:
+                return
+            self._scanning = True
+        try:
+            # Rescan: other workers share the directory. Evict down to 90% of the budget
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            evicted = 0
+            if total > self.max_bytes:
+                for _, size, path in sorted(files):
+                    if total <= self.max_bytes * 0.9:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    evicted += 1
+            with self._lock:
+                # Files written during the scan may be missed: the next scan counts them
+                self._size = total
+                self.evictions += evicted
+        finally:
+            with self._lock:
+                self._scanning = False
+
+    def mimetype(self, filename):
+        return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    def stats(self):
+        with self._lock:
+            return {
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "downloads": self.downloads,
+                "failures": self.failures,
+                "evictions": self.evictions,
+            }
+
+
+image_cache = ImageCache()
+
+
+def image_url(path, kind="poster", size=None):
+    """URL of a TMDB image (path as given by the API, e.g. /abc.jpg) through the local image route."""
+    if not path:
+        return ""
+    return url_for("main.image", size=size or VARIANTS[kind][0], filename=path.lstrip("/"))
+
+
+def image_srcset(path, kind="poster"):
+    """srcset attribute listing the width variants of an image."""
+    if not path:
+        return ""
+    sizes = sorted(VARIANTS[kind], key=lambda size: int(size[1:]))
+    return ", ".join(f"{image_url(path, kind, size)} {size[1:]}w" for size in sizes)
@@ -0,0 +1,383 @@
+# app/metrics.py
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+# Au-delà de cette durée (secondes), une requête est comptée et journalisée comme lente
+SLOW_SECONDS = float(os.environ.get("METRICS_SLOW_SECONDS", 1.0))
+# Part des requêtes passées sous cProfile (0 = jamais) : seules les lentes gardent leur profil
+PROFILE_RATE = float(os.environ.get("METRICS_PROFILE_RATE", 0))
+PROFILES_KEPT = 20
+PROFILE_LINES = 25
+
+# Bornes des histogrammes en secondes : requêtes HTTP et appels TMDB, puis requêtes SQLite
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+# Libellés de requêtes SQL distincts au plus (le reste est compté sous "other")
+# Le schéma et les pragmas (migrations, ouverture de connexion) ne sont pas chronométrés
+MAX_QUERY_LABELS = 500
+QUERY_LABEL_LENGTH = 120
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one value per label tuple."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, (), value) for labels, value in self._values.items()]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one set of buckets per label tuple."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [count per bucket (+Inf last)..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(counts) for labels, counts in self._values.items()}
+        samples = []
+        for labels, counts in values.items():
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                samples.append((self.name + "_bucket", labels, (("le", _number(bound)),), total))
+            samples.append((self.name + "_sum", labels, (), counts[-1]))
+            samples.append((self.name + "_count", labels, (), total))
+        return samples
+
+
+class Registry:
+    """
+    Metrics of this process, rendered in the Prometheus text format.
+
+    Counters and histograms are updated as things happen. Collectors are
+    functions called at scrape time that read the stats the caches, the
+    breakers and the scheduler already keep, so they cost nothing between
+    two scrapes.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Register func() -> [(name, kind, help, [(labels dict, value), ...]), ...]."""
+        self._collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, extra, value in metric.samples():
+                lines.append(f"{name}{_labels(metric.labelnames, labels, extra)} {_number(value)}")
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Metrics collector {collect.__name__} failed:", e)
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route, method and status.",
+                                 ("endpoint", "method", "status"))
+http_duration = registry.histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                                   ("endpoint", "method"))
+http_slow = registry.counter("http_slow_requests_total", "Requests slower than METRICS_SLOW_SECONDS.",
+                             ("endpoint",))
+tmdb_requests = registry.counter("tmdb_requests_total", "TMDB calls by endpoint and status (error: no response).",
+                                 ("endpoint", "status"))
+tmdb_duration = registry.histogram("tmdb_request_duration_seconds", "TMDB call latency, retries included.",
+                                   ("endpoint",))
+tmdb_bytes = registry.counter("tmdb_response_bytes_total", "Bytes received from TMDB (decoded).", ("endpoint",))
+query_duration = registry.histogram("sqlite_query_duration_seconds",
+                                    "SQLite statement execution time (up to the first row).",
+                                    ("query",), QUERY_BUCKETS)
+fallbacks = registry.counter("app_fallbacks_total", "Pages built from the local database because TMDB failed.",
+                             ("endpoint", "kind"))
+
+_UNTIMED = ("CREATE", "ALTER", "DROP", "PRAGMA")
+_query_labels = {}
+_IN_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def query_label(sql):
+    """Short label of a SQL statement (whitespace collapsed, IN lists folded, truncated), "" for schema statements."""
+    label = _query_labels.get(sql)
+    if label is None:
+        if len(_query_labels) >= MAX_QUERY_LABELS:
+            return "other"
+        label = _IN_LIST.sub("(?...)", _SPACES.sub(" ", sql).strip())[:QUERY_LABEL_LENGTH]
+        if label.upper().startswith(_UNTIMED):
+            label = ""
+        _query_labels[sql] = label
+    return label
+
+
+def observe_query(sql, seconds):
+    if not ENABLED:
+        return
+    label = query_label(sql)
+    if label:
+        query_duration.observe((label,), seconds)
+
+
+def observe_tmdb(endpoint, status, seconds, size):
+    if not ENABLED:
+        return
+    tmdb_requests.inc((endpoint, "error" if status is None else str(status)))
+    tmdb_duration.observe((endpoint,), seconds)
+    if size:
+        tmdb_bytes.inc((endpoint,), size)
+
+
+def count_fallback(kind):
+    """Count a page served from the local database (kind: listing or detail)."""
+    from flask import has_request_context, request
+    fallbacks.inc((request.endpoint if has_request_context() else "none", kind))
+
+
+# ---------------------------------------------------------------- slow requests
+
+slow_profiles = deque(maxlen=PROFILES_KEPT)
+
+
+def _profile_text(profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return out.getvalue()
+
+
+# Un seul profil à la fois : depuis Python 3.12, activer un second profileur lève ValueError
+_profile_lock = threading.Lock()
+
+
+def _before_request():
+    from flask import g
+    g.metrics_start = time.perf_counter()
+    if PROFILE_RATE and random.random() < PROFILE_RATE and _profile_lock.acquire(blocking=False):
+        # Sample skipped while another request (or another tool) is profiling
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            _profile_lock.release()
+        else:
+            g.metrics_profiler = profiler
+
+
+def _after_request(response):
+    from flask import g
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(error=None):
+    from flask import g, request
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    profiler = g.pop("metrics_profiler", None)
+    if profiler is not None:
+        try:
+            profiler.disable()
+        finally:
+            _profile_lock.release()
+    endpoint = request.endpoint or "unmatched"
+    status = g.pop("metrics_status", 500 if error is not None else 200)
+    http_requests.inc((endpoint, request.method, str(status)))
+    http_duration.observe((endpoint, request.method), elapsed)
+    if elapsed >= SLOW_SECONDS:
+        http_slow.inc((endpoint,))
+        print(f"Slow request {request.method} {request.full_path.rstrip('?')}: {elapsed:.3f}s")
+        if profiler is not None:
+            slow_profiles.append({
+                "path": request.full_path.rstrip("?"),
+                "endpoint": endpoint,
+                "seconds": elapsed,
+                "at": time.time(),
+                "profile": _profile_text(profiler),
+            })
+
+
+# ---------------------------------------------------------------- collectors
+
+def _collect_caches():
+    from app.cache import response_cache
+    from app.details import detail_store
+    from app.images import image_cache
+    from app.pagecache import page_cache
+
+    stats = {
+        "page": page_cache.stats(),
+        "response": response_cache.stats(),
+        "detail": detail_store.stats(),
+        "image": image_cache.stats(),
+    }
+    hits = {
+        "page": stats["page"]["hits"],
+        "response": stats["response"]["hits"] + stats["response"]["stale_hits"],
+        "detail": stats["detail"]["memory_hits"] + stats["detail"]["store_hits"],
+        "image": stats["image"]["hits"],
+    }
+    misses = {
+        "page": stats["page"]["misses"],
+        "response": stats["response"]["misses"],
+        "detail": stats["detail"]["upstream"],
+        "image": stats["image"]["downloads"] + stats["image"]["failures"],
+    }
+    ratios = {name: hits[name] / (hits[name] + misses[name]) if hits[name] + misses[name] else 0.0 for name in stats}
+    return [
+        ("cache_hits_total", "counter", "Cache lookups served from the cache.",
+         [({"cache": name}, value) for name, value in hits.items()]),
+        ("cache_misses_total", "counter", "Cache lookups that went to the source.",
+         [({"cache": name}, value) for name, value in misses.items()]),
+        ("cache_hit_ratio", "gauge", "Hits over lookups since the process started.",
+         [({"cache": name}, value) for name, value in ratios.items()]),
+        ("cache_evictions_total", "counter", "Entries evicted to stay under the size budget.",
+         [({"cache": name}, value["evictions"]) for name, value in stats.items()]),
+        ("cache_bytes", "gauge", "Bytes held by the cache.",
+         [({"cache": name}, value["bytes"]) for name, value in stats.items()]),
+        ("cache_max_bytes", "gauge", "Size budget of the cache.",
+         [({"cache": name}, value["max_bytes"]) for name, value in stats.items()]),
+    ]
+
+
+def _collect_tmdb():
+    from app.breaker import breaker_states, CLOSED, OPEN, HALF_OPEN
+    from app.tmdb import get_coalescing_stats
+
+    coalescing = get_coalescing_stats()
+    endpoints = breaker_states()["endpoints"]
+    return [
+        ("tmdb_coalesced_total", "counter", "Calls that waited for an identical call in flight.",
+         [({}, coalescing["coalesced"])]),
+        ("tmdb_in_flight", "gauge", "TMDB calls in progress.", [({}, coalescing["in_flight"])]),
+        ("tmdb_breaker_state", "gauge", "Circuit breaker state per endpoint (1 for the current state).",
+         [({"endpoint": endpoint, "state": state}, int(snapshot["state"] == state))
+          for endpoint, snapshot in endpoints.items() for state in (CLOSED, OPEN, HALF_OPEN)]),
+    ]
+
+
+def _collect_background():
+    from app.scheduler import scheduler
+    from app.warming import warmer
+
+    warming = warmer.snapshot()
+    jobs = scheduler.snapshot()
+    return [
+        ("warming_tasks_total", "counter", "Cache warming tasks by outcome.",
+         [({"outcome": outcome}, warming[outcome]) for outcome in ("done", "dropped", "skipped_breaker", "failed")]),
+        ("warming_queue", "gauge", "Cache warming tasks waiting.",
+         [({"queue": "navigation"}, warming["queue"]), ({"queue": "scheduled"}, warming["scheduled_queue"])]),
+        ("job_runs_total", "counter", "Background job runs.", [({"job": name}, job.get("runs")) for name, job in jobs.items()]),
+        ("job_failures_total", "counter", "Background job runs that failed or found no data.",
+         [({"job": name}, job.get("failures")) for name, job in jobs.items()]),
+        ("job_last_success_timestamp_seconds", "gauge", "End of the last successful run.",
+         [({"job": name}, job.get("last_success_at")) for name, job in jobs.items()]),
+        ("job_last_duration_seconds", "gauge", "Duration of the last run.",
+         [({"job": name}, job.get("last_duration")) for name, job in jobs.items()]),
+    ]
+
+
+registry.collector(_collect_caches)
+registry.collector(_collect_tmdb)
+registry.collector(_collect_background)
+
+
+def init_metrics(app):
+    """Time every request of the app and serve /metrics (plus /metrics/slow, the profiled slow requests)."""
+    from flask import Response, jsonify
+
+    if not ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.route("/metrics/slow")
+    def metrics_slow():
+        return jsonify(list(slow_profiles))
@@ -1,28 +1,80 @@
 # app/models.py
 
-from app.database import connection, does_db_exist, create_db
+import base64
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from app.database import connection, transaction, migrate
+
+# Columns of a media row, in the order of every listing query (media and towatch tables)
+MEDIA_FIELDS = ("id", "media_type", "title", "original_title", "release_date", "overview", "poster_path", "vote_average")
+
+class Media(namedtuple("Media", MEDIA_FIELDS)):
+    """
+    One media row as a tuple with named fields: no per-row dict.
+
+    Templates read it as media.title; media["title"] and media.get("title")
+    keep working for code written against the old dicts.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            # Only the columns: getattr would also find tuple methods such as count and index
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def to_dict(self):
+        return dict(zip(self._fields, self))
+
+def media_row(cursor, row):
+    """sqlite3 row factory building Media records."""
+    return Media._make(row)
+
+def _media_cursor(query, params=()):
+    """Execute a listing query whose rows come back as Media records, fetched lazily."""
+    cursor = connection().cursor()
+    cursor.row_factory = media_row
+    return cursor.execute(query, params)
 
 def clear_medias():
-    conn = connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM media")
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM media")
 
 def clear_towatchs():
-    conn = connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM towatch")
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM towatch")
 
-def insert_media(item):
-    conn = connection()
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO media (id, media_type, title, original_title, release_date, overview, poster_path, vote_average)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+UPSERT_MEDIA = """
+    INSERT INTO media (id, media_type, title, original_title, release_date, overview, poster_path, vote_average, popularity, genre_ids)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id, media_type) DO UPDATE SET
+        title = excluded.title,
+        original_title = excluded.original_title,
+        release_date = excluded.release_date,
+        overview = excluded.overview,
+        poster_path = excluded.poster_path,
+        vote_average = excluded.vote_average,
+        popularity = excluded.popularity,
+        genre_ids = COALESCE(excluded.genre_ids, media.genre_ids)
+"""
+
+UPSERT_BATCH_SIZE = 500
+
+def _media_row(item):
+    return (
         item['id'],
         item['media_type'],
         item['title'],
@@ -31,230 +83,746 @@ def insert_media(item):
         item['overview'],
         item['poster_path'],
         item['vote_average'],
-    ))
-    conn.commit()
-    conn.close()
+        item.get('popularity') or 0,
+        # Items without genre data keep the genres already stored
+        json.dumps(item['genre_ids']) if item.get('genre_ids') is not None else None,
+    )
 
-def fetch_medias(media_type='both', page=1, now_playing=False):
-    conn = connection()
-    c = conn.cursor()
-    
-    limit=20
-    offset = (page - 1) * limit
+def insert_media(item):
+    upsert_medias([item])
 
-    params = []
-    query = """
-        SELECT id, media_type, title, original_title, release_date, overview, poster_path, vote_average  
-        FROM media
-        WHERE 1=1
+def upsert_medias(items, prune=False):
     """
-    if media_type:
-        query += " AND media_type = ?"
+    Insert or update many media rows in a single transaction.
+
+    With prune=True, rows that are not part of items are deleted in the same
+    transaction, so readers switch from the old dataset to the new one at
+    commit time and never see an empty or half-filled table.
+
+    Returns:
+        dict: import statistics (rows, pruned, seconds, rows_per_second)
+    """
+    start = time.perf_counter()
+    pruned = 0
+    with transaction() as conn:
+        for i in range(0, len(items), UPSERT_BATCH_SIZE):
+            conn.executemany(UPSERT_MEDIA, [_media_row(item) for item in items[i:i + UPSERT_BATCH_SIZE]])
+
+        if prune:
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS import_keys (
+                    id INTEGER,
+                    media_type TEXT,
+                    PRIMARY KEY (id, media_type)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("DELETE FROM temp.import_keys")
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp.import_keys (id, media_type) VALUES (?, ?)",
+                [(item['id'], item['media_type']) for item in items],
+            )
+            pruned = conn.execute("""
+                DELETE FROM media
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM temp.import_keys k
+                    WHERE k.id = media.id AND k.media_type = media.media_type
+                )
+            """).rowcount
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": len(items),
+        "pruned": pruned,
+        "seconds": seconds,
+        "rows_per_second": len(items) / seconds if seconds else 0.0,
+    }
+
+def _medias_query(media_type=None, now_playing=False, limit=None, offset=0, genre_id=None):
+    params = []
+    if genre_id:
+        # media_genre carries (media_type, popularity, media_id) for each genre: it drives the
+        # query like the media indexes do for unfiltered listings, media only gives the columns
+        source = "media_genre"
+        query = """
+            SELECT media.id, media.media_type, media.title, media.original_title, media.release_date,
+                   media.overview, media.poster_path, media.vote_average
+            FROM media_genre
+            CROSS JOIN media ON media.media_id = media_genre.media_id
+            WHERE media_genre.genre_id = ?
+        """
+        params.append(genre_id)
+    else:
+        source = "media"
+        query = """
+            SELECT media.id, media.media_type, media.title, media.original_title, media.release_date,
+                   media.overview, media.poster_path, media.vote_average
+            FROM media
+            WHERE 1=1
+        """
+    if media_type and media_type != 'both':
+        query += f" AND {source}.media_type = ?"
         params.append(media_type)
+    else:
+        # Lets SQLite seek the (media_type, ...) indexes instead of scanning the table
+        query += f" AND {source}.media_type IN ('movie', 'tv')"
 
     if now_playing:
-        query += " AND release_date >= date('now')"
+        query += " AND media.release_date >= date('now')"
 
-    if limit and page:
+    if limit:
         params.append(limit)
         params.append(offset)
         query += " LIMIT ? OFFSET ?"
-    
-    c.execute(query, params)
-    rows = c.fetchall()
-    conn.close()
-    
-    results = []
-    for row in rows:
-        results.append({
-            "id": row[0],
-            "media_type": row[1],
-            "title": row[2],
-            "original_title": row[3],
-            "release_date": row[4],
-            "overview": row[5],
-            "poster_path": row[6],
-            "vote_average": row[7]
-        })
+    return query, params
 
-    return results
+def iter_medias(media_type='both', page=None, now_playing=False, genre_id=None):
+    """Stream media rows as Media records, one page of 20 or (page=None) the whole catalogue."""
+    limit = 20
+    offset = (page - 1) * limit if page else 0
 
-def fetch_media(id):
-    conn = connection()
-    c = conn.cursor()
-    c.execute("""
-        SELECT id, media_type, title, original_title, release_date, overview, poster_path, vote_average  
-        FROM media 
-        WHERE id = ?
-    """, (id,))
-    row = c.fetchone()
-    conn.close()
-    
-    if row:
-        return {
-            "id": row[0],
-            "media_type": row[1],
-            "title": row[2],
-            "original_title": row[3],
-            "release_date": row[4],
-            "overview": row[5],
-            "poster_path": row[6],
-            "vote_average": row[7]
-        }
+    query, params = _medias_query(media_type, now_playing, limit if page else None, offset, genre_id)
+    yield from _media_cursor(query, params)
+
+def fetch_medias(media_type='both', page=1, now_playing=False, genre_id=None):
+    return list(iter_medias(media_type, page, now_playing, genre_id))
+
+def encode_cursor(popularity, media_id, direction):
+    raw = json.dumps([popularity, media_id, direction], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Plus grand entier que SQLite sait lier (64 bits signés)
+SQLITE_MAX_INT = 2 ** 63 - 1
+
+def decode_cursor(cursor):
+    """
+    Returns (popularity, media_id, direction), or None for a missing or invalid cursor.
+
+    Cursors come from the query string: a well-formed one can still carry
+    values SQLite cannot bind (an integer over 64 bits, an infinite float),
+    so those are treated as invalid too and the listing starts over.
+    """
+    if not cursor:
+        return None
+    try:
+        popularity, media_id, direction = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if direction not in ("next", "prev"):
+            return None
+        if not isinstance(media_id, int) or isinstance(media_id, bool) or abs(media_id) > SQLITE_MAX_INT:
+            return None
+        popularity = float(popularity)
+        if not math.isfinite(popularity):
+            return None
+        return popularity, media_id, direction
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+def _medias_page_query(media_type=None, now_playing=False, position=None, limit=20, genre_id=None):
+    """Keyset query on (popularity, media_id), walking forward (next) or backward (prev) from position."""
+    query, params = _medias_query(media_type, now_playing, genre_id=genre_id)
+    query = query.replace("SELECT media.id,", "SELECT media.media_id, media.popularity, media.id,", 1)
+    # Compare and sort on the columns of the table that drives the query, so its index gives the order
+    key = "media_genre" if genre_id else "media"
+    if position is None:
+        order = "DESC"
     else:
+        popularity, media_id, direction = position
+        if direction == "next":
+            query += f" AND ({key}.popularity, {key}.media_id) < (?, ?)"
+            order = "DESC"
+        else:
+            query += f" AND ({key}.popularity, {key}.media_id) > (?, ?)"
+            order = "ASC"
+        params = params + [popularity, media_id]
+    query += f" ORDER BY {key}.popularity {order}, {key}.media_id {order} LIMIT ?"
+    return query, params + [limit + 1]
+
+def fetch_medias_page(media_type='both', cursor=None, now_playing=False, limit=20, genre_id=None):
+    """
+    Cursor-based (keyset) pagination over the local catalogue, most popular first.
+
+    Every page seeks the (media_type, popularity, media_id) index, or the
+    (genre_id, media_type, popularity, media_id) key of media_genre when
+    filtering by genre, so it costs about the same as the first one, and
+    pages do not shift while the importer writes.
+
+    Returns:
+        dict: results plus opaque next_cursor / prev_cursor (None at either end)
+    """
+    position = decode_cursor(cursor)
+    query, params = _medias_page_query(media_type, now_playing, position, limit, genre_id)
+    rows = connection().execute(query, params).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    backward = position is not None and position[2] == "prev"
+    if backward:
+        rows.reverse()
+
+    results = [Media._make(row[2:]) for row in rows]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        if (backward and position is not None) or (not backward and has_more):
+            next_cursor = encode_cursor(last[1], last[0], "next")
+        if (backward and has_more) or (not backward and position is not None):
+            prev_cursor = encode_cursor(first[1], first[0], "prev")
+
+    return {"results": results, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+# Au-delà, les mots de la recherche sont ignorés
+SEARCH_MAX_TERMS = 8
+# Au-delà de ce rang, une recherche ne va pas plus loin (les curseurs viennent de l'URL)
+SEARCH_MAX_OFFSET = 10000
+# Un préfixe plus court que ça correspond à une bonne partie du catalogue
+SEARCH_MIN_PREFIX = 3
+
+# Mots présents dans presque tous les synopsis : ils ne départagent rien et coûtent cher à classer
+STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "d", "dans", "de", "des", "du", "elle", "en", "et", "il",
+    "l", "la", "le", "les", "leur", "mais", "ou", "par", "pour", "qu", "que", "qui", "s", "sa", "se",
+    "son", "sur", "un", "une",
+}
+
+def match_expression(query):
+    """
+    Turns a user query into an FTS5 MATCH expression, or None if it has no words.
+
+    Every word is quoted (so FTS5 operators typed by the user are plain text)
+    and must match; the last one is a prefix (from SEARCH_MIN_PREFIX characters),
+    for results while typing.
+    Stopwords are dropped unless the query has nothing else.
+    """
+    terms = re.findall(r"\w+", (query or "").lower())
+    terms = ([term for term in terms if term not in STOPWORDS] or terms)[:SEARCH_MAX_TERMS]
+    if not terms:
         return None
+    expression = " ".join(f'"{term}"' for term in terms)
+    return expression + "*" if len(terms[-1]) >= SEARCH_MIN_PREFIX else expression
 
-def is_media_in_towatch(id):
+def _search_query(media_type=None, now_playing=False, count=False, genre_id=None):
+    params = []
+    # CROSS JOIN keeps media_fts as the outer loop: SQLite would rather walk the media_type index
+    # and run the full-text match once per row
+    query = """
+        SELECT media.id, media.media_type, media.title, media.original_title, media.release_date,
+               media.overview, media.poster_path, media.vote_average
+        FROM media_fts
+        CROSS JOIN media ON media.media_id = media_fts.rowid
+        WHERE media_fts MATCH ?
+    """
+    if media_type and media_type != 'both':
+        query += " AND media.media_type = ?"
+        params.append(media_type)
+
+    if now_playing:
+        query += " AND media.release_date >= date('now')"
+
+    if genre_id:
+        query += """ AND EXISTS (
+            SELECT 1 FROM media_genre WHERE media_genre.media_id = media.media_id AND media_genre.genre_id = ?
+        )"""
+        params.append(genre_id)
+
+    if count:
+        return "SELECT COUNT(*) FROM (" + query + ")", params
+    return query + " ORDER BY media_fts.rank, media.media_id LIMIT ? OFFSET ?", params
+
+def _search_offset(cursor):
+    """Offset carried by a search cursor, clamped to 0..SEARCH_MAX_OFFSET (0 without a valid cursor)."""
+    position = decode_cursor(cursor)
+    if position is None:
+        return 0
+    return min(max(int(position[0]), 0), SEARCH_MAX_OFFSET)
+
+def search_medias(query, media_type='both', cursor=None, now_playing=False, limit=20, genre_id=None):
+    """
+    Full-text search over the local catalogue (title, original title, overview).
+
+    Accent-insensitive, with the last word matched as a prefix. Results come
+    in two tiers, each ranked by bm25: medias whose title or original title
+    match, then those matching only through their overview. Ranking costs
+    one bm25 per match, and a common word matches most overviews but few
+    titles, so the overview tier only runs once the title matches are used
+    up. The cursors have the same shape as fetch_medias_page(); ranks are
+    recomputed on every search anyway, so they just carry the offset.
+
+    Returns:
+        dict: results plus opaque next_cursor / prev_cursor (None at either end)
+    """
+    empty = {"results": [], "next_cursor": None, "prev_cursor": None}
+    expression = match_expression(query)
+    if expression is None:
+        return empty
+
+    offset = _search_offset(cursor)
+
+    titles = f"{{title original_title}} : ({expression})"
+    overview_only = f"({expression}) NOT {titles}"
+    sql, params = _search_query(media_type, now_playing, genre_id=genre_id)
     conn = connection()
-    c = conn.cursor()
-    c.execute("""
-        SELECT id, media_type
-        FROM towatch 
-        WHERE id = ?
-    """, (id,))
-    row = c.fetchone()
-    conn.close()
-    
+    try:
+        rows = _media_cursor(sql, [titles] + params + [limit + 1, offset]).fetchall()
+        if len(rows) <= limit:
+            # Title matches used up: continue with the overview tier where they stopped
+            if rows:
+                title_matches = offset + len(rows)
+            else:
+                count_sql, _ = _search_query(media_type, now_playing, count=True, genre_id=genre_id)
+                title_matches = conn.execute(count_sql, [titles] + params).fetchone()[0]
+            rows += _media_cursor(
+                sql, [overview_only] + params + [limit + 1 - len(rows), max(offset - title_matches, 0)]
+            ).fetchall()
+    except sqlite3.OperationalError as e:
+        print("Error searching the local catalogue:", e)
+        return empty
+
+    return {
+        "results": rows[:limit],
+        "next_cursor": encode_cursor(offset + limit, 0, "next") if len(rows) > limit else None,
+        "prev_cursor": encode_cursor(max(offset - limit, 0), 0, "prev") if offset else None,
+    }
+
+FETCH_MEDIA = """
+    SELECT id, media_type, title, original_title, release_date, overview, poster_path, vote_average  
+    FROM media 
+    WHERE id = ?
+"""
+
+def fetch_media(id):
+    return _media_cursor(FETCH_MEDIA, (id,)).fetchone()
+
+IS_MEDIA_IN_TOWATCH = """
+    SELECT id, media_type
+    FROM towatch 
+    WHERE id = ?
+"""
+
+def is_media_in_towatch(id):
+    row = connection().execute(IS_MEDIA_IN_TOWATCH, (id,)).fetchone()
+
     if row:
         return True
     else:
         return False
 
-def insert_towatch(media):
-    if is_media_in_towatch(media["id"]):
-        print("Media already in towatch list. Skipping insert.")
-        return True
+UPSERT_TOWATCH = """
+    INSERT INTO towatch (id, media_type, title, original_title, release_date, overview, poster_path, vote_average)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id, media_type) DO UPDATE SET
+        title = COALESCE(excluded.title, towatch.title),
+        original_title = COALESCE(excluded.original_title, towatch.original_title),
+        release_date = COALESCE(excluded.release_date, towatch.release_date),
+        overview = COALESCE(excluded.overview, towatch.overview),
+        poster_path = COALESCE(excluded.poster_path, towatch.poster_path),
+        vote_average = COALESCE(excluded.vote_average, towatch.vote_average)
+    WHERE excluded.title IS NOT NULL AND excluded.title IS NOT towatch.title
+        OR excluded.original_title IS NOT NULL AND excluded.original_title IS NOT towatch.original_title
+        OR excluded.release_date IS NOT NULL AND excluded.release_date IS NOT towatch.release_date
+        OR excluded.overview IS NOT NULL AND excluded.overview IS NOT towatch.overview
+        OR excluded.poster_path IS NOT NULL AND excluded.poster_path IS NOT towatch.poster_path
+        OR excluded.vote_average IS NOT NULL AND excluded.vote_average IS NOT towatch.vote_average
+"""
+
+# Durée pendant laquelle une clé d'idempotence rejouée renvoie le résultat de sa première application
+TOWATCH_KEY_SECONDS = 7 * 24 * 3600
+
+def _towatch_row(item):
+    """Validate a watchlist item (form or JSON values). Raises ValueError."""
+    def text(name):
+        value = item.get(name)
+        # Les formulaires des fiches envoient "None" pour un champ absent
+        if value is None or str(value).strip() in ("", "None"):
+            return None
+        return str(value)
 
-    conn = None
     try:
-        conn = connection()
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO towatch (id, media_type, title, original_title, release_date, overview, poster_path, vote_average)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            media['id'],
-            media['media_type'],
-            media['title'],
-            media['original_title'],
-            media['release_date'],
-            media['overview'],
-            media['poster_path'],
-            media['vote_average'],
-        ))
-        conn.commit()
-        print("Insert successful.")
-        return True
-    except Exception as e:
+        id = int(item.get("id"))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("invalid id") from None
+    if not 0 < id <= SQLITE_MAX_INT:
+        raise ValueError("invalid id")
+    if item.get("media_type") not in ("movie", "tv"):
+        raise ValueError("invalid media_type")
+    vote = text("vote_average")
+    try:
+        # Sans note, comme media_from_tmdb : 0
+        vote = float(vote) if vote is not None else 0.0
+    except (ValueError, OverflowError):
+        raise ValueError("invalid vote_average") from None
+    # Les notes TMDB vont de 0 à 10 ; NaN échoue aussi à cette comparaison
+    if not 0 <= vote <= 10:
+        raise ValueError("invalid vote_average")
+    return (id, item["media_type"], text("title"), text("original_title"), text("release_date"),
+            text("overview"), text("poster_path"), vote)
+
+def upsert_towatchs(items):
+    """
+    Add or update many watchlist items in a single transaction.
+
+    Each item may carry a client idempotency "key": a key seen before is
+    answered with the status of its first application and not applied
+    again, so a client can replay its whole queue after a lost response.
+
+    Returns:
+        list: one dict per item, in order: key, id, media_type and status
+            ("added", "updated", "unchanged" or "invalid", with an "error")
+    """
+    now = time.time()
+    results = []
+    with transaction() as conn:
+        conn.execute("DELETE FROM towatch_request WHERE created_at < ?", (now - TOWATCH_KEY_SECONDS,))
+        for item in items:
+            key = item.get("key") or None
+            result = {"key": key, "id": item.get("id"), "media_type": item.get("media_type")}
+            results.append(result)
+
+            if key is not None:
+                seen = conn.execute(
+                    "SELECT id, media_type, status FROM towatch_request WHERE key = ?", (str(key),)
+                ).fetchone()
+                if seen is not None:
+                    result.update(id=seen[0], media_type=seen[1], status=seen[2], replayed=True)
+                    continue
+
+            try:
+                row = _towatch_row(item)
+            except ValueError as e:
+                result.update(status="invalid", error=str(e))
+                continue
+
+            result.update(id=row[0], media_type=row[1])
+            existed = conn.execute(
+                "SELECT 1 FROM towatch WHERE id = ? AND media_type = ?", row[:2]
+            ).fetchone() is not None
+            changed = conn.execute(UPSERT_TOWATCH, row).rowcount
+            result["status"] = "updated" if existed and changed else "unchanged" if existed else "added"
+
+            if key is not None:
+                conn.execute(
+                    "INSERT INTO towatch_request (key, id, media_type, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (str(key), row[0], row[1], result["status"], now),
+                )
+    return results
+
+def insert_towatch(media):
+    """Add one media to the watchlist. Returns True if it is in the watchlist afterwards."""
+    try:
+        result = upsert_towatchs([media])[0]
+    except sqlite3.Error as e:
         print("Error inserting media to towatch:", e)
-    finally:
-        if conn:
-            conn.close()
         return False
+    if result["status"] == "invalid":
+        print("Invalid towatch item:", result["error"])
+        return False
+    return True
+
+
+FETCH_TOWATCHS = """
+    SELECT id, media_type, title, original_title, release_date, overview, poster_path, vote_average  
+    FROM towatch 
+"""
 
+def iter_towatchs():
+    """Stream the watchlist as Media records."""
+    yield from _media_cursor(FETCH_TOWATCHS)
 
 def fetch_towatchs():
-    conn = connection()
-    c = conn.cursor()
-    c.execute("""
-        SELECT id, media_type, title, original_title, release_date, overview, poster_path, vote_average  
-        FROM towatch 
-    """)
-    rows = c.fetchall()
-    conn.close()
-    
-    results = []
-    for row in rows:
-        results.append({
-            "id": row[0],
-            "media_type": row[1],
-            "title": row[2],
-            "original_title": row[3],
-            "release_date": row[4],
-            "overview": row[5],
-            "poster_path": row[6],
-            "vote_average": row[7]
-        })
+    return list(iter_towatchs())
+
+def towatch_version():
+    """Counter bumped by triggers on every watchlist write."""
+    return get_sync_state("towatch_version")
+
+FETCH_SUGGESTIONS = """
+    SELECT id, media_type, title, original_title, release_date, overview, poster_path, vote_average  
+    FROM media 
+    WHERE media_id IN ({})
+"""
+
+def fetch_suggestions(media_type=None, min_vote_average=None, count=1):
+    """Draw up to count distinct random medias matching the filters, without sorting the table."""
+    from app.sampler import sampler
 
+    rowids = sampler.sample(media_type, min_vote_average, count)
+    if not rowids:
+        return []
+    results = _media_cursor(FETCH_SUGGESTIONS.format(",".join("?" * len(rowids))), rowids).fetchall()
+    random.shuffle(results)
     return results
 
 def fetch_suggestion(media_type=None, min_vote_average=None):
-    conn = connection()
-    c = conn.cursor()
-    query = """
-        SELECT id, media_type, title, original_title, release_date, overview, poster_path, vote_average  
-        FROM media 
-        WHERE 1=1
-    """
-    params = []
-    if media_type:
-        query += " AND media_type = ?"
-        params.append(media_type)
-    if min_vote_average is not None:
-        query += " AND vote_average >= ?"
-        params.append(min_vote_average)
-    query += " ORDER BY RANDOM() LIMIT 1"
-    c.execute(query, params)
-    row = c.fetchone()
-    conn.close()
-    
-    if row:
+    suggestions = fetch_suggestions(media_type, min_vote_average, 1)
+    return suggestions[0] if suggestions else None
+
+# Entries kept in media_change_log for samplers of other processes to catch up
+CHANGE_LOG_KEEP = 100000
+
+def prune_media_change_log(keep=CHANGE_LOG_KEEP):
+    with transaction() as conn:
+        conn.execute("DELETE FROM media_change_log WHERE seq <= (SELECT MAX(seq) FROM media_change_log) - ?", (keep,))
+
+def media_from_tmdb(item, media_type):
+    """Map a TMDB movie or tv payload (list item or detail) to a media row."""
+    # Les listes donnent genre_ids, les fiches détaillées une liste de genres
+    genre_ids = item.get("genre_ids")
+    if genre_ids is None and "genres" in item:
+        genre_ids = [genre["id"] for genre in item["genres"]]
+    if media_type == "movie":
         return {
-            "id": row[0],
-            "media_type": row[1],
-            "title": row[2],
-            "original_title": row[3],
-            "release_date": row[4],
-            "overview": row[5],
-            "poster_path": row[6],
-            "vote_average": row[7]
+            "id": item.get("id"),
+            "title": item.get("title"),
+            "original_title": item.get("original_title"),
+            "release_date": item.get("release_date"),
+            "overview": item.get("overview"),
+            "poster_path": item.get("poster_path"),
+            "vote_average": item.get("vote_average", 0),
+            "popularity": item.get("popularity", 0),
+            "genre_ids": genre_ids,
+            "media_type": "movie"
         }
-    else:
-        return None
+    return {
+        "id": item.get("id"),
+        "title": item.get("name"),
+        "original_title": item.get("original_name"),
+        "release_date": item.get("first_air_date"),
+        "overview": item.get("overview"),
+        "poster_path": item.get("poster_path"),
+        "vote_average": item.get("vote_average", 0),
+        "popularity": item.get("popularity", 0),
+        "genre_ids": genre_ids,
+        "media_type": "tv"
+    }
+
+def fill_db_from_tmdb(page=1, pages=None, incremental=False):
+    """
+    Import pages page..page+pages-1 (IMPORT_PAGES by default) of the movie and TV listings.
 
-def fill_db_from_tmdb(page=1):
-    from app.tmdb import call_tmdb_api, get_movies, get_tv_shows, get_movie_detail, get_tv_show_detail, get_tv_genres, get_movie_genres, get_image_base_url
+    A listing shorter than that stops at its last page. With incremental,
+    once a first full import has set the watermark, only the changes since
+    then are synced (see sync_changes_from_tmdb).
+    """
+    from app.tmdb import get_movies, get_tv_shows
     print("Starting importing data from TMDB into media table...")
 
-    if not does_db_exist(): 
-        create_db()
-        print("Database created successfully.")
-    
-    data_movies = get_movies()
-    data_tv = get_tv_shows()
-
-    # We need to clear the media table before inserting new data only if there is results
-    if len(data_movies.get("results", [])) != 0 or len(data_tv.get("results", [])) != 0:
-        clear_medias()
-        print("media table cleared successfully.")      
-        medias = []
-        for movie in data_movies.get("results", []):
-            medias.append({
-                "id": movie.get("id"),
-                "title": movie.get("title"),
-                "original_title": movie.get("original_title"),
-                "release_date": movie.get("release_date"),
-                "overview": movie.get("overview"),
-                "poster_path": movie.get("poster_path"),
-                "vote_average": movie.get("vote_average", 0),
-                "media_type": "movie"
-            })
-        for tv in data_tv.get("results", []):
-            medias.append({
-                "id": tv.get("id"),
-                "title": tv.get("name"),
-                "original_title": tv.get("original_name"),
-                "release_date": tv.get("first_air_date"),
-                "overview": tv.get("overview"),
-                "poster_path": tv.get("poster_path"),
-                "vote_average": tv.get("vote_average", 0),
-                "media_type": "tv"
-            })
-
-        for media in medias:
-            insert_media(media)
-    
-        print("media insert completed successfully.")
+    migrate()
+
+    # Incremental mode only makes sense once a first full import set the watermark
+    if incremental and get_sync_state("watermark"):
+        return sync_changes_from_tmdb()
 
+    sync_started = _utc_now()
+    pages = pages or IMPORT_PAGES
+    medias = []
+    complete = True
+    for media_type, fetch in (("movie", get_movies), ("tv", get_tv_shows)):
+        last = page + pages - 1
+        current = page
+        while current <= last:
+            data = fetch(page=current)
+            if not data.get("results"):
+                # TMDB failed: keep what we got, without pruning, and do not hammer it for the other pages
+                complete = False
+                break
+            medias.extend(media_from_tmdb(item, media_type) for item in data["results"])
+            last = min(last, data.get("total_pages") or last)
+            current += 1
+
+    # The old dataset is only replaced (pruned) when every page came back, otherwise we just upsert what we got
+    if medias:
+        stats = upsert_medias(medias, prune=complete)
+        prune_media_change_log()
+        if complete:
+            set_sync_state("watermark", sync_started)
+        print(f"media import completed: {stats['rows']} rows upserted, {stats['pruned']} pruned "
+              f"in {stats['seconds']:.3f}s ({stats['rows_per_second']:.0f} rows/s).")
+        return stats
     else :
-        print("No data to insert into media table.")
\ No newline at end of file
+        print("No data to insert into media table.")
+        return None
+
+# TMDB only serves the change feeds over the last 14 days
+CHANGES_MAX_DAYS = 14
+# Background import (scheduler job media_sync), in seconds
+SYNC_INTERVAL = int(os.environ.get("SYNC_INTERVAL", 6 * 3600))
+# Listing pages (20 items each) of movies and of TV shows kept by a full import
+IMPORT_PAGES = int(os.environ.get("IMPORT_PAGES", 50))
+SYNC_BATCH_SIZE = 50
+SYNC_MAX_ATTEMPTS = 3
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _parse_watermark(value):
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Watermarks used to be plain dates: midnight UTC
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+GET_SYNC_STATE = "SELECT value FROM sync_state WHERE key = ?"
+
+def get_sync_state(key):
+    row = connection().execute(GET_SYNC_STATE, (key,)).fetchone()
+    return row[0] if row else None
+
+def media_counts():
+    """Number of local media rows per media type."""
+    rows = connection().execute("SELECT media_type, COUNT(*) FROM media GROUP BY media_type").fetchall()
+    return {media_type: count for media_type, count in rows}
+
+def set_sync_state(key, value):
+    with transaction() as conn:
+        if value is None:
+            conn.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+        else:
+            conn.execute("""
+                INSERT INTO sync_state (key, value) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value
+            """, (key, value))
+
+def _queue_changes(start_date, end_date):
+    """
+    Pull the change feeds and queue the ids we already have locally. Returns False if a feed failed.
+
+    The window bounds are UTC timestamps, so a second run on the same day
+    only gets what changed since the first one.
+    """
+    from app.tmdb import call_tmdb_api
+
+    changed = []
+    for media_type in ("movie", "tv"):
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            data = call_tmdb_api(f"/{media_type}/changes", {
+                "start_date": start_date,
+                "end_date": end_date,
+                "page": page,
+            }, use_cache=False)
+            if "page" not in data or "results" not in data:
+                # Feed unavailable (call_tmdb_api's error value has no page): nothing is queued,
+                # the next run retries the same window
+                return False
+            changed.extend((item["id"], media_type) for item in data["results"] if item.get("id"))
+            # A quiet feed has no page at all (total_pages 0): nothing changed, not an error
+            total_pages = data.get("total_pages") or 0
+            page += 1
+
+    with transaction() as conn:
+        conn.executemany("""
+            INSERT OR IGNORE INTO sync_queue (id, media_type)
+            SELECT ?1, ?2 WHERE EXISTS (SELECT 1 FROM media WHERE id = ?1 AND media_type = ?2)
+        """, changed)
+        conn.execute("""
+            INSERT INTO sync_state (key, value) VALUES ('pending_watermark', ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        """, (end_date,))
+    return True
+
+def sync_changes_from_tmdb():
+    """
+    Incremental sync: re-fetch and upsert only the items changed since the watermark.
+
+    Changed ids are first written to sync_queue together with the next
+    watermark, then processed in batches; each batch upserts its rows and
+    removes them from the queue in the same transaction. An interrupted run
+    resumes from the queue and the watermark only moves once it is empty.
+    """
+    from app.tmdb import call_tmdb_api
+
+    start = time.perf_counter()
+    watermark = get_sync_state("watermark")
+    now = _utc_now()
+
+    if get_sync_state("pending_watermark") is None:
+        too_old = _parse_watermark(now) - _parse_watermark(watermark) > timedelta(days=CHANGES_MAX_DAYS)
+        if too_old:
+            print("Sync watermark is older than the change feeds, running a full import.")
+            return fill_db_from_tmdb()
+        if not _queue_changes(watermark, now):
+            print("TMDB change feeds unavailable, sync postponed.")
+            return None
+
+    updated = 0
+    removed = 0
+    failed = 0
+    conn = connection()
+    while True:
+        batch = conn.execute(
+            "SELECT id, media_type FROM sync_queue WHERE attempts < ? LIMIT ?",
+            (SYNC_MAX_ATTEMPTS, SYNC_BATCH_SIZE),
+        ).fetchall()
+        if not batch:
+            break
+
+        medias, done, gone, retry = [], [], [], []
+        for id, media_type in batch:
+            data = call_tmdb_api(f"/{media_type}/{id}", use_cache=False)
+            if data.get("id"):
+                medias.append(media_from_tmdb(data, media_type))
+                done.append((id, media_type))
+            elif data.get("not_found"):
+                # Deleted on TMDB: a 404 will not go away by retrying
+                gone.append((id, media_type))
+            else:
+                retry.append((id, media_type))
+
+        if not done and not gone:
+            # Nothing came back: TMDB is most likely down. Count the attempt so an id that keeps
+            # failing is eventually dropped, and report the run as failed (None) so the scheduler
+            # retries it sooner instead of recording a success
+            with transaction() as conn:
+                conn.executemany("UPDATE sync_queue SET attempts = attempts + 1 WHERE id = ? AND media_type = ?", retry)
+            print(f"media sync interrupted after {updated} rows, {len(batch)} ids left in the queue.")
+            return None
+
+        with transaction() as conn:
+            if medias:
+                upsert_medias(medias)
+            conn.executemany("DELETE FROM sync_queue WHERE id = ? AND media_type = ?", done + gone)
+            conn.executemany("DELETE FROM media WHERE id = ? AND media_type = ?", gone)
+            # The detail store's running size overshoots until its next exact recount, which is harmless
+            conn.executemany("DELETE FROM detail_doc WHERE id = ? AND media_type = ?", gone)
+            # Stored detail pages of changed items are served once more, then refreshed
+            conn.executemany("UPDATE detail_doc SET fetched_at = 0 WHERE id = ? AND media_type = ?", done)
+            conn.executemany("UPDATE sync_queue SET attempts = attempts + 1 WHERE id = ? AND media_type = ?", retry)
+        removed += len(gone)
+        updated += len(done)
+        failed += len(retry)
+
+    # Give up on ids that kept failing, then move the watermark forward
+    with transaction() as conn:
+        conn.execute("DELETE FROM sync_queue WHERE attempts >= ?", (SYNC_MAX_ATTEMPTS,))
+        conn.execute("""
+            UPDATE sync_state SET value = (SELECT value FROM sync_state WHERE key = 'pending_watermark')
+            WHERE key = 'watermark'
+        """)
+        conn.execute("DELETE FROM sync_state WHERE key = 'pending_watermark'")
+
+    prune_media_change_log()
+    seconds = time.perf_counter() - start
+    print(f"media sync completed: {updated} rows updated, {removed} removed, {failed} failed fetches in {seconds:.3f}s.")
+    return {"rows": updated, "removed": removed, "failed": failed, "seconds": seconds}
+
+def hot_queries():
+    """The queries run on every page view or background run, with sample parameters, for check_query_plans()."""
+    from app.sampler import CHANGES_SINCE
+    from app.scheduler import JOB_STATE
+
+    return [
+        ("fetch_medias", *_medias_query('movie', limit=20, offset=40)),
+        ("fetch_medias (both)", *_medias_query('both', limit=20, offset=40)),
+        ("fetch_medias (now playing)", *_medias_query('movie', now_playing=True, limit=20, offset=0)),
+        ("fetch_medias_page", *_medias_page_query('movie', position=(120.5, 42, "next"))),
+        ("fetch_medias_page (prev)", *_medias_page_query('tv', position=(120.5, 42, "prev"))),
+        ("fetch_medias_page (now playing)", *_medias_page_query('movie', now_playing=True)),
+        ("fetch_medias_page (genre)", *_medias_page_query('movie', position=(120.5, 42, "next"), genre_id=28)),
+        ("fetch_medias_page (genre, now playing)", *_medias_page_query('movie', now_playing=True, genre_id=28)),
+        ("search_medias", _search_query('movie')[0], ('{title original_title} : ("nuit"*)', 'movie', 20, 0)),
+        ("search_medias (genre)", _search_query('movie', genre_id=28)[0],
+         ('{title original_title} : ("nuit"*)', 'movie', 28, 20, 0)),
+        ("fetch_media", FETCH_MEDIA, (42,)),
+        ("is_media_in_towatch", IS_MEDIA_IN_TOWATCH, (42,)),
+        ("fetch_suggestions", FETCH_SUGGESTIONS.format("?,?,?"), (1, 2, 3)),
+        ("sampler refresh", CHANGES_SINCE, (42,)),
+        ("get_sync_state", GET_SYNC_STATE, ("watermark",)),
+        ("scheduler job state", JOB_STATE, ("media_sync",)),
+    ]
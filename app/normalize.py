@@ -0,0 +1,154 @@
+# app/normalize.py
+from collections import namedtuple
+from copy import deepcopy
+
+# sources: keys read from the TMDB payload, the first one that is present wins
+# transform: applied to a present value; default: used when no source is present
+Field = namedtuple("Field", "sources transform default", defaults=(None, None))
+
+# Acteurs gardés par fiche (les templates en affichent 10)
+CAST_LIMIT = 20
+
+
+def compile_record(schema):
+    """
+    Compile a schema (output key -> Field) into a function mapping one TMDB object to a record.
+
+    The returned function reads each wanted key once and builds the record in
+    a single pass; keys that are not in the schema are dropped.
+    """
+    ops = tuple(
+        # Mutable defaults are copied so records never share them
+        (key, field.sources, field.transform, field.default, isinstance(field.default, (list, dict)))
+        for key, field in schema.items()
+    )
+
+    def normalize(item):
+        get = item.get
+        record = {}
+        for key, sources, transform, default, mutable in ops:
+            value = None
+            for source in sources:
+                value = get(source)
+                if value is not None:
+                    break
+            if value is None:
+                value = deepcopy(default) if mutable else default
+            elif transform is not None:
+                value = transform(value)
+            record[key] = value
+        return record
+
+    return normalize
+
+
+def each(schema, limit=None):
+    """Transform for a list of objects: normalize each of them, keeping at most limit."""
+    normalize = compile_record(schema)
+    return lambda values: [normalize(value) for value in values[:limit]]
+
+
+def nested(schema):
+    """Transform for a nested object."""
+    return compile_record(schema)
+
+
+def prefix(base):
+    """Transform turning an image path into a full URL."""
+    return lambda path: base + path
+
+
+def list_item_schema(media_type, image_base_url):
+    """
+    Fields of a movie or TV show in a listing, under both naming schemes.
+
+    Movies and shows get the same keys (title and name, original_title and
+    original_name, release_date and first_air_date), so templates and the
+    importer do not need to know which one they got.
+    """
+    movie = media_type == "movie"
+    title = ("title", "name") if movie else ("name", "title")
+    original = ("original_title", "original_name") if movie else ("original_name", "original_title")
+    released = ("release_date", "first_air_date") if movie else ("first_air_date", "release_date")
+    return {
+        "id": Field(("id",)),
+        "media_type": Field((), default=media_type),
+        "title": Field(title),
+        "name": Field(title),
+        "original_title": Field(original),
+        "original_name": Field(original),
+        "release_date": Field(released),
+        "first_air_date": Field(released),
+        "overview": Field(("overview",)),
+        "poster_path": Field(("poster_path",)),
+        "poster_url": Field(("poster_path",), prefix(image_base_url)),
+        "backdrop_path": Field(("backdrop_path",)),
+        "vote_average": Field(("vote_average",), default=0),
+        "popularity": Field(("popularity",), default=0),
+        "genre_ids": Field(("genre_ids",), default=[]),
+    }
+
+
+def detail_schema(media_type, image_base_url, backdrop_base_url):
+    """Fields of a movie or TV detail page (append_to_response payload)."""
+    schema = list_item_schema(media_type, image_base_url)
+    del schema["genre_ids"]
+    related = nested({
+        "results": Field(("results",), each(list_item_schema(media_type, image_base_url)), default=[]),
+    })
+    schema.update({
+        "backdrop_url": Field(("backdrop_path",), prefix(backdrop_base_url)),
+        "tagline": Field(("tagline",)),
+        "status": Field(("status",)),
+        "genres": Field(("genres",), each({"id": Field(("id",)), "name": Field(("name",))}), default=[]),
+        "credits": Field(("credits",), nested({
+            "cast": Field(("cast",), each({
+                "id": Field(("id",)),
+                "name": Field(("name",)),
+                "character": Field(("character",)),
+                "profile_path": Field(("profile_path",)),
+            }, CAST_LIMIT), default=[]),
+        }), default={"cast": []}),
+        "videos": Field(("videos",), nested({
+            "results": Field(("results",), each({
+                "key": Field(("key",)),
+                "site": Field(("site",)),
+                "type": Field(("type",)),
+                "name": Field(("name",)),
+            }), default=[]),
+        }), default={"results": []}),
+        "similar": Field(("similar",), related, default={"results": []}),
+        "recommendations": Field(("recommendations",), related, default={"results": []}),
+    })
+    if media_type == "movie":
+        schema["runtime"] = Field(("runtime",))
+    else:
+        schema.update({
+            "number_of_seasons": Field(("number_of_seasons",)),
+            "number_of_episodes": Field(("number_of_episodes",)),
+            "networks": Field(("networks",), each({"id": Field(("id",)), "name": Field(("name",))}), default=[]),
+            "seasons": Field(("seasons",), each({
+                "id": Field(("id",)),
+                "season_number": Field(("season_number",)),
+                "name": Field(("name",)),
+                "episode_count": Field(("episode_count",)),
+                "poster_path": Field(("poster_path",)),
+                "poster_url": Field(("poster_path",), prefix(image_base_url)),
+            }), default=[]),
+        })
+    return schema
+
+
+def compile_page(item_schema):
+    """Compile a normalizer for a paginated listing: page fields kept, each result normalized."""
+    normalize_item = compile_record(item_schema)
+
+    def normalize(data):
+        return {
+            "page": data.get("page"),
+            "results": [normalize_item(item) for item in data.get("results", [])],
+            "total_pages": data.get("total_pages", 0),
+            "total_results": data.get("total_results", 0),
+        }
+
+    return normalize
@@ -0,0 +1,159 @@
+# app/pagecache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, make_response, request
+
+MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+CACHED_MIMETYPES = ("text/html", "application/json")
+
+# Durées de vie des pages, alignées sur celles des réponses TMDB qu'elles affichent (app/cache.py)
+LISTING_TTL = 600
+SEARCH_TTL = 300
+NOW_PLAYING_TTL = 60
+DETAIL_TTL = 3600
+# Pages construites depuis la base locale faute de TMDB : on retente TMDB rapidement
+FALLBACK_TTL = 30
+
+
+class PageCache:
+    """
+    Bounded cache of rendered pages of the main and api blueprints.
+
+    Entries hold the HTML body with its ETag and render time and are
+    evicted least-recently-used first once their total size exceeds
+    max_bytes. A page built from a version (e.g. the watchlist counter)
+    is only served while that version is unchanged.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (body, etag, rendered_at, expires, version, mimetype)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now >= entry[3] or entry[4] != version:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, ttl, version=None, mimetype="text/html"):
+        size = len(body)
+        if ttl <= 0 or size > self.max_bytes:
+            return None
+        now = time.time()
+        entry = (body, hashlib.sha1(body).hexdigest(), now, now + ttl, version, mimetype)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, endpoint=None):
+        """Drop every page, or the pages of one endpoint."""
+        with self._lock:
+            for key in [key for key in self._entries if endpoint is None or key[0] == endpoint]:
+                self._drop(key)
+
+    def _drop(self, key):
+        body = self._entries.pop(key)[0]
+        self._size -= len(body)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+page_cache = PageCache()
+
+
+def limit_page_ttl(ttl):
+    """Shorten the cache lifetime of the page being rendered (e.g. built from the local fallback)."""
+    g.page_ttl = min(ttl, g.get("page_ttl", ttl))
+
+
+def _page_response(entry, cache_control, state):
+    body, etag, rendered_at, expires, _, mimetype = entry
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.set_etag(etag)
+    response.last_modified = rendered_at
+    if cache_control == "public":
+        response.headers["Cache-Control"] = f"public, max-age={max(int(expires - time.time()), 0)}"
+        response.expires = expires
+    else:
+        response.headers["Cache-Control"] = cache_control
+    response.headers["X-Page-Cache"] = state
+    # 304 when If-None-Match (or If-Modified-Since) matches
+    return response.make_conditional(request)
+
+
+def cached_page(ttl, args=(), search_ttl=None, version=None):
+    """
+    Cache the rendered HTML (or JSON) of a GET route and answer conditional requests.
+
+    Args:
+        ttl (int): seconds a page is served from memory and by browsers or proxies
+        args (tuple): query args the view reads; they make the cache key, other args are ignored
+        search_ttl (int): ttl used instead when the page has a non-empty "query" arg
+        version (callable): returns a token the page depends on; a page is served
+            only while the token is unchanged and browsers must revalidate it
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*view_args, **view_kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*view_args, **view_kwargs)
+
+            params = tuple(sorted(
+                (name, value.strip()) for name in args
+                for value in request.args.getlist(name)[:1] if value.strip()
+            ))
+            key = (request.endpoint, tuple(sorted(view_kwargs.items())), params)
+            token = version() if version else None
+            cache_control = "private, no-cache" if version else "public"
+
+            entry = page_cache.get(key, token)
+            if entry is not None:
+                return _page_response(entry, cache_control, "hit")
+
+            response = make_response(view(*view_args, **view_kwargs))
+            if response.status_code != 200 or response.mimetype not in CACHED_MIMETYPES or response.direct_passthrough:
+                return response
+            lifetime = search_ttl if search_ttl and dict(params).get("query") else ttl
+            entry = page_cache.set(key, response.get_data(), min(lifetime, g.get("page_ttl", lifetime)), token,
+                                   response.mimetype)
+            if entry is None:
+                return response
+            return _page_response(entry, cache_control, "miss")
+
+        return wrapper
+    return decorator
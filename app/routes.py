@@ -1,21 +1,73 @@
 # app/routes.py
-from flask import Blueprint, render_template, request, url_for
-from app.tmdb import call_tmdb_api, get_movies, get_tv_shows, get_movie_detail, get_tv_show_detail, get_tv_genres, get_movie_genres, get_image_base_url
-from app.models import fetch_suggestion, fetch_medias, fetch_media, insert_towatch, fetch_towatchs
+import time
+from functools import partial
+from flask import Blueprint, jsonify, redirect, render_template, request, send_file, url_for
+from app.tmdb import call_tmdb_api, get_movies, get_tv_shows, get_movie_detail, get_tv_show_detail, get_image_base_url
+from app.genres import movie_genres, tv_genres
+from app.fanout import fetch_all
+from app.breaker import breaker_states
+from app.models import fetch_suggestion, fetch_medias_page, search_medias, fetch_media, insert_towatch, upsert_towatchs, fetch_towatchs, towatch_version, media_counts, get_sync_state, SYNC_INTERVAL
+from app.images import image_cache
+from app.warming import warmer
+from app.metrics import count_fallback
+from app.scheduler import scheduler
+from app.pagecache import cached_page, limit_page_ttl, LISTING_TTL, SEARCH_TTL, NOW_PLAYING_TTL, DETAIL_TTL, FALLBACK_TTL
 
 main = Blueprint('main', __name__)
 
+# Arguments de requête lus par les pages de liste (clé du cache de pages)
+LISTING_ARGS = ('page', 'query', 'genre_id', 'cursor')
+
+# Taille maximale d'un lot envoyé à /to-watch/batch
+MAX_BATCH_ITEMS = 500
+
+# Une image TMDB ne change jamais sous un même chemin : un an de cache navigateur
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+# Au-delà de deux intervalles sans import réussi, les données locales sont signalées périmées
+STALE_AFTER = 2 * SYNC_INTERVAL
+
+# Résultat vide renvoyé pour un appel TMDB en échec ou hors délai (même forme que call_tmdb_api)
+EMPTY_RESULTS = {"results": [], "total_pages": 0}
+
+def fallback_detail(media):
+    """Complete a local media row with the keys the detail templates iterate over."""
+    if not media:
+        return None
+    media = media.to_dict()
+    media.setdefault("name", media.get("title"))
+    media.setdefault("original_name", media.get("original_title"))
+    media.setdefault("credits", {"cast": []})
+    media.setdefault("videos", {"results": []})
+    media.setdefault("genres", [])
+    media.setdefault("networks", [])
+    return media
+
+def fallback_listing(media_type, query, genre_id=None, now_playing=False):
+    """Local results when TMDB returned nothing: full-text search if there is a query, else the catalogue."""
+    cursor = request.args.get('cursor')
+    limit_page_ttl(FALLBACK_TTL)
+    count_fallback("listing")
+    if query:
+        return search_medias(query, media_type, cursor=cursor, now_playing=now_playing, genre_id=genre_id)
+    return fetch_medias_page(media_type, cursor=cursor, now_playing=now_playing, genre_id=genre_id)
+
 @main.route('/')
+@cached_page(LISTING_TTL, args=LISTING_ARGS, search_ttl=SEARCH_TTL)
 def index():
     page = request.args.get('page', 1, type=int)
     query = request.args.get('query', '')
-    genre_id = request.args.get('genre_id', None)
+    genre_id = request.args.get('genre_id', None, type=int)
 
-    movies = get_movies(search=query, page=page, genre_id=genre_id)
-    genres = get_movie_genres()
+    fetched = fetch_all({
+        'movies': partial(get_movies, search=query, page=page, genre_id=genre_id),
+        'genres': movie_genres,
+    }, defaults={'movies': dict(EMPTY_RESULTS), 'genres': []})
+    movies, genres = fetched['movies'], fetched['genres']
+    warmer.after_listing('movie', movies, page=page, query=query, genre_id=genre_id)
 
     if not movies.get('results'):
-        movies['results'] = fetch_medias('movie', page=page)
+        movies.update(fallback_listing('movie', query, genre_id))
     
     return render_template(
         'index.html',
@@ -23,6 +75,8 @@ def index():
         page=page,
         genres=genres,
         total_pages=movies.get('total_pages', 0),
+        next_cursor=movies.get('next_cursor'),
+        prev_cursor=movies.get('prev_cursor'),
         query=query,
         genre_id=genre_id,
         image_base_url=get_image_base_url(),
@@ -31,16 +85,21 @@ def index():
     )
 
 @main.route('/now-playing')
+@cached_page(NOW_PLAYING_TTL, args=LISTING_ARGS)
 def now_playing():
     page = request.args.get('page', 1, type=int)
     query = request.args.get('query', '')
-    genre_id = request.args.get('genre_id', None)
+    genre_id = request.args.get('genre_id', None, type=int)
 
-    movies = get_movies(search=query, page=page, genre_id=genre_id, now_playing=True)
-    genres = get_movie_genres()
+    fetched = fetch_all({
+        'movies': partial(get_movies, search=query, page=page, genre_id=genre_id, now_playing=True),
+        'genres': movie_genres,
+    }, defaults={'movies': dict(EMPTY_RESULTS), 'genres': []})
+    movies, genres = fetched['movies'], fetched['genres']
+    warmer.after_listing('movie', movies, page=page, query=query, genre_id=genre_id, now_playing=True)
 
     if not movies.get('results'):
-        movies['results'] = fetch_medias('movie', page=page, now_playing=True)
+        movies.update(fallback_listing('movie', query, genre_id, now_playing=True))
 
     return render_template(
         'movie/movie_list.html',
@@ -48,6 +107,8 @@ def now_playing():
         page=page,
         genres=genres,
         total_pages=movies.get('total_pages', 0),
+        next_cursor=movies.get('next_cursor'),
+        prev_cursor=movies.get('prev_cursor'),
         query=query,
         genre_id=genre_id,
         image_base_url=get_image_base_url(),
@@ -56,16 +117,21 @@ def now_playing():
     )
 
 @main.route('/movies')
+@cached_page(LISTING_TTL, args=LISTING_ARGS, search_ttl=SEARCH_TTL)
 def movies():
     page = request.args.get('page', 1, type=int)
     query = request.args.get('query', '')
-    genre_id = request.args.get('genre_id', None)
+    genre_id = request.args.get('genre_id', None, type=int)
 
-    movies = get_movies(search=query, page=page, genre_id=genre_id)
-    genres = get_movie_genres()
+    fetched = fetch_all({
+        'movies': partial(get_movies, search=query, page=page, genre_id=genre_id),
+        'genres': movie_genres,
+    }, defaults={'movies': dict(EMPTY_RESULTS), 'genres': []})
+    movies, genres = fetched['movies'], fetched['genres']
+    warmer.after_listing('movie', movies, page=page, query=query, genre_id=genre_id)
 
     if not movies.get('results'):
-        movies['results'] = fetch_medias('movie', page=page)
+        movies.update(fallback_listing('movie', query, genre_id))
 
     return render_template(
         'movie/movie_list.html',
@@ -73,6 +139,8 @@ def movies():
         page=page,
         genres=genres,
         total_pages=movies.get('total_pages', 0),
+        next_cursor=movies.get('next_cursor'),
+        prev_cursor=movies.get('prev_cursor'),
         query=query,
         genre_id=genre_id,
         image_base_url=get_image_base_url(),
@@ -81,16 +149,21 @@ def movies():
     )
 
 @main.route('/tv-shows')
+@cached_page(LISTING_TTL, args=LISTING_ARGS, search_ttl=SEARCH_TTL)
 def tv_shows():
     page = request.args.get('page', 1, type=int)
     query = request.args.get('query', '')
-    genre_id = request.args.get('genre_id', None)
+    genre_id = request.args.get('genre_id', None, type=int)
 
-    tv_shows = get_tv_shows(search=query, page=page, genre_id=genre_id)
-    genres = get_tv_genres()
+    fetched = fetch_all({
+        'tv_shows': partial(get_tv_shows, search=query, page=page, genre_id=genre_id),
+        'genres': tv_genres,
+    }, defaults={'tv_shows': dict(EMPTY_RESULTS), 'genres': []})
+    tv_shows, genres = fetched['tv_shows'], fetched['genres']
+    warmer.after_listing('tv', tv_shows, page=page, query=query, genre_id=genre_id)
 
     if not tv_shows.get('results'):
-        tv_shows['results'] = fetch_medias('tv', page=page)
+        tv_shows.update(fallback_listing('tv', query, genre_id))
 
     return render_template(
         'tv/tv_list.html',
@@ -98,6 +171,8 @@ def tv_shows():
         page=page,
         genres=genres,
         total_pages=tv_shows.get('total_pages', 0),
+        next_cursor=tv_shows.get('next_cursor'),
+        prev_cursor=tv_shows.get('prev_cursor'),
         query=query,
         genre_id=genre_id,
         image_base_url=get_image_base_url(),
@@ -106,14 +181,18 @@ def tv_shows():
     )
 
 @main.route('/movie/<int:movie_id>')
+@cached_page(DETAIL_TTL)
 def movie_detail(movie_id):
     
     movie = get_movie_detail(movie_id)
 
-    if not movie:
-        movie = fetch_media(movie_id)
+    # TMDB en erreur (ou circuit ouvert) : on se rabat sur la base locale
+    if not movie.get("id"):
+        limit_page_ttl(FALLBACK_TTL)
+        count_fallback("detail")
+        movie = fallback_detail(fetch_media(movie_id))
 
-    if "results" not in movie or movie.get("id"):
+    if movie:
         return render_template(
             'movie/movie_detail.html',
             movie=movie,
@@ -124,13 +203,16 @@ def movie_detail(movie_id):
         return "Film non trouvé", 404
 
 @main.route('/tv/<int:tv_id>')
+@cached_page(DETAIL_TTL)
 def tv_detail(tv_id):
     tv_show = get_tv_show_detail(tv_id)
 
-    if not tv_show:
-        tv_show = fetch_media(tv_id)
+    if not tv_show.get("id"):
+        limit_page_ttl(FALLBACK_TTL)
+        count_fallback("detail")
+        tv_show = fallback_detail(fetch_media(tv_id))
 
-    if "results" not in tv_show or tv_show.get("id"):
+    if tv_show:
         return render_template(
             'tv/tv_detail.html',
             tv_show=tv_show,
@@ -164,6 +246,7 @@ def suggestion():
         return render_template("suggestion/suggestion_form.html", active_page='suggestion')
 
 @main.route('/to-watch', methods=["GET", "POST"])
+@cached_page(DETAIL_TTL, version=towatch_version)
 def towatch():
     if request.method == "POST":
         media = {
@@ -187,6 +270,7 @@ def towatch():
             "media": media if success else None
         }, 200 if success else 500
     else:
+        # A list, not the lazy iterator: no SELECT stays open while the page renders
         medias = fetch_towatchs()
 
         return render_template(
@@ -196,4 +280,70 @@ def towatch():
             image_base_url=get_image_base_url(),
             active_page='towatch',
             endpoint='main.towatch',
-        )
\ No newline at end of file
+        )
+
+@main.route('/to-watch/batch', methods=["POST"])
+def towatch_batch():
+    """Apply a client's queued watchlist additions in one transaction, with a result per item."""
+    body = request.get_json(silent=True)
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return {"status": "error", "message": "Corps attendu : {\"items\": [...]}"}, 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return {"status": "error", "message": f"Au plus {MAX_BATCH_ITEMS} éléments par lot"}, 413
+
+    try:
+        results = upsert_towatchs(items)
+    except Exception as e:
+        print("Error applying towatch batch:", e)
+        return {"status": "error", "message": "Erreur lors de l'ajout des medias"}, 500
+
+    return {"status": "success", "results": results}, 200
+
+@main.route('/img/<size>/<filename>')
+def image(size, filename):
+    """TMDB image served from the local disk cache, with range and conditional requests."""
+    if not image_cache.valid(size, filename):
+        return "Image inconnue", 404
+
+    path = image_cache.get(size, filename)
+    if path is None:
+        # Origine injoignable depuis le serveur : le navigateur peut encore essayer directement
+        return redirect(image_cache.origin_url(size, filename))
+
+    response = send_file(path, mimetype=image_cache.mimetype(filename), conditional=True, max_age=IMAGE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@main.route('/health/tmdb')
+def health_tmdb():
+    """Circuit breaker state per TMDB endpoint, for operators."""
+    return jsonify(breaker_states())
+
+@main.route('/health')
+def health():
+    """Liveness: the process answers, whatever the state of the data or of TMDB."""
+    return jsonify({"status": "ok"})
+
+@main.route('/health/data')
+def health_data():
+    """Freshness of the local data and state of the background jobs."""
+    counts = media_counts()
+    sync = scheduler.state("media_sync") or {}
+    last_success = sync.get("last_success_at")
+    age = time.time() - last_success if last_success else None
+    if not counts:
+        status = "empty"
+    elif age is None or age > STALE_AFTER:
+        status = "stale"
+    else:
+        status = "fresh"
+    return jsonify({
+        "status": status,
+        "media": counts,
+        "watermark": get_sync_state("watermark"),
+        "last_sync_at": last_success,
+        "last_sync_age": age,
+        "jobs": scheduler.snapshot(),
+    }), 200 if status != "empty" else 503
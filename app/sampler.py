@@ -0,0 +1,164 @@
+# app/sampler.py
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from app.database import connection
+
+# Au-delà de ce nombre de changements en attente, reconstruire est plus rapide que rejouer le journal
+REBUILD_THRESHOLD = 5000
+NULL_BUCKET = -1
+# Délai minimal entre deux lectures du journal depuis sample() : un tirage peut donc ignorer
+# les changements de la dernière seconde (une ligne supprimée est simplement absente du résultat)
+REFRESH_INTERVAL = 1.0
+
+CHANGES_SINCE = "SELECT MIN(seq), MAX(seq), COUNT(*) FROM media_change_log WHERE seq > ?"
+
+
+def _bucket(vote):
+    if vote is None:
+        return NULL_BUCKET
+    return min(max(int(vote), 0), 10)
+
+
+class SuggestionSampler:
+    """
+    In-memory index of media rowids per (media_type, vote bucket) for random suggestions.
+
+    Each bucket (integer part of vote_average, plus one for NULL votes)
+    keeps two parallel arrays sorted by (vote, rowid). Sampling only looks
+    at bucket sizes plus one bisect in the bucket holding min_vote_average,
+    so drawing one or N distinct suggestions does not depend on the
+    catalogue size.
+
+    The index is kept up to date by replaying media_change_log, which the
+    media triggers fill on every insert, delete and vote or type change,
+    whichever process made it, at most every REFRESH_INTERVAL seconds. It
+    is rebuilt from scratch when it falls too far behind.
+    """
+
+    def __init__(self):
+        self._buckets = {}  # (media_type, bucket) -> (votes array, rowids array)
+        self._seq = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------- maintenance
+
+    def _rebuild(self, conn):
+        buckets = {}
+        # One read transaction so the rows and the log position match
+        conn.execute("BEGIN")
+        try:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM media_change_log").fetchone()[0]
+            rows = conn.execute(
+                "SELECT media_type, vote_average, media_id FROM media ORDER BY media_type, vote_average, media_id"
+            )
+            for media_type, vote, media_id in rows:
+                votes, rowids = buckets.setdefault((media_type, _bucket(vote)), (array("d"), array("q")))
+                votes.append(-1.0 if vote is None else vote)
+                rowids.append(media_id)
+        finally:
+            conn.execute("COMMIT")
+        self._buckets = buckets
+        self._seq = seq
+
+    def _add(self, media_type, vote, media_id):
+        votes, rowids = self._buckets.setdefault((media_type, _bucket(vote)), (array("d"), array("q")))
+        key = -1.0 if vote is None else vote
+        lo, hi = bisect_left(votes, key), bisect_right(votes, key)
+        position = bisect_left(rowids, media_id, lo, hi)
+        votes.insert(position, key)
+        rowids.insert(position, media_id)
+
+    def _remove(self, media_type, vote, media_id):
+        entry = self._buckets.get((media_type, _bucket(vote)))
+        if entry is None:
+            return
+        votes, rowids = entry
+        key = -1.0 if vote is None else vote
+        lo, hi = bisect_left(votes, key), bisect_right(votes, key)
+        position = bisect_left(rowids, media_id, lo, hi)
+        if position < hi and rowids[position] == media_id:
+            del votes[position]
+            del rowids[position]
+
+    def refresh(self):
+        """Bring the index up to date with media_change_log."""
+        conn = connection()
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._seq is None:
+                self._rebuild(conn)
+                return
+            first, last, pending = conn.execute(CHANGES_SINCE, (self._seq,)).fetchone()
+            if not pending:
+                return
+            # Log pruned past our position, or too much to replay: start over
+            if first != self._seq + 1 or pending > REBUILD_THRESHOLD:
+                self._rebuild(conn)
+                return
+            changes = conn.execute("""
+                SELECT media_id, old_type, old_vote, new_type, new_vote
+                FROM media_change_log WHERE seq > ? AND seq <= ? ORDER BY seq
+            """, (self._seq, last)).fetchall()
+            for media_id, old_type, old_vote, new_type, new_vote in changes:
+                if old_type is not None:
+                    self._remove(old_type, old_vote, media_id)
+                if new_type is not None:
+                    self._add(new_type, new_vote, media_id)
+            self._seq = last
+
+    # -------------------------------------------------------------- sampling
+
+    def _segments(self, media_type, min_vote_average):
+        """(rowids, start, count) slices holding exactly the rows matching the filters."""
+        types = (media_type,) if media_type else ("movie", "tv")
+        segments = []
+        for kind in types:
+            for bucket in range(NULL_BUCKET, 11):
+                entry = self._buckets.get((kind, bucket))
+                if not entry or not entry[1]:
+                    continue
+                votes, rowids = entry
+                if min_vote_average is None:
+                    start = 0
+                elif bucket == NULL_BUCKET:
+                    # Like SQL, "vote_average >= ?" never matches a NULL vote
+                    continue
+                else:
+                    # Whole bucket above the threshold gives 0, one bisect otherwise
+                    start = bisect_left(votes, min_vote_average)
+                if start < len(rowids):
+                    segments.append((rowids, start, len(rowids) - start))
+        return segments
+
+    def sample(self, media_type=None, min_vote_average=None, n=1):
+        """Returns up to n distinct media rowids drawn uniformly among the matching rows."""
+        if self._seq is None or time.monotonic() - self._checked_at >= REFRESH_INTERVAL:
+            self.refresh()
+        with self._lock:
+            segments = self._segments(media_type, min_vote_average)
+            total = sum(count for _, _, count in segments)
+            if total == 0:
+                return []
+            picks = sorted(random.sample(range(total), min(n, total)))
+            rowids = []
+            offset = 0
+            segment = iter(segments)
+            current = next(segment)
+            for pick in picks:
+                while pick >= offset + current[2]:
+                    offset += current[2]
+                    current = next(segment)
+                rowids.append(current[0][current[1] + pick - offset])
+        return rowids
+
+    def size(self):
+        with self._lock:
+            return sum(len(rowids) for _, rowids in self._buckets.values())
+
+
+sampler = SuggestionSampler()
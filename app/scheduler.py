@@ -0,0 +1,206 @@
+# app/scheduler.py
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+from app.database import connection, transaction
+
+ENABLED = os.environ.get("SCHEDULER_ENABLED", "1") != "0"
+# Écart aléatoire appliqué à chaque intervalle (0.1 = ±10 %), pour que les workers ne tombent pas ensemble
+JITTER = float(os.environ.get("SCHEDULER_JITTER", 0.1))
+# Délai avant de réessayer un job en échec, doublé à chaque échec consécutif (plafonné à son intervalle)
+RETRY_SECONDS = 60
+# Un bail non rendu (processus tué pendant un job) expire au bout de ce délai
+LEASE_SECONDS = 3600
+
+JOB_STATE = "SELECT * FROM job_state WHERE name = ?"
+
+
+class Job:
+    """
+    A function run every `interval` seconds.
+
+    shared=True for jobs writing to SQLite (the import): one process at a
+    time runs them, under a lease in job_state, and a run made by any
+    process counts for all, also across restarts. Other jobs fill
+    per-process memory (genre lists, caches) and run in every process,
+    first after first_run seconds (default: one interval).
+    """
+
+    def __init__(self, name, func, interval, shared=False, first_run=None, jitter=JITTER):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.shared = shared
+        self.jitter = jitter
+        self.next_run = None if shared else time.time() + (interval if first_run is None else first_run)
+        self.running = False
+        # Dernière exécution dans ce processus (les jobs partagés lisent job_state)
+        self.last = None
+
+
+class Scheduler:
+    """
+    In-process scheduler for the background refresh jobs.
+
+    One thread sleeps until the next due job and starts it in its own
+    thread, so a long import does not hold back the other jobs. A job never
+    overlaps itself: not within a process (running flag), and not across
+    processes for shared jobs (lease). Each run is recorded in job_state,
+    so after a restart a job that ran recently waits for its next turn
+    instead of running again at boot.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, name, func, interval, shared=False, first_run=None, jitter=JITTER):
+        self.jobs[name] = Job(name, func, interval, shared, first_run, jitter)
+        self._wake.set()
+
+    # -------------------------------------------------------------- state
+
+    def state(self, name):
+        cursor = connection().execute(JOB_STATE, (name,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def _last_run(self, job):
+        return self.state(job.name) if job.shared else job.last
+
+    def _due_after(self, job, state):
+        """When a job is next due, from its last run."""
+        if state is None or state["last_finished_at"] is None:
+            return time.time()
+        if state["last_status"] == "ok":
+            delay = job.interval
+        else:
+            delay = min(job.interval, RETRY_SECONDS * 2 ** max(state["consecutive_failures"] - 1, 0))
+        return state["last_finished_at"] + delay * random.uniform(1 - job.jitter, 1 + job.jitter)
+
+    def _acquire(self, job, now):
+        """Record the start of a run. For a shared job, returns False if another process holds the lease."""
+        with transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO job_state (name) VALUES (?)", (job.name,))
+            if job.shared:
+                taken = conn.execute("""
+                    UPDATE job_state SET lease_owner = ?, lease_until = ?, last_started_at = ?
+                    WHERE name = ? AND (lease_until IS NULL OR lease_until < ? OR lease_owner = ?)
+                """, (self.owner, now + LEASE_SECONDS, now, job.name, now, self.owner)).rowcount
+                return taken == 1
+            conn.execute("UPDATE job_state SET last_started_at = ? WHERE name = ?", (now, job.name))
+        return True
+
+    def _record(self, job, started, status, result=None, error=None):
+        now = time.time()
+        failures = job.last["consecutive_failures"] if job.last else 0
+        job.last = {"last_finished_at": now, "last_status": status,
+                    "consecutive_failures": 0 if status == "ok" else failures + 1}
+        with transaction() as conn:
+            conn.execute("""
+                UPDATE job_state SET
+                    last_finished_at = ?,
+                    last_success_at = CASE WHEN ? = 'ok' THEN ? ELSE last_success_at END,
+                    last_status = ?,
+                    last_error = ?,
+                    last_result = ?,
+                    last_duration = ?,
+                    runs = runs + 1,
+                    failures = failures + (? != 'ok'),
+                    consecutive_failures = CASE WHEN ? = 'ok' THEN 0 ELSE consecutive_failures + 1 END,
+                    lease_owner = NULL,
+                    lease_until = NULL
+                WHERE name = ?
+            """, (now, status, now, status, error, json.dumps(result, default=str) if result is not None else None,
+                  now - started, status, status, job.name))
+
+    # -------------------------------------------------------------- running
+
+    def run_job(self, job):
+        """Run a job now (in the calling thread) unless it is already running."""
+        with self._lock:
+            if job.running:
+                return False
+            job.running = True
+        acquired = False
+        try:
+            started = time.time()
+            acquired = self._acquire(job, started)
+            if not acquired:
+                return False
+            try:
+                result = job.func()
+            except Exception as e:
+                print(f"Job {job.name} failed: {e!r}")
+                self._record(job, started, "error", error=repr(e))
+            else:
+                # None: the job had nothing to work with (TMDB down), retried sooner like a failure
+                self._record(job, started, "ok" if result is not None else "no_data", result)
+            return True
+        finally:
+            with self._lock:
+                job.running = False
+                if acquired:
+                    job.next_run = self._due_after(job, self._last_run(job))
+                else:
+                    # Running in another process: look again later
+                    job.next_run = time.time() + min(job.interval, RETRY_SECONDS)
+            self._wake.set()
+
+    def run(self):
+        """Run the scheduler loop in the calling thread, forever."""
+        while True:
+            self._wake.clear()
+            now = time.time()
+            for job in list(self.jobs.values()):
+                if job.running:
+                    continue
+                if job.next_run is None:
+                    job.next_run = self._due_after(job, self.state(job.name))
+                if job.next_run > now:
+                    continue
+                if job.shared:
+                    # Another process may have run it meanwhile
+                    job.next_run = self._due_after(job, self.state(job.name))
+                    if job.next_run > now + 1:
+                        continue
+                job.next_run = float("inf")
+                threading.Thread(target=self.run_job, args=(job,), daemon=True, name=f"job-{job.name}").start()
+            upcoming = min((job.next_run for job in self.jobs.values()), default=now + 60)
+            self._wake.wait(max(min(upcoming - time.time(), 60), 0.05))
+
+    def start(self):
+        """Start the scheduler thread (once; cheap to call again)."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, daemon=True, name="scheduler")
+                self._thread.start()
+
+    def snapshot(self):
+        """Persisted state of every job, with its interval and next run."""
+        jobs = {}
+        for name, job in self.jobs.items():
+            state = self.state(name) or {}
+            state.pop("name", None)
+            jobs[name] = {
+                **state,
+                "interval": job.interval,
+                "shared": job.shared,
+                "running": job.running,
+                "next_run_at": job.next_run if job.next_run != float("inf") else None,
+            }
+        return jobs
+
+
+scheduler = Scheduler()
@@ -1,34 +1,150 @@
 # app/services.py
+import json
 import os
-import requests
+import threading
+import time
+from datetime import date, timedelta
+from functools import partial
 from dotenv import load_dotenv
 
-# Charge l'environnement
+# Charge l'environnement (avant le transport, qui lit ses réglages TMDB_*)
 load_dotenv()
 
+from app import normalize, transport
+from app.breaker import get_breaker
+from app.cache import response_cache
+from app.details import detail_store
+
 API_SECRET = os.environ.get("API_SECRET")
-BASE_URL = "https://api.themoviedb.org/3"
+BASE_URL = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
 IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+BACKDROP_BASE_URL = "https://image.tmdb.org/t/p/original"
+HEADERS = {"Authorization": f"Bearer {API_SECRET}"}
 
+# Attente maximale d'un appel regroupé : le budget d'un appel du transport (toutes tentatives comprises)
+COALESCE_TIMEOUT = transport.CALL_BUDGET + 1
 
-def call_tmdb_api(endpoint, params=None):
-    headers = {"Authorization": f"Bearer {API_SECRET}", "accept": "application/json"}
-    default_params = {"language": "fr-FR"}
-    if params:
-        default_params.update(params)
+# Normaliseurs compilés une fois par type de média et par endpoint : un seul passage par
+# élément, seuls les champs utilisés par les templates et le magasin de fiches sont gardés
+_normalize_movie_page = normalize.compile_page(normalize.list_item_schema("movie", IMAGE_BASE_URL))
+_normalize_tv_page = normalize.compile_page(normalize.list_item_schema("tv", IMAGE_BASE_URL))
+_normalize_movie_detail = normalize.compile_record(normalize.detail_schema("movie", IMAGE_BASE_URL, BACKDROP_BASE_URL))
+_normalize_tv_detail = normalize.compile_record(normalize.detail_schema("tv", IMAGE_BASE_URL, BACKDROP_BASE_URL))
+
+# Fenêtre de sorties utilisée pour les films "à l'affiche" filtrés par genre (celle de /movie/now_playing)
+NOW_PLAYING_DAYS = 42
+
+# Corps renvoyé par _fetch_tmdb_api pour un 404 (film supprimé chez TMDB) : à distinguer d'une
+# panne, mais jamais mis en cache
+NOT_FOUND = b'{"results": [], "total_pages": 0, "not_found": true}'
+
+
+def _fetch_tmdb_api(endpoint, params):
+    """Appel réseau brut : renvoie le corps JSON (bytes), NOT_FOUND pour un 404 ou None en cas d'erreur."""
+    # Circuit ouvert : on renvoie l'erreur tout de suite pour que les routes passent au fallback SQLite
+    breaker = get_breaker(transport.endpoint_label(endpoint))
+    generation = breaker.allow()
+    if generation is None:
+        return None
 
     url = f"{BASE_URL}{endpoint}"
-    response = requests.get(url, headers=headers, params=default_params)
-
-    if response.status_code == 200:
-        data = response.json()
-        # Map 'id' to 'id'
-        for item in data.get("results", []):
-            item["id"] = item.pop("id", None)
-        return data
+    start = time.monotonic()
+    healthy = False
+    try:
+        response = transport.get(url, endpoint, params=params, headers=HEADERS)
+        # Un 4xx (film inexistant, etc.) ne veut pas dire que TMDB est en panne
+        healthy = response is not None and response.status_code < 500 and response.status_code != 429
+    finally:
+        # Toujours rendre le résultat au disjoncteur, même si l'appel lève autre chose qu'une
+        # RequestException : sinon la sonde prise en demi-ouverture ne serait jamais rendue
+        breaker.record(healthy, time.monotonic() - start, generation)
+
+    if response is None:
+        return None
+    elif response.status_code == 200:
+        return response.content
+    elif response.status_code == 404:
+        return NOT_FOUND
     else:
         print(f"Error fetching {url}: {response.status_code}")
-        return {"results": [], "total_pages": 0}    
+        return None
+
+
+class _Flight:
+    """One upstream call in progress, shared by every caller asking for the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+coalescing_stats = {"upstream_calls": 0, "coalesced": 0, "timeouts": 0}
+
+
+def _fetch_coalesced(key, endpoint, params):
+    """
+    Single-flight wrapper around _fetch_tmdb_api.
+
+    The first caller for a key does the upstream call; concurrent callers
+    with the same key wait for it and get the same body (or None on error).
+    The flight is always released, even if the leader raises, and a waiter
+    gives up after COALESCE_TIMEOUT without affecting the others.
+    """
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+            coalescing_stats["upstream_calls"] += 1
+        else:
+            coalescing_stats["coalesced"] += 1
+
+    if leader:
+        try:
+            flight.body = _fetch_tmdb_api(endpoint, params)
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            flight.done.set()
+        return flight.body
+
+    if not flight.done.wait(COALESCE_TIMEOUT):
+        with _inflight_lock:
+            coalescing_stats["timeouts"] += 1
+        return None
+    return flight.body
+
+
+def get_coalescing_stats():
+    with _inflight_lock:
+        return {**coalescing_stats, "in_flight": len(_inflight)}
+
+
+def _fetch_cacheable(key, endpoint, params):
+    body = _fetch_coalesced(key, endpoint, params)
+    return None if body is NOT_FOUND else body
+
+
+def call_tmdb_api(endpoint, params=None, use_cache=True):
+    default_params = {"language": "fr-FR"}
+    if params:
+        default_params.update(params)
+
+    # Lecture via le cache : les réponses en erreur ne sont jamais mises en cache
+    key = response_cache.make_key(endpoint, default_params)
+    body, state = response_cache.get(key) if use_cache else (None, None)
+    if body is None:
+        body = _fetch_coalesced(key, endpoint, default_params)
+        if body is None:
+            return {"results": [], "total_pages": 0}
+        if use_cache and body is not NOT_FOUND:
+            response_cache.set(key, body)
+    elif state == "stale":
+        response_cache.refresh_in_background(key, partial(_fetch_cacheable, key, endpoint, default_params))
+
+    return json.loads(body)
 
 
 def get_movies(search="", page=1, genre_id=None, now_playing=False):
@@ -46,7 +162,15 @@ def get_movies(search="", page=1, genre_id=None, now_playing=False):
     """
     params = {"page": page}
 
-    if now_playing:
+    if now_playing and genre_id:
+        # /movie/now_playing ne filtre pas par genre : même fenêtre de sorties via /discover,
+        # ce qui donne des pages pleines au lieu de pages filtrées après coup
+        endpoint = "/discover/movie"
+        params["sort_by"] = "popularity.desc"
+        params["with_release_type"] = "2|3"
+        params["release_date.gte"] = (date.today() - timedelta(days=NOW_PLAYING_DAYS)).isoformat()
+        params["release_date.lte"] = date.today().isoformat()
+    elif now_playing:
         # Si now_playing est True, on utilise l'endpoint spécifique
         endpoint = "/movie/now_playing"
     elif search:
@@ -58,43 +182,11 @@ def get_movies(search="", page=1, genre_id=None, now_playing=False):
         endpoint = "/discover/movie"
         params["sort_by"] = "popularity.desc"
 
-    # Ajouter le filtre de genre si spécifié et si nous ne sommes pas sur l'endpoint now_playing
-    if genre_id and endpoint != "/movie/now_playing":
+    # Ajouter le filtre de genre si spécifié
+    if genre_id:
         params["with_genres"] = genre_id
 
-    # Si nous sommes sur l'endpoint now_playing et qu'un genre est spécifié,
-    # nous devrons filtrer les résultats après avoir récupéré les données
-    post_filter_by_genre = endpoint == "/movie/now_playing" and genre_id is not None
-
-    data = call_tmdb_api(endpoint, params)
-
-    # Formater les résultats pour inclure l'URL complète des images
-    if "results" in data:
-        # Filtrer les résultats par genre si nécessaire
-        if post_filter_by_genre:
-            filtered_results = []
-            for movie in data["results"]:
-                # Convertir en liste si nécessaire car les genres peuvent être un dictionnaire ou une liste d'ids
-                movie_genres = movie.get("genre_ids", [])
-                if isinstance(movie_genres, list) and genre_id in movie_genres:
-                    filtered_results.append(movie)
-            data["results"] = filtered_results
-
-        # Ajouter l'URL complète pour les posters
-        for movie in data["results"]:
-            if movie.get("poster_path"):
-                movie["poster_url"] = f"{IMAGE_BASE_URL}{movie['poster_path']}"
-            else:
-                movie["poster_url"] = None
-
-        # Parse the name/title so tv shows and movies have the same format. Terrible hack but ya know
-        for movie in data["results"]:
-            if movie.get("original_title") and not movie.get("original_name"):
-                movie["original_name"] = movie["original_title"]
-            if movie.get("title") and not movie.get("name"):
-                movie["name"] = movie["title"]
-
-    return data
+    return _normalize_movie_page(call_tmdb_api(endpoint, params))
 
 
 def get_tv_shows(search="", page=1, genre_id=None):
@@ -124,29 +216,12 @@ def get_tv_shows(search="", page=1, genre_id=None):
     if genre_id:
         params["with_genres"] = genre_id
 
-    data = call_tmdb_api(endpoint, params)
-
-    # Formater les résultats pour inclure l'URL complète des images
-    if "results" in data:
-        for show in data["results"]:
-            if show.get("poster_path"):
-                show["poster_url"] = f"{IMAGE_BASE_URL}{show['poster_path']}"
-            else:
-                show["poster_url"] = None
-
-    # Parse the name/title so tv shows and movies have the same format. Terrible hack but ya know
-    for show in data["results"]:
-        if show.get("original_name") and not show.get("original_title"):
-            show["original_title"] = show["original_name"]
-        if show.get("name") and not show.get("title"):
-            show["title"] = show["name"]
-
-    return data
+    return _normalize_tv_page(call_tmdb_api(endpoint, params))
 
 
 def get_movie_detail(movie_id):
     """
-    Récupère les détails d'un film spécifique depuis l'API TMDB
+    Récupère les détails d'un film spécifique, depuis le magasin de fiches ou l'API TMDB
 
     Args:
         movie_id (int): Identifiant API du film
@@ -154,40 +229,22 @@ def get_movie_detail(movie_id):
     Returns:
         dict: Données détaillées du film
     """
-    endpoint = f"/movie/{movie_id}"
-    params = {"append_to_response": "credits,videos,similar,recommendations"}
-
-    data = call_tmdb_api(endpoint, params)
-
-    # Formater les URLs des images
-    if data.get("poster_path"):
-        data["poster_url"] = f"{IMAGE_BASE_URL}{data['poster_path']}"
-    else:
-        data["poster_url"] = None
-
-    if data.get("backdrop_path"):
-        data["backdrop_url"] = (
-            f"https://image.tmdb.org/t/p/original{data['backdrop_path']}"
-        )
-    else:
-        data["backdrop_url"] = None
+    return detail_store.get("movie", movie_id, partial(_fetch_movie_detail, movie_id))
 
-    # Remapper l'id pour être cohérent
-    if "id" in data:
-        data["id"] = data.pop("id")
 
-    # Parse the name/title so tv shows and movies have the same format. Terrible hack but ya know
-    if data.get("original_title") and not data.get("original_name"):
-        data["original_name"] = data["original_title"]
-    if data.get("title") and not data.get("name"):
-        data["name"] = data["title"]
+def _fetch_movie_detail(movie_id):
+    endpoint = f"/movie/{movie_id}"
+    params = {"append_to_response": "credits,videos,similar,recommendations"}
 
-    return data
+    # Le magasin de fiches fait office de cache : inutile de garder aussi la réponse brute
+    data = call_tmdb_api(endpoint, params, use_cache=False)
+    # Réponse en erreur : renvoyée telle quelle pour que la route passe au fallback
+    return _normalize_movie_detail(data) if data.get("id") else data
 
 
 def get_tv_show_detail(show_id):
     """
-    Récupère les détails d'une série TV spécifique depuis l'API TMDB
+    Récupère les détails d'une série TV spécifique, depuis le magasin de fiches ou l'API TMDB
 
     Args:
         show_id (int): Identifiant API de la série
@@ -195,47 +252,15 @@ def get_tv_show_detail(show_id):
     Returns:
         dict: Données détaillées de la série
     """
-    endpoint = f"/tv/{show_id}"
-    params = {"append_to_response": "credits,videos,similar,recommendations,seasons"}
+    return detail_store.get("tv", show_id, partial(_fetch_tv_show_detail, show_id))
 
-    data = call_tmdb_api(endpoint, params)
 
-    # Formater les URLs des images
-    if data.get("poster_path"):
-        data["poster_url"] = f"{IMAGE_BASE_URL}{data['poster_path']}"
-    else:
-        data["poster_url"] = None
+def _fetch_tv_show_detail(show_id):
+    endpoint = f"/tv/{show_id}"
+    params = {"append_to_response": "credits,videos,similar,recommendations,seasons"}
 
-    if data.get("backdrop_path"):
-        data["backdrop_url"] = (
-            f"https://image.tmdb.org/t/p/original{data['backdrop_path']}"
-        )
-    else:
-        data["backdrop_url"] = None
-
-    # Traiter les saisons si présentes
-    if "seasons" in data:
-        for season in data["seasons"]:
-            if season.get("poster_path"):
-                season["poster_url"] = f"{IMAGE_BASE_URL}{season['poster_path']}"
-            else:
-                season["poster_url"] = None
-
-            # Remapper l'id pour être cohérent
-            if "id" in season:
-                season["id"] = season.pop("id")
-
-    # Remapper l'id pour être cohérent
-    if "id" in data:
-        data["id"] = data.pop("id")
-
-    # Parse the name/title so tv shows and movies have the same format. Terrible hack but ya know
-    if data.get("original_title") and not data.get("original_name"):
-        data["original_name"] = data["original_title"]
-    if data.get("title") and not data.get("name"):
-        data["name"] = data["title"]
-
-    return data
+    data = call_tmdb_api(endpoint, params, use_cache=False)
+    return _normalize_tv_detail(data) if data.get("id") else data
 
 
 def get_tv_genres():
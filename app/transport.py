@@ -0,0 +1,207 @@
+# app/transport.py
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from app import metrics
+
+# Réglages du transport, surchargeables par variables d'environnement
+CONNECT_TIMEOUT = float(os.environ.get("TMDB_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("TMDB_READ_TIMEOUT", 5))
+POOL_SIZE = int(os.environ.get("TMDB_POOL_SIZE", 10))
+MAX_RETRIES = int(os.environ.get("TMDB_MAX_RETRIES", 2))
+BACKOFF_FACTOR = float(os.environ.get("TMDB_BACKOFF_FACTOR", 0.3))
+# Durée maximale d'un appel, tentatives et attentes comprises : les timeouts de chaque tentative
+# sont réduits à ce qu'il reste du budget, et une tentative qui ne tiendrait pas n'est pas lancée
+CALL_BUDGET = float(os.environ.get("TMDB_CALL_BUDGET", 6))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_local = threading.local()
+_session = None
+_session_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """HTTP connection that records how long establishing the socket took."""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _local.handshake = getattr(_local, "handshake", 0.0) + time.perf_counter() - start
+        _local.handshakes = getattr(_local, "handshakes", 0) + 1
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that records how long the TCP + TLS handshake took."""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _local.handshake = getattr(_local, "handshake", 0.0) + time.perf_counter() - start
+        _local.handshakes = getattr(_local, "handshakes", 0) + 1
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def _build_session():
+    # Retries are done by get(), within the call budget, not by urllib3
+    adapter = _TimedAdapter(
+        pool_connections=4,
+        pool_maxsize=POOL_SIZE,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+def get_session():
+    """Returns the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _reset_after_fork():
+    # Chaque worker (gunicorn, etc.) doit avoir son propre pool de sockets
+    global _session, _session_lock, _stats_lock
+    _session = None
+    _session_lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    _stats.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def endpoint_label(endpoint):
+    """Collapse numeric path segments so /movie/123 and /movie/456 share stats."""
+    return re.sub(r"/\d+", "/{id}", endpoint)
+
+
+def _record(label, status, handshakes, handshake, ttfb, transfer, size):
+    with _stats_lock:
+        stats = _stats.setdefault(label, {
+            "requests": 0,
+            "errors": 0,
+            "handshakes": 0,
+            "handshake_time": 0.0,
+            "ttfb_time": 0.0,
+            "transfer_time": 0.0,
+            "bytes": 0,
+            "last_status": None,
+        })
+        stats["requests"] += 1
+        if status is None or status >= 400:
+            stats["errors"] += 1
+        stats["handshakes"] += handshakes
+        stats["handshake_time"] += handshake
+        stats["ttfb_time"] += ttfb
+        stats["transfer_time"] += transfer
+        stats["bytes"] += size
+        stats["last_status"] = status
+
+
+def _retry_delay(response, attempt):
+    delay = BACKOFF_FACTOR * 2 ** attempt
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, float(retry_after))
+    return delay
+
+
+def get(url, endpoint, params=None, headers=None, timeout=None, budget=None):
+    """
+    GET through the shared keep-alive session.
+
+    Connection errors, timeouts and 429/5xx answers are retried with
+    exponential backoff (and Retry-After), up to MAX_RETRIES times, but the
+    whole call never takes longer than budget (TMDB_CALL_BUDGET) seconds.
+
+    Returns the response (the last one if every attempt got an error
+    status), or None when no attempt completed.
+    """
+    _local.handshake = 0.0
+    _local.handshakes = 0
+    start = time.perf_counter()
+    stop_at = start + (budget or CALL_BUDGET)
+    connect_timeout, read_timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    response = None
+    error = None
+    for attempt in range(MAX_RETRIES + 1):
+        remaining = stop_at - time.perf_counter()
+        try:
+            response = get_session().get(
+                url,
+                params=params,
+                headers=headers,
+                timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)),
+            )
+        except requests.RequestException as e:
+            response, error = None, e
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                break
+        delay = _retry_delay(response, attempt)
+        # No attempt is started that the budget could not see through, even briefly
+        if attempt == MAX_RETRIES or time.perf_counter() + delay + 0.1 >= stop_at:
+            break
+        time.sleep(delay)
+    if response is None:
+        print(f"Error fetching {url}: {error.__class__.__name__}")
+    total = time.perf_counter() - start
+
+    label = endpoint_label(endpoint)
+    if response is not None:
+        ttfb = response.elapsed.total_seconds()
+        _record(label, response.status_code, _local.handshakes, _local.handshake,
+                ttfb, max(total - ttfb, 0.0), len(response.content))
+        metrics.observe_tmdb(label, response.status_code, total, len(response.content))
+    else:
+        _record(label, None, _local.handshakes, _local.handshake, total, 0.0, 0)
+        metrics.observe_tmdb(label, None, total, 0)
+    return response
+
+
+def get_transport_stats():
+    """Per-endpoint counters and average timings (seconds) of the TMDB transport."""
+    with _stats_lock:
+        snapshot = {label: dict(stats) for label, stats in _stats.items()}
+    for stats in snapshot.values():
+        count = stats["requests"] or 1
+        stats["avg_handshake"] = stats["handshake_time"] / stats["handshakes"] if stats["handshakes"] else 0.0
+        stats["avg_ttfb"] = stats["ttfb_time"] / count
+        stats["avg_transfer"] = stats["transfer_time"] / count
+    return snapshot
@@ -0,0 +1,202 @@
+# app/warming.py
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from app import transport
+from app.breaker import CLOSED, get_breaker
+
+# Appels de préchauffage par seconde (0 désactive le préchauffage), avec une petite réserve
+RATE = float(os.environ.get("WARM_RATE", 2))
+BURST = int(os.environ.get("WARM_BURST", 5))
+# Fiches préchargées parmi les premiers résultats d'une page
+TOP_DETAILS = int(os.environ.get("WARM_TOP_DETAILS", 4))
+# Premières pages de chaque genre, préchauffées toutes les GENRES_INTERVAL secondes
+GENRE_PAGES = int(os.environ.get("WARM_GENRE_PAGES", 1))
+GENRES_INTERVAL = int(os.environ.get("WARM_GENRES_INTERVAL", 3600))
+# Au-delà de ce nombre d'appels TMDB d'utilisateurs en cours, le préchauffage attend
+MAX_USER_INFLIGHT = int(os.environ.get("WARM_MAX_USER_INFLIGHT", 4))
+QUEUE_SIZE = 200
+# Une même tâche n'est pas refaite avant ce délai (les réponses restent en cache bien plus longtemps)
+RECENT_SECONDS = 300
+RECENT_ITEMS = 2000
+
+
+class TokenBucket:
+    """rate tokens per second, at most burst in reserve."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token. Returns 0, or the seconds to wait before one is available (nothing taken)."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+def _endpoint(task):
+    """TMDB endpoint label a task calls, to check its circuit breaker."""
+    if task[0] == "detail":
+        return f"/{task[1]}/{{id}}"
+    _, media_type, query, _, genre_id, now_playing = task
+    if query:
+        return f"/search/{media_type}"
+    if now_playing and not genre_id:
+        return "/movie/now_playing"
+    return f"/discover/{media_type}"
+
+
+class Warmer:
+    """
+    Background prefetch of the TMDB responses users are likely to ask for next.
+
+    After a listing page is served, the next page and the details of its
+    top results are queued; on a schedule, the first pages of every genre
+    are queued too. One worker thread runs the tasks through the normal
+    tmdb.py functions, so their results land in the response cache and the
+    detail store.
+
+    Warming never competes with users: tasks run at most `rate` per second
+    (token bucket), wait while more than max_user_inflight user calls to
+    TMDB are in progress, are skipped while the endpoint's circuit breaker
+    is not closed (so they never use up half-open probes), and are dropped
+    when the queue is full. User-driven tasks go before scheduled ones.
+    """
+
+    def __init__(self, rate=RATE, burst=BURST, top_details=TOP_DETAILS, max_user_inflight=MAX_USER_INFLIGHT):
+        self.rate = rate
+        self.top_details = top_details
+        self.max_user_inflight = max_user_inflight
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._queues = (deque(), deque())  # prioritaire (navigation), planifiée (genres)
+        self._pending = set()
+        self._recent = OrderedDict()  # task -> monotonic time it ran
+        self._cond = threading.Condition()
+        self._worker = None
+        self._inflight = 0  # warming calls in progress (not user traffic)
+        self.stats = {"queued": 0, "done": 0, "dropped": 0, "skipped_breaker": 0, "failed": 0, "waits_for_users": 0}
+
+    # -------------------------------------------------------------- queueing
+
+    def enqueue(self, task, scheduled=False):
+        """Queue a task unless it is queued already or ran recently. Returns True if queued."""
+        if self._bucket is None:
+            return False
+        with self._cond:
+            ran_at = self._recent.get(task)
+            if task in self._pending or (ran_at is not None and time.monotonic() - ran_at < RECENT_SECONDS):
+                return False
+            queue = self._queues[1 if scheduled else 0]
+            if len(queue) >= QUEUE_SIZE:
+                self.stats["dropped"] += 1
+                return False
+            queue.append(task)
+            self._pending.add(task)
+            self.stats["queued"] += 1
+            self._cond.notify()
+        self._start()
+        return True
+
+    def after_listing(self, media_type, data, page=1, query="", genre_id=None, now_playing=False):
+        """Queue what usually follows a TMDB listing page: the next page, then the top results' details."""
+        results = data.get("results") or []
+        if not results:
+            return
+        if page < data.get("total_pages", 0):
+            self.enqueue(("listing", media_type, query or "", page + 1, genre_id, now_playing))
+        for item in results[:self.top_details]:
+            if item.get("id"):
+                self.enqueue(("detail", media_type, item["id"]))
+
+    def warm_genres(self, pages=GENRE_PAGES):
+        """Queue the first pages of every movie and TV genre. Returns the number of tasks queued, None without genres."""
+        from app.genres import movie_genres, tv_genres
+        lists = (("movie", movie_genres()), ("tv", tv_genres()))
+        if not any(genres for _, genres in lists):
+            return None
+        queued = 0
+        for media_type, genres in lists:
+            for genre in genres:
+                for page in range(1, pages + 1):
+                    queued += self.enqueue(("listing", media_type, "", page, genre["id"], False), scheduled=True)
+        return queued
+
+    # -------------------------------------------------------------- worker
+
+    def _start(self):
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True, name="cache-warmer")
+                self._worker.start()
+
+    def _next(self):
+        with self._cond:
+            while not (self._queues[0] or self._queues[1]):
+                self._cond.wait()
+            task = (self._queues[0] or self._queues[1]).popleft()
+            self._pending.discard(task)
+            return task
+
+    def _user_inflight(self):
+        from app.tmdb import get_coalescing_stats
+        return get_coalescing_stats()["in_flight"] - self._inflight
+
+    def _run(self):
+        while True:
+            task = self._next()
+            wait = self._bucket.take()
+            while wait:
+                time.sleep(wait)
+                wait = self._bucket.take()
+            while self._user_inflight() > self.max_user_inflight:
+                self.stats["waits_for_users"] += 1
+                time.sleep(0.2)
+
+            if get_breaker(transport.endpoint_label(_endpoint(task))).state != CLOSED:
+                self.stats["skipped_breaker"] += 1
+                continue
+            try:
+                self._inflight += 1
+                self.run_task(task)
+                self.stats["done"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Warming task {task} failed:", e)
+            finally:
+                self._inflight -= 1
+            with self._cond:
+                self._recent[task] = time.monotonic()
+                self._recent.move_to_end(task)
+                while len(self._recent) > RECENT_ITEMS:
+                    self._recent.popitem(last=False)
+
+    @staticmethod
+    def run_task(task):
+        from app.tmdb import get_movies, get_tv_shows, get_movie_detail, get_tv_show_detail
+        if task[0] == "detail":
+            _, media_type, id = task
+            (get_movie_detail if media_type == "movie" else get_tv_show_detail)(id)
+            return
+        _, media_type, query, page, genre_id, now_playing = task
+        if media_type == "movie":
+            get_movies(search=query, page=page, genre_id=genre_id, now_playing=now_playing)
+        else:
+            get_tv_shows(search=query, page=page, genre_id=genre_id)
+
+    def snapshot(self):
+        with self._cond:
+            return {**self.stats, "queue": len(self._queues[0]), "scheduled_queue": len(self._queues[1])}
+
+
+warmer = Warmer()
@@ -0,0 +1,74 @@
+# bench/bench_api.py
+"""
+HTML pages against the JSON API: bytes sent and server time per request.
+
+    python -m bench.bench_api [--runs 50] [--json PATH]
+
+Runs the app against the fake TMDB and a temporary database. Upstream
+responses and detail documents are cached after the first request, and
+the page cache and the compressed bodies are cleared before every
+request, so the timings are the cost of building the response (template
+or JSON serialization, plus compression for the API).
+"""
+import argparse
+import os
+import time
+
+from tools.fake_tmdb import start_fake_tmdb
+from bench.common import temporary_database
+from bench.results import add_output_argument, write
+
+
+PAGES = [
+    ("/movies", "/api/v1/movies"),
+    ("/movies", "/api/v1/movies?fields=id,title,poster_url,vote_average"),
+    ("/tv-shows", "/api/v1/tv-shows"),
+    ("/movie/1000", "/api/v1/movie/1000"),
+    ("/tv/5000", "/api/v1/tv/5000"),
+]
+
+
+def measure(client, url, runs, headers):
+    from app.api import _compressed
+    from app.pagecache import page_cache
+
+    client.get(url, headers=headers)
+    elapsed = 0.0
+    for _ in range(runs):
+        page_cache.invalidate()
+        _compressed.clear()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        elapsed += time.perf_counter() - start
+    return len(response.data), elapsed / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    server, _, base_url = start_fake_tmdb()
+    os.environ["TMDB_BASE_URL"] = base_url
+    # No background import or warming competing with the measured requests
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    from app import create_app
+
+    results = []
+    with temporary_database():
+        client = create_app().test_client()
+        for html_url, api_url in PAGES:
+            html_size, html_time = measure(client, html_url, args.runs, {"Accept-Encoding": "identity"})
+            api_size, api_time = measure(client, api_url, args.runs, {"Accept-Encoding": "gzip, br"})
+            results.append({"html": html_url, "api": api_url, "html_bytes": html_size, "api_bytes": api_size,
+                            "html_seconds": html_time, "api_seconds": api_time})
+            print(f"{api_url:<58} | HTML {html_size / 1024:6.1f} KiB {html_time * 1000:6.2f} ms"
+                  f" | JSON {api_size / 1024:6.1f} KiB {api_time * 1000:6.2f} ms"
+                  f" | {html_size / api_size:5.1f}x smaller, {html_time / api_time:4.1f}x faster")
+    server.shutdown()
+    return write(args, "api", results)
+
+
+if __name__ == "__main__":
+    main()
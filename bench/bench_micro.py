@@ -0,0 +1,128 @@
+# bench/bench_micro.py
+"""
+Micro-benchmarks of the hot paths: tmdb.py normalizers and models.py queries at several catalogue sizes.
+
+    python -m bench.bench_micro [--sizes 1000 10000 100000] [--repeat 7] [--json PATH]
+
+Normalizers parse and normalize listing pages and details of the fake TMDB
+catalogue, as call_tmdb_api and get_*_detail do. Queries run on a fresh
+temporary database per size, filled through upsert_medias() like an import,
+so the triggers and indexes are the production ones. Each operation runs in
+`repeat` batches of about 20 ms: the median batch gives the time per call,
+the best batch the floor (a wide gap between them means a noisy machine).
+"""
+import argparse
+import json
+import time
+
+from tools.fake_tmdb import FakeCatalogue, _page
+from bench.common import temporary_database
+from bench.results import add_output_argument, write
+
+BATCH_SECONDS = 0.02
+# Page atteinte en suivant les curseurs, pour la pagination profonde
+DEEP_PAGE = 50
+WATCHLIST_ITEMS = 50
+
+
+def timed(fn, repeat):
+    """{"median_us", "min_us", "calls"} for one call of fn."""
+    fn()  # warm up (statement cache, page cache)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= BATCH_SECONDS or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(int(BATCH_SECONDS / elapsed), 100))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    samples.sort()
+    return {"median_us": samples[len(samples) // 2] * 1e6, "min_us": samples[0] * 1e6, "calls": number * repeat}
+
+
+def bench_normalizers(repeat):
+    from app import tmdb
+
+    catalogue = FakeCatalogue()
+    cases = {
+        "movie_page": (tmdb._normalize_movie_page, _page(catalogue.listing("movie"), 1)),
+        "tv_page": (tmdb._normalize_tv_page, _page(catalogue.listing("tv"), 1)),
+        "movie_detail": (tmdb._normalize_movie_detail, catalogue.detail("movie", 1000)),
+        "tv_detail": (tmdb._normalize_tv_detail, catalogue.detail("tv", 5000)),
+    }
+    results = {}
+    for name, (normalizer, payload) in cases.items():
+        body = json.dumps(payload).encode()
+        results[name] = {**timed(lambda: normalizer(json.loads(body)), repeat), "payload_size": len(body)}
+        print(f"normalize {name:<13} ({len(body) / 1024:6.1f} KiB) {results[name]['median_us']:9.1f} µs")
+    return results
+
+
+def import_catalogue(size):
+    """Import a fake catalogue of size items through upsert_medias(). Returns the seconds taken."""
+    from app.models import media_from_tmdb, upsert_medias
+
+    catalogue = FakeCatalogue(movies=size // 2, tv=size - size // 2, seed=size)
+    medias = [media_from_tmdb(item, media_type)
+              for media_type in ("movie", "tv") for item in catalogue.items[media_type].values()]
+    start = time.perf_counter()
+    upsert_medias(medias)
+    return time.perf_counter() - start
+
+
+def bench_queries(size, repeat):
+    from app import models, sampler
+
+    with temporary_database():
+        import_seconds = import_catalogue(size)
+
+        cursor = None
+        for _ in range(DEEP_PAGE - 1):
+            cursor = models.fetch_medias_page("movie", cursor=cursor)["next_cursor"] or cursor
+        sampler.sampler = sampler.SuggestionSampler()
+        sampler.sampler.refresh()
+        models.upsert_towatchs([{"id": 1000 + n, "media_type": "movie", "title": f"Film {n}"}
+                                for n in range(WATCHLIST_ITEMS)])
+
+        operations = {
+            "fetch_medias_page": lambda: models.fetch_medias_page("movie"),
+            "fetch_medias_page_deep": lambda: models.fetch_medias_page("movie", cursor=cursor),
+            "fetch_medias_page_genre": lambda: models.fetch_medias_page("movie", genre_id=28),
+            "fetch_medias_page_now_playing": lambda: models.fetch_medias_page("movie", now_playing=True),
+            "search_medias": lambda: models.search_medias("nuit", "movie"),
+            "search_medias_prefix": lambda: models.search_medias("ombre lumi", "both"),
+            "fetch_media": lambda: models.fetch_media(1000),
+            "fetch_suggestions_20": lambda: models.fetch_suggestions("movie", 7.0, 20),
+            "fetch_towatchs": lambda: models.fetch_towatchs(),
+        }
+        results = {"size": size, "import_rows_per_second": size / import_seconds}
+        for name, fn in operations.items():
+            results[name] = timed(fn, repeat)
+
+    print(f"{size:>9} rows | import {results['import_rows_per_second']:8.0f} rows/s | " + " | ".join(
+        f"{name} {results[name]['median_us']:8.1f} µs" for name in operations))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=7)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    results = {
+        "normalizers": bench_normalizers(args.repeat),
+        "queries": [bench_queries(size, args.repeat) for size in args.sizes],
+    }
+    return write(args, "micro", results)
+
+
+if __name__ == "__main__":
+    main()
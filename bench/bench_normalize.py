@@ -0,0 +1,142 @@
+# bench/bench_normalize.py
+"""
+Detail and listing normalization: the former multi-pass code against the compiled normalizers.
+
+    python -m bench.bench_normalize [--cast 200] [--crew 400] [--runs 200] [--json PATH]
+
+Payloads come from the fake TMDB catalogue, with credits inflated to the
+size of a large append_to_response detail. For each variant it reports the
+CPU time of a request that goes upstream (parse, normalize, compress for
+the detail store), of a request served from the detail store (decompress,
+parse), and the memory each normalized document keeps.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+import zlib
+
+from app import normalize
+from app.details import COMPRESSION_LEVEL
+from app.tmdb import BACKDROP_BASE_URL, IMAGE_BASE_URL
+from tools.fake_tmdb import FakeCatalogue
+from bench.results import add_output_argument, write
+
+
+
+def legacy_detail(body):
+    """What get_movie_detail did before the normalizers."""
+    data = json.loads(body)
+    for item in data.get("results", []):
+        item["id"] = item.pop("id", None)
+    if data.get("poster_path"):
+        data["poster_url"] = f"{IMAGE_BASE_URL}{data['poster_path']}"
+    else:
+        data["poster_url"] = None
+    if data.get("backdrop_path"):
+        data["backdrop_url"] = f"https://image.tmdb.org/t/p/original{data['backdrop_path']}"
+    else:
+        data["backdrop_url"] = None
+    if "id" in data:
+        data["id"] = data.pop("id")
+    if data.get("original_title") and not data.get("original_name"):
+        data["original_name"] = data["original_title"]
+    if data.get("title") and not data.get("name"):
+        data["name"] = data["title"]
+    return data
+
+
+def legacy_page(body):
+    """What get_movies did before the normalizers."""
+    data = json.loads(body)
+    for item in data.get("results", []):
+        item["id"] = item.pop("id", None)
+    for movie in data["results"]:
+        if movie.get("poster_path"):
+            movie["poster_url"] = f"{IMAGE_BASE_URL}{movie['poster_path']}"
+        else:
+            movie["poster_url"] = None
+    for movie in data["results"]:
+        if movie.get("original_title") and not movie.get("original_name"):
+            movie["original_name"] = movie["original_title"]
+        if movie.get("title") and not movie.get("name"):
+            movie["name"] = movie["title"]
+    return data
+
+
+def payloads(cast, crew):
+    catalogue = FakeCatalogue(movies=200, tv=0)
+    detail = catalogue.detail("movie", 1000)
+    detail["credits"]["cast"] = [
+        dict(detail["credits"]["cast"][n % 30], order=n, known_for_department="Acting", popularity=1.5,
+             credit_id=f"c{n:024d}", original_name=f"Acteur {n}", gender=n % 3, adult=False)
+        for n in range(cast)
+    ]
+    detail["credits"]["crew"] = [
+        {"id": n, "name": f"Technicien {n}", "job": "Sound", "department": "Sound", "credit_id": f"k{n:024d}",
+         "profile_path": None, "popularity": 0.6, "gender": 0, "adult": False, "original_name": f"Technicien {n}"}
+        for n in range(crew)
+    ]
+    listing = {"page": 1, "results": catalogue.listing("movie")[:20], "total_pages": 10, "total_results": 200}
+    return json.dumps(detail).encode(), json.dumps(listing).encode()
+
+
+def cpu_time(fn, arg, runs):
+    fn(arg)
+    start = time.process_time()
+    for _ in range(runs):
+        fn(arg)
+    return (time.process_time() - start) / runs
+
+
+def encode(doc):
+    return zlib.compress(json.dumps(doc, separators=(",", ":")).encode(), COMPRESSION_LEVEL)
+
+
+def decode(body):
+    return json.loads(zlib.decompress(body))
+
+
+def measure(fn, body, runs):
+    fetch = cpu_time(lambda body: encode(fn(body)), body, runs)
+    hit = cpu_time(decode, encode(fn(body)), runs)
+
+    # Memory kept by the documents: what a cache or a template context holds on to
+    gc.collect()
+    tracemalloc.start()
+    kept = [fn(body) for _ in range(20)]
+    retained = tracemalloc.get_traced_memory()[0] / len(kept)
+    tracemalloc.stop()
+    return fetch, hit, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cast", type=int, default=200)
+    parser.add_argument("--crew", type=int, default=400)
+    parser.add_argument("--runs", type=int, default=200)
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    detail_body, page_body = payloads(args.cast, args.crew)
+    normalize_detail = normalize.compile_record(normalize.detail_schema("movie", IMAGE_BASE_URL, BACKDROP_BASE_URL))
+    normalize_page = normalize.compile_page(normalize.list_item_schema("movie", IMAGE_BASE_URL))
+    cases = [
+        ("detail", len(detail_body), legacy_detail, lambda body: normalize_detail(json.loads(body))),
+        ("listing", len(page_body), legacy_page, lambda body: normalize_page(json.loads(body))),
+    ]
+
+    results = {}
+    for name, size, legacy, compiled in cases:
+        results[name] = {"payload_bytes": size}
+        for variant, fn in (("legacy", legacy), ("normalized", compiled)):
+            fetch, hit, retained = measure(fn, detail_body if name == "detail" else page_body, args.runs)
+            results[name][variant] = {"fetch_cpu_seconds": fetch, "hit_cpu_seconds": hit, "retained_bytes": retained}
+            print(f"{name:>7} ({size / 1024:6.1f} KiB) | {variant:>10} | upstream {fetch * 1e6:8.1f} µs CPU"
+                  f" | stored {hit * 1e6:8.1f} µs CPU | {retained / 1024:7.1f} KiB kept per document")
+    return write(args, "normalize", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench/bench_search.py
+"""
+Offline full-text search (FTS5) latency on a synthetic catalogue.
+
+    python -m bench.bench_search [--sizes 10000 100000 300000] [--runs 50] [--json PATH]
+
+Each size gets a fresh temporary database filled with French-looking text.
+"""
+import argparse
+import itertools
+import random
+import time
+
+from bench.common import fill, temporary_database
+from bench.results import add_output_argument, write
+
+
+# Mots outils en tête, puis un long vocabulaire généré où les mots de WORDS sont répartis
+# entre le 100e et le 2000e rang, tirés selon une loi de Zipf comme du vrai texte
+STOPWORDS = ["la", "le", "de", "et", "un", "une", "les", "des", "à", "en", "du", "son", "qui", "dans"]
+WORDS = ["vie", "homme", "jeune", "femme", "monde", "nuit", "amour", "guerre", "famille", "éclipse", "océan",
+         "mémoire", "cité", "étoile", "forêt", "silence", "héros", "voyage", "ombre", "lumière", "révolte",
+         "dernier", "empire", "rivière", "hiver", "secret", "château", "chemin"]
+SYLLABLES = ["ba", "ché", "de", "fo", "gu", "la", "mé", "no", "pi", "ro", "sa", "té", "vi", "zo", "an", "eur"]
+QUERIES = ["nuit", "etoile", "heros voy", "le dernier empire", "vie", "jeune femme", "cha", "riviere secret", "zzz"]
+
+
+def vocabulary(rng, size=20_000):
+    words = list(STOPWORDS)
+    while len(words) < size:
+        words.append("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    for n, word in enumerate(WORDS):
+        words[100 + n * 1900 // len(WORDS)] = word
+    return words
+
+
+def rows(size):
+    rng = random.Random(size)
+    words = vocabulary(rng)
+    zipf = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+    def text(count):
+        return " ".join(rng.choices(words, cum_weights=zipf, k=count))
+
+    for i in range(size):
+        title = text(rng.randint(1, 4)).capitalize()
+        yield (i, rng.choice(("movie", "tv")), title, title, "2020-01-01", text(40),
+               f"/{i}.jpg", round(rng.uniform(0, 10), 1), rng.uniform(0, 1000))
+
+
+def run(size, runs):
+    with temporary_database():
+        fill(rows(size))
+
+        from app.models import search_medias
+
+        timings = {}
+        for query in QUERIES:
+            start = time.perf_counter()
+            for _ in range(runs):
+                search_medias(query, "movie")
+            timings[query] = (time.perf_counter() - start) / runs
+
+    print(f"{size:>9} rows | " + " | ".join(f"{query!r} {seconds * 1000:6.2f} ms" for query, seconds in timings.items()))
+    return {"size": size, "search_seconds": timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--runs", type=int, default=50)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    return write(args, "search", [run(size, args.runs) for size in args.sizes])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench/bench_suggestion.py
+"""
+Random suggestion: ORDER BY RANDOM() against the in-memory sampler.
+
+    python -m bench.bench_suggestion [--sizes 10000 100000 1000000] [--runs 50] [--json PATH]
+
+Each size gets a fresh temporary database filled with synthetic rows.
+"""
+import argparse
+import time
+
+from app import database
+from bench.common import fill, synthetic_rows, temporary_database
+from bench.results import add_output_argument, write
+
+
+OLD_QUERY = """
+    SELECT id, media_type, title, original_title, release_date, overview, poster_path, vote_average
+    FROM media
+    WHERE 1=1 AND media_type = ? AND vote_average >= ?
+    ORDER BY RANDOM() LIMIT 1
+"""
+
+
+def timed(fn, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs
+
+
+def run(size, runs):
+    with temporary_database():
+        fill(synthetic_rows(size))
+
+        from app.sampler import SuggestionSampler
+        from app.models import fetch_suggestions
+
+        conn = database.connection()
+        old = timed(lambda: conn.execute(OLD_QUERY, ("movie", 7.0)).fetchone(), runs)
+
+        sampler = SuggestionSampler()
+        start = time.perf_counter()
+        sampler.refresh()
+        build = time.perf_counter() - start
+
+        import app.sampler
+        app.sampler.sampler = sampler
+        one = timed(lambda: fetch_suggestions("movie", 7.0, 1), runs)
+        batch = timed(lambda: fetch_suggestions("movie", 7.0, 20), runs)
+
+    print(f"{size:>9} rows | ORDER BY RANDOM() {old * 1000:8.3f} ms | sampler build {build * 1000:8.1f} ms"
+          f" | 1 suggestion {one * 1000:6.3f} ms | 20 suggestions {batch * 1000:6.3f} ms")
+    return {"size": size, "order_by_random_seconds": old, "sampler_build_seconds": build, "sampler_one_seconds": one,
+            "sampler_batch_20_seconds": batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--runs", type=int, default=50)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    return write(args, "suggestion", [run(size, args.runs) for size in args.sizes])
+
+
+if __name__ == "__main__":
+    main()
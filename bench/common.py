@@ -0,0 +1,46 @@
+# bench/common.py
+"""
+Helpers shared by the benchmarks: a throwaway database and synthetic media rows.
+"""
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+
+from app import database
+
+INSERT_MEDIA = """
+    INSERT INTO media (id, media_type, title, original_title, release_date, overview, poster_path, vote_average, popularity)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+@contextmanager
+def temporary_database(name="bench.db"):
+    """Point app.database at a freshly migrated database in a temporary directory, removed afterwards."""
+    previous = database.DB_PATH
+    with tempfile.TemporaryDirectory() as directory:
+        database.close_connection()
+        database.DB_PATH = os.path.join(directory, name)
+        try:
+            database.migrate()
+            yield database.DB_PATH
+        finally:
+            database.close_connection()
+            database.DB_PATH = previous
+
+
+def synthetic_rows(size, overview_length=200):
+    """Rows for INSERT_MEDIA: numbered titles, a filler overview and random votes, the same for a given size."""
+    rng = random.Random(size)
+    return (
+        (i, rng.choice(("movie", "tv")), f"Titre {i}", f"Titre original {i}", "2020-01-01", "x" * overview_length,
+         f"/{i}.jpg", round(rng.uniform(0, 10), 1), rng.uniform(0, 1000))
+        for i in range(size)
+    )
+
+
+def fill(rows):
+    """Insert media rows in one transaction, bypassing the import (no FTS or sampler work beyond the triggers)."""
+    with database.transaction() as conn:
+        conn.executemany(INSERT_MEDIA, rows)
@@ -0,0 +1,46 @@
+# bench/compare.py
+"""
+Compare two benchmark result files and flag regressions.
+
+    python -m bench.compare base.json new.json [--threshold 0.10] [--all]
+
+Metrics are matched by key (e.g. size=10000.fetch_medias_page.p50_us).
+A timing that grew by more than the threshold, or a throughput that fell by
+more than it, is a regression; the exit status is 1 if there is any, so CI
+can fail on it. Only changed metrics are listed unless --all.
+"""
+import argparse
+import sys
+
+from bench.results import compare, load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts (0.10 = 10%%)")
+    parser.add_argument("--all", action="store_true", help="list unchanged metrics too")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    if base.get("benchmark") != new.get("benchmark"):
+        print(f"Warning: comparing {base.get('benchmark')} with {new.get('benchmark')}")
+    print(f"{base.get('benchmark')}: {base.get('git_commit')} ({base.get('created_at')})"
+          f" -> {new.get('git_commit')} ({new.get('created_at')})")
+
+    rows = compare(base, new, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    for key, old, current, change, flag in rows:
+        if flag or args.all:
+            print(f"{key:<{width}} {old:>12.6g} -> {current:>12.6g} {change:>+8.1%}  {flag.upper()}")
+
+    regressions = sum(1 for row in rows if row[4] == "regression")
+    improvements = sum(1 for row in rows if row[4] == "improvement")
+    print(f"{len(rows)} metrics compared: {regressions} regressions, {improvements} improvements"
+          f" (threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
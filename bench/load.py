@@ -0,0 +1,208 @@
+# bench/load.py
+"""
+Concurrent HTTP load on the app's routes: throughput and p50/p95/p99 latency.
+
+    python -m bench.load [--concurrency 8] [--duration 10] [--warmup 2] [--mix browse] [--json PATH]
+    python -m bench.load --latency 80 --jitter 40 --error-rate 0.05   # slow, flaky TMDB
+    python -m bench.load --url http://127.0.0.1:5000                  # an app already running
+
+Without --url, a server process is started with the app on a temporary
+database, a fake TMDB in front of it (with the fault options of
+tools.fake_tmdb) and the first --pages pages imported, the scheduler off.
+Clients run in this process and the server in its own, so they do not
+share a GIL. --cold turns the page and response caches off to load the
+full path to TMDB. Each worker draws its paths from the mix with its own
+seeded generator: two runs with the same options send the same requests.
+"""
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from tools.fake_tmdb import WORDS, add_fault_arguments, faults_from_args, start_fake_tmdb
+from bench.results import add_output_argument, write
+
+# Identifiants du faux catalogue par défaut (500 films, 300 séries)
+MOVIE_IDS = (1000, 1499)
+TV_IDS = (5000, 5299)
+
+# (poids, route, chemin tiré au sort)
+MIXES = {
+    "browse": [
+        (25, "index", lambda rng: "/"),
+        (15, "movies", lambda rng: f"/movies?page={rng.randint(1, 5)}"),
+        (10, "tv_shows", lambda rng: f"/tv-shows?page={rng.randint(1, 5)}"),
+        (10, "now_playing", lambda rng: "/now-playing"),
+        (15, "movie_detail", lambda rng: f"/movie/{rng.randint(*MOVIE_IDS)}"),
+        (10, "tv_detail", lambda rng: f"/tv/{rng.randint(*TV_IDS)}"),
+        (10, "search", lambda rng: f"/movies?query={rng.choice(WORDS)}"),
+        (5, "to_watch", lambda rng: "/to-watch"),
+    ],
+    "api": [
+        (30, "api_movies", lambda rng: f"/api/v1/movies?page={rng.randint(1, 5)}"),
+        (20, "api_tv_shows", lambda rng: "/api/v1/tv-shows"),
+        (10, "api_now_playing", lambda rng: "/api/v1/now-playing"),
+        (25, "api_movie", lambda rng: f"/api/v1/movie/{rng.randint(*MOVIE_IDS)}"),
+        (15, "api_tv", lambda rng: f"/api/v1/tv/{rng.randint(*TV_IDS)}"),
+    ],
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def summarize(samples, seconds):
+    """Throughput and latency (ms) of a list of (latency seconds, ok) samples."""
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "requests_per_second": len(samples) / seconds,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def worker(base_url, mix, seed, start_at, stop_at, samples):
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in mix]
+    session = requests.Session()
+    while time.perf_counter() < stop_at:
+        _, route, path = rng.choices(mix, weights)[0]
+        started = time.perf_counter()
+        try:
+            ok = session.get(base_url + path(rng), timeout=30).status_code < 400
+        except requests.RequestException:
+            ok = False
+        finished = time.perf_counter()
+        if started >= start_at:
+            samples.append((route, finished - started, ok))
+
+
+def run_load(base_url, mix, concurrency, duration, warmup, seed):
+    samples = []
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+    threads = [threading.Thread(target=worker, args=(base_url, mix, seed + n, start_at, stop_at, samples))
+               for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    routes = {}
+    for route, latency, ok in samples:
+        routes.setdefault(route, []).append((latency, ok))
+    return {
+        "total": summarize([(latency, ok) for _, latency, ok in samples], duration),
+        "routes": [{"route": route, **summarize(routes[route], duration)}
+                   for route in sorted(routes)],
+    }
+
+
+# ---------------------------------------------------------------- server process
+
+def serve(args):
+    """Run the app against a fake TMDB on a temporary database, then print READY <url>."""
+    from werkzeug.serving import make_server
+
+    _, _, tmdb_url = start_fake_tmdb(faults=faults_from_args(args))
+    os.environ["TMDB_BASE_URL"] = tmdb_url
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    if args.cold:
+        os.environ["PAGE_CACHE_MAX_BYTES"] = "0"
+        os.environ["TMDB_CACHE_MAX_BYTES"] = "0"
+
+    from bench.common import temporary_database
+    from app import create_app
+    from app.models import fill_db_from_tmdb
+
+    # Stopped with SIGTERM by the client process: leave through the with block so the database is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with temporary_database("load.db"):
+        app = create_app()
+        fill_db_from_tmdb(pages=args.pages)
+
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        print(f"READY http://127.0.0.1:{server.server_port}", flush=True)
+        server.serve_forever()
+
+
+def _drain(stream):
+    for _ in stream:
+        pass
+
+
+def start_server(args):
+    command = [sys.executable, "-m", "bench.load", "--serve", "--pages", str(args.pages),
+               "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+               "--error-status", str(args.error_status), "--stall-rate", str(args.stall_rate),
+               "--seed", str(args.seed)]
+    if args.faults_path:
+        command += ["--faults-path", args.faults_path]
+    if args.cold:
+        command.append("--cold")
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for line in process.stdout:
+        if line.startswith("READY "):
+            # Keep reading what the server prints, or it blocks once the pipe is full
+            threading.Thread(target=_drain, args=(process.stdout,), daemon=True).start()
+            return process, line.split()[1]
+    process.wait()
+    raise RuntimeError(f"The server process exited with status {process.returncode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="load an app already running instead of starting one")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="browse")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of load before measuring")
+    parser.add_argument("--pages", type=int, default=3, help="TMDB pages imported before the run")
+    parser.add_argument("--cold", action="store_true", help="no page or response cache")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    add_fault_arguments(parser)
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    process = None
+    base_url = args.url
+    if base_url is None:
+        process, base_url = start_server(args)
+    try:
+        results = run_load(base_url.rstrip("/"), MIXES[args.mix], args.concurrency, args.duration, args.warmup,
+                           args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    for row in [{"route": "total", **results["total"]}] + results["routes"]:
+        print(f"{row['route']:<16} {row['requests']:>7} req {row['requests_per_second']:8.1f} req/s"
+              f" | p50 {row['p50_ms']:7.1f} ms p95 {row['p95_ms']:7.1f} ms p99 {row['p99_ms']:7.1f} ms"
+              f" | {row['errors']} errors")
+    return write(args, "load", results)
+
+
+if __name__ == "__main__":
+    main()
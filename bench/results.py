@@ -0,0 +1,119 @@
+# bench/results.py
+"""
+Machine-readable benchmark results, to compare runs (see bench.compare).
+
+Every benchmark takes --json PATH and writes there what its main() returns,
+wrapped with the run's context: benchmark name, parameters, git commit,
+Python version and machine.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+# Clés qui identifient un élément de liste (une taille de catalogue, une route...) plutôt que sa position
+ID_KEYS = ("name", "size", "route", "url", "api", "query")
+# Sens de chaque métrique d'après son nom : plus haut est mieux pour ceux-ci...
+HIGHER_IS_BETTER = ("per_second", "throughput", "hit_ratio", "smaller", "faster")
+# ... plus bas est mieux pour ceux-là ; les autres (tailles, compteurs) ne sont pas comparés
+LOWER_IS_BETTER = ("seconds", "_ms", "_us", "p50", "p95", "p99", "mean", "max", "bytes", "errors", "error_rate")
+
+
+def add_output_argument(parser):
+    parser.add_argument("--json", metavar="PATH", help="also write the results to this JSON file")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save(path, benchmark, results, params=None):
+    document = {
+        "benchmark": benchmark,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        "params": params or {},
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {path}")
+    return document
+
+
+def write(args, benchmark, results):
+    """Save results if --json was given. Returns results, for main()."""
+    if getattr(args, "json", None):
+        save(args.json, benchmark, results, {key: value for key, value in vars(args).items() if key != "json"})
+    return results
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _item_key(item, index):
+    for key in ID_KEYS:
+        if isinstance(item, dict) and isinstance(item.get(key), (str, int)):
+            return f"{key}={item[key]}"
+    return str(index)
+
+
+def flatten(value, prefix=""):
+    """{"a.size=1000.p50_ms": 1.2, ...}: every number of a results tree, under a stable dotted key."""
+    metrics = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            metrics.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            key = _item_key(item, index)
+            metrics.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        metrics[prefix] = value
+    return metrics
+
+
+def direction(key):
+    """
+    'higher' or 'lower' (is better) for a flattened metric key, None if it is not a performance figure.
+
+    The last segment naming a unit decides: size=1000.search_seconds.nuit is a time.
+    """
+    for name in reversed(key.lower().split(".")):
+        if any(part in name for part in HIGHER_IS_BETTER):
+            return "higher"
+        if any(part in name for part in LOWER_IS_BETTER):
+            return "lower"
+    return None
+
+
+def compare(base, new, threshold=0.10):
+    """
+    Compare two results documents metric by metric.
+
+    Returns rows (key, base value, new value, relative change, flag) where
+    flag is "regression" or "improvement" when a metric moved the wrong or
+    right way by more than threshold, else "".
+    """
+    old_metrics, new_metrics = flatten(base["results"]), flatten(new["results"])
+    rows = []
+    for key in sorted(old_metrics.keys() & new_metrics.keys()):
+        better = direction(key)
+        if better is None:
+            continue
+        old, current = old_metrics[key], new_metrics[key]
+        change = (current - old) / abs(old) if old else (0.0 if current == old else float("inf"))
+        worse = change > threshold if better == "lower" else change < -threshold
+        improved = change < -threshold if better == "lower" else change > threshold
+        rows.append((key, old, current, change, "regression" if worse else "improvement" if improved else ""))
+    return rows
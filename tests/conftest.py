@@ -0,0 +1,51 @@
+# tests/conftest.py
+import time
+
+import pytest
+
+from app import database, tmdb
+from tools.fake_tmdb import Faults, start_fake_tmdb
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A freshly migrated SQLite database in a temporary directory."""
+    database.close_connection()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    database.migrate()
+    yield database
+    database.close_connection()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """Flask test client on the temporary database, background jobs off."""
+    from app import create_app, scheduler
+
+    monkeypatch.setattr(scheduler, "ENABLED", False)
+    app = create_app()
+    app.config["TESTING"] = True
+    return app.test_client()
+
+
+@pytest.fixture
+def fake_tmdb(monkeypatch):
+    """The fake TMDB in a thread, with tmdb.py pointed at it. Yields (catalogue, faults, base_url)."""
+    from app import breaker
+    from app.cache import response_cache
+
+    faults = Faults()
+    server, catalogue, base_url = start_fake_tmdb(faults=faults)
+    monkeypatch.setattr(tmdb, "BASE_URL", base_url)
+    # Breakers and cached responses are per process: start every test from a clean state
+    breaker._breakers.clear()
+    response_cache.invalidate()
+    yield catalogue, faults, base_url
+    # A call a fan-out left running past its deadline would report to the next test's breakers
+    deadline = time.monotonic() + 10
+    while tmdb.get_coalescing_stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    server.shutdown()
+    server.server_close()
+    breaker._breakers.clear()
+    response_cache.invalidate()
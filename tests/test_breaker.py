@@ -0,0 +1,61 @@
+# tests/test_breaker.py
+import time
+
+from app.breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+
+
+def breaker(**settings):
+    return CircuitBreaker("/test", **{"window": 10, "min_calls": 4, "failure_ratio": 0.5, "slow_call": 1.0,
+                                      "open_seconds": 0.05, "probes": 2, **settings})
+
+
+def fail(circuit, times=1, success=False, duration=0.01):
+    for _ in range(times):
+        circuit.record(success, duration, circuit.allow())
+
+
+def test_opens_once_the_window_has_enough_failures():
+    circuit = breaker()
+    fail(circuit, 3)
+    assert circuit.state == CLOSED  # fewer than min_calls outcomes
+    fail(circuit)
+    assert circuit.state == OPEN
+    assert circuit.allow() is None
+
+
+def test_slow_calls_count_as_failures():
+    circuit = breaker()
+    fail(circuit, 4, success=True, duration=2.0)
+    assert circuit.state == OPEN
+
+
+def test_half_open_probes_close_or_reopen():
+    circuit = breaker()
+    fail(circuit, 4)
+    time.sleep(0.06)
+    first, second = circuit.allow(), circuit.allow()
+    assert circuit.state == HALF_OPEN and first and second
+    assert circuit.allow() is None  # only `probes` calls while half-open
+    circuit.record(True, 0.01, first)
+    circuit.record(True, 0.01, second)
+    assert circuit.state == CLOSED
+
+    fail(circuit, 4)
+    time.sleep(0.06)
+    fail(circuit)
+    assert circuit.state == OPEN
+
+
+def test_outcomes_from_before_a_state_change_are_ignored():
+    circuit = breaker()
+    slow_call = circuit.allow()  # let through while closed
+    fail(circuit, 4)
+    time.sleep(0.06)
+    probe = circuit.allow()
+    assert circuit.state == HALF_OPEN
+    # The old call finishing now is neither a probe success nor a probe failure
+    circuit.record(False, 0.01, slow_call)
+    assert circuit.state == HALF_OPEN
+    circuit.record(True, 0.01, probe)
+    circuit.record(True, 0.01, circuit.allow())
+    assert circuit.state == CLOSED
@@ -0,0 +1,94 @@
+# tests/test_cache.py
+import threading
+import time
+
+import pytest
+
+from app import cache
+from app.cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def key(endpoint, **params):
+    return ResponseCache.make_key(endpoint, {"language": "fr-FR", **params})
+
+
+def test_fresh_then_stale_then_expired(clock):
+    responses = ResponseCache(stale_factor=1.0)
+    responses.set(key("/movie/popular"), b"body", ttl=10)
+    assert responses.get(key("/movie/popular")) == (b"body", "fresh")
+    clock.now += 10
+    assert responses.get(key("/movie/popular")) == (b"body", "stale")
+    clock.now += 10
+    assert responses.get(key("/movie/popular")) == (None, None)
+    assert responses.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted_first(clock):
+    responses = ResponseCache(max_bytes=10)
+    responses.set(key("/a"), b"aaaa")
+    responses.set(key("/b"), b"bbbb")
+    responses.get(key("/a"))
+    responses.set(key("/c"), b"cccc")
+    assert responses.get(key("/b")) == (None, None)
+    assert responses.get(key("/a"))[1] == "fresh"
+    assert responses.stats()["bytes"] == 8
+
+
+def test_uncacheable_bodies_are_not_stored(clock):
+    responses = ResponseCache(max_bytes=10)
+    responses.set(key("/movie/changes"), b"x")  # TTL 0
+    responses.set(key("/movie/popular"), b"x" * 11)
+    assert responses.stats()["entries"] == 0
+
+
+def test_key_ignores_param_order_and_none():
+    assert key("/discover/movie", page=1, with_genres=None, sort_by="popularity.desc") == \
+        key("/discover/movie", sort_by="popularity.desc", page="1")
+
+
+def test_one_background_refresh_per_key(clock):
+    responses = ResponseCache()
+    responses.set(key("/movie/popular"), b"old", ttl=10)
+    clock.now += 15
+    release, calls = threading.Event(), []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return b"new"
+
+    responses.refresh_in_background(key("/movie/popular"), loader)
+    responses.refresh_in_background(key("/movie/popular"), loader)
+    assert responses.get(key("/movie/popular")) == (b"old", "stale")
+    release.set()
+    for _ in range(100):
+        if responses.stats()["refreshes"]:
+            break
+        time.sleep(0.01)
+    assert calls == [1]
+    assert responses.get(key("/movie/popular")) == (b"new", "fresh")
+
+
+def test_error_responses_are_not_cached(fake_tmdb):
+    from app.tmdb import call_tmdb_api
+
+    _, faults, _ = fake_tmdb
+    faults.error_rate = 1.0
+    assert call_tmdb_api("/discover/movie", {"page": 1}) == {"results": [], "total_pages": 0}
+    faults.error_rate = 0.0
+    assert call_tmdb_api("/discover/movie", {"page": 1})["results"]
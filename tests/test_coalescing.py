@@ -0,0 +1,64 @@
+# tests/test_coalescing.py
+import threading
+import time
+from unittest import mock
+
+from app import tmdb
+
+
+def run_concurrently(count, fn):
+    results = [None] * count
+    threads = [threading.Thread(target=lambda n=n: results.__setitem__(n, fn())) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_calls_share_one_upstream_request(fake_tmdb):
+    _, faults, _ = fake_tmdb
+    faults.latency = 0.3
+    before = tmdb.get_coalescing_stats()
+    key = ("/discover/movie", "fr-FR", (("page", "1"),))
+    bodies = run_concurrently(5, lambda: tmdb._fetch_coalesced(key, "/discover/movie", {"page": 1}))
+    after = tmdb.get_coalescing_stats()
+    assert bodies[0] and all(body == bodies[0] for body in bodies)
+    assert after["upstream_calls"] - before["upstream_calls"] == 1
+    assert after["coalesced"] - before["coalesced"] == 4
+    assert after["in_flight"] == 0
+
+
+def test_a_failing_leader_releases_its_waiters():
+    started, release = threading.Event(), threading.Event()
+
+    def fetch(endpoint, params):
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    key = ("/movie/1", "fr-FR", ())
+    with mock.patch.object(tmdb, "_fetch_tmdb_api", side_effect=fetch):
+        errors = []
+
+        def lead():
+            try:
+                tmdb._fetch_coalesced(key, "/movie/1", {})
+            except RuntimeError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait(5)
+        coalesced = tmdb.get_coalescing_stats()["coalesced"]
+        waiter = []
+        follower = threading.Thread(target=lambda: waiter.append(tmdb._fetch_coalesced(key, "/movie/1", {})))
+        follower.start()
+        # Release the leader only once the follower waits on its flight
+        while tmdb.get_coalescing_stats()["coalesced"] == coalesced:
+            time.sleep(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+    assert errors and waiter == [None]
+    assert tmdb.get_coalescing_stats()["in_flight"] == 0
@@ -0,0 +1,50 @@
+# tests/test_details.py
+import os
+import time
+
+from app.database import connection, transaction
+from app.details import DetailStore
+
+
+def _doc(id):
+    # Random bytes do not compress: every document has about the same stored size
+    return {"id": id, "overview": os.urandom(2000).hex()}
+
+
+def _stored():
+    return connection().execute("SELECT id, size FROM detail_doc ORDER BY id").fetchall()
+
+
+def test_running_total_matches_the_table(db):
+    store = DetailStore(max_bytes=10 ** 9)
+    for id in range(5):
+        store.put("movie", id, _doc(id))
+    store.put("movie", 2, {"id": 2})
+    assert store._bytes == sum(size for _, size in _stored())
+
+
+def test_eviction_drops_the_least_recently_read_documents(db):
+    store = DetailStore(max_bytes=10 ** 9)
+    for id in range(3):
+        store.put("movie", id, _doc(id))
+    size = _stored()[0][1]
+    with transaction() as conn:
+        conn.executemany("UPDATE detail_doc SET accessed_at = ? WHERE id = ?", [(1, 1), (2, 0), (3, 2)])
+
+    store.max_bytes = size * 3.5
+    store.put("movie", 3, _doc(3))
+    assert [id for id, _ in _stored()] == [0, 2, 3]
+    assert store.evictions == 1
+    assert store._bytes == sum(size for _, size in _stored()) <= store.max_bytes
+
+
+def test_stale_document_is_served_then_refreshed(db):
+    store = DetailStore(max_age=0)
+    store.put("movie", 1, {"id": 1, "title": "Ancien"})
+    time.sleep(0.01)
+
+    assert store.get("movie", 1, lambda: {"id": 1, "title": "Nouveau"})["title"] == "Ancien"
+    deadline = time.monotonic() + 5
+    while not store.refreshes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.get("movie", 1, lambda: {"id": 1, "title": "Autre"})["title"] == "Nouveau"
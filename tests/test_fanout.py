@@ -0,0 +1,31 @@
+# tests/test_fanout.py
+import threading
+import time
+
+from app.fanout import fetch_all
+
+
+def test_results_and_defaults():
+    def fails():
+        raise RuntimeError("boom")
+
+    results = fetch_all({"a": lambda: 1, "b": fails, "genres": lambda: ["g"]}, defaults={"b": "default"})
+    assert results == {"a": 1, "b": "default", "genres": ["g"]}
+
+
+def test_the_last_call_runs_in_the_calling_thread():
+    caller = threading.get_ident()
+    results = fetch_all({"pooled": threading.get_ident, "inline": threading.get_ident})
+    assert results["inline"] == caller
+    assert results["pooled"] != caller
+
+
+def test_a_call_past_the_deadline_does_not_delay_the_next_request():
+    release = threading.Event()
+    start = time.perf_counter()
+    results = fetch_all({"slow": lambda: release.wait(5), "genres": list}, deadline=0.2, defaults={"slow": "late"})
+    assert results["slow"] == "late"
+    # The abandoned call still runs, but the next request gets threads of its own
+    assert fetch_all({"fast": lambda: "ok", "genres": list}, deadline=0.2)["fast"] == "ok"
+    assert time.perf_counter() - start < 1
+    release.set()
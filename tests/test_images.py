@@ -0,0 +1,21 @@
+# tests/test_images.py
+from app.breaker import OPEN, get_breaker
+from app.images import BREAKER_LABEL, image_cache
+
+
+def test_images_are_cached_then_redirected_while_the_breaker_is_open(client, fake_tmdb, tmp_path, monkeypatch):
+    _, _, base_url = fake_tmdb
+    monkeypatch.setattr(image_cache, "directory", str(tmp_path / "images"))
+    monkeypatch.setattr(image_cache, "origin", f"{base_url}/t/p")
+
+    response = client.get("/img/w185/movie1000.jpg")
+    assert response.status_code == 200
+    assert (tmp_path / "images" / "w185" / "movie1000.jpg").exists()
+
+    breaker = get_breaker(BREAKER_LABEL)
+    while breaker.state != OPEN:
+        breaker.record(False, 0.01, breaker.allow())
+    response = client.get("/img/w185/movie1001.jpg")
+    assert response.status_code == 302
+    assert response.headers["Location"] == f"{base_url}/t/p/w185/movie1001.jpg"
+    assert not (tmp_path / "images" / "w185" / "movie1001.jpg").exists()
@@ -0,0 +1,21 @@
+# tests/test_import.py
+import re
+
+from app.models import fill_db_from_tmdb, get_sync_state, media_counts
+
+
+def test_full_import_stops_at_the_last_listing_page(db, fake_tmdb):
+    # The fake catalogue lists 500 movies (25 pages) and 300 TV shows (15 pages)
+    stats = fill_db_from_tmdb(pages=50)
+    assert media_counts() == {"movie": 500, "tv": 300}
+    assert stats["pruned"] == 0
+    assert get_sync_state("watermark") is not None
+
+
+def test_a_failed_listing_neither_prunes_nor_moves_the_watermark(db, fake_tmdb):
+    _, faults, _ = fake_tmdb
+    faults.error_rate, faults.paths = 1.0, re.compile("tv")
+    stats = fill_db_from_tmdb(pages=2)
+    assert media_counts() == {"movie": 40}
+    assert stats["pruned"] == 0
+    assert get_sync_state("watermark") is None
@@ -0,0 +1,89 @@
+# tests/test_pagination.py
+import base64
+import json
+
+import pytest
+
+from app.database import connection
+from app.models import SEARCH_MAX_OFFSET, decode_cursor, fetch_medias_page, fill_db_from_tmdb, search_medias
+
+
+def _cursor(*values):
+    raw = json.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _walk(cursor_key, page):
+    pages = [page]
+    while page[cursor_key]:
+        page = fetch_medias_page("movie", cursor=page[cursor_key])
+        pages.append(page)
+    return pages
+
+
+def test_keyset_pages_cover_the_catalogue_once_in_order(db, fake_tmdb):
+    fill_db_from_tmdb(pages=3)
+    pages = _walk("next_cursor", fetch_medias_page("movie"))
+    ids = [media.id for page in pages for media in page["results"]]
+    assert len(pages) == 3
+    assert len(ids) == len(set(ids)) == 60
+    assert pages[0]["prev_cursor"] is None and pages[-1]["next_cursor"] is None
+
+    # Walking back from the last page gives the same pages
+    back = _walk("prev_cursor", pages[-1])
+    assert [[m.id for m in page["results"]] for page in reversed(back)] == [
+        [m.id for m in page["results"]] for page in pages
+    ]
+
+
+@pytest.mark.parametrize("cursor", [
+    _cursor(1.0, 2 ** 70, "next"),
+    _cursor(2 ** 70 * 1e300, 1, "next"),
+    _cursor(1.0, 1, "sideways"),
+    _cursor(1.0, True, "next"),
+    "not base64 at all!",
+])
+def test_bad_cursors_start_over(db, fake_tmdb, cursor):
+    fill_db_from_tmdb(pages=1)
+    assert fetch_medias_page("movie", cursor=cursor) == fetch_medias_page("movie")
+
+
+def test_search_pages_rank_title_matches_first_without_gaps(db, fake_tmdb):
+    fill_db_from_tmdb(pages=3)
+    expected = {id for id, in connection().execute(
+        "SELECT id FROM media WHERE media_type = 'movie' AND (title LIKE '%nuit%' OR overview LIKE '%nuit%')"
+    )}
+    pages = [search_medias("nuit", "movie")]
+    while pages[-1]["next_cursor"]:
+        pages.append(search_medias("nuit", "movie", cursor=pages[-1]["next_cursor"]))
+    results = [media for page in pages for media in page["results"]]
+    assert len(pages) > 1
+    assert [media.id for media in results] and len(results) == len({media.id for media in results})
+    assert {media.id for media in results} == expected
+
+    in_title = ["nuit" in media.title.lower() for media in results]
+    assert in_title == sorted(in_title, reverse=True)
+    assert search_medias("nuit", "movie", cursor=pages[1]["prev_cursor"]) == pages[0]
+
+
+@pytest.mark.parametrize("offset", [1e300, 2 ** 70, -5])
+def test_crafted_search_offsets_are_clamped(db, fake_tmdb, offset):
+    fill_db_from_tmdb(pages=1)
+    page = search_medias("nuit", "movie", cursor=_cursor(offset, 0, "next"))
+    if offset < 0:
+        assert page == search_medias("nuit", "movie")
+    else:
+        assert page["results"] == [] and page["next_cursor"] is None
+        assert decode_cursor(page["prev_cursor"])[0] == SEARCH_MAX_OFFSET - 20
+
+
+def test_routes_fall_back_to_the_first_local_page_on_a_bad_cursor(client, fake_tmdb):
+    _, faults, _ = fake_tmdb
+    fill_db_from_tmdb(pages=1)
+    faults.error_rate = 1.0
+    cursor = _cursor(1.0, 2 ** 70, "next")
+    assert client.get(f"/movies?cursor={cursor}").status_code == 200
+    api_cursor = _cursor("local", cursor)
+    response = client.get(f"/api/v1/movies?cursor={api_cursor}")
+    assert response.status_code == 200
+    assert response.get_json()["source"] == "local"
@@ -0,0 +1,6 @@
+# tests/test_query_plans.py
+from app.models import hot_queries
+
+
+def test_hot_queries_use_an_index(db):
+    db.check_query_plans(hot_queries())
@@ -0,0 +1,54 @@
+# tests/test_sync.py
+import re
+
+from app.database import connection
+from app.models import fill_db_from_tmdb, get_sync_state, sync_changes_from_tmdb
+
+
+def _top_movie_id():
+    return connection().execute(
+        "SELECT id FROM media WHERE media_type = 'movie' ORDER BY media_id LIMIT 1"
+    ).fetchone()[0]
+
+
+def _title(id):
+    row = connection().execute("SELECT title FROM media WHERE id = ? AND media_type = 'movie'", (id,)).fetchone()
+    return row[0] if row else None
+
+
+def test_sync_updates_the_changed_rows(db, fake_tmdb):
+    catalogue, _, _ = fake_tmdb
+    fill_db_from_tmdb(pages=2)
+    id = _top_movie_id()
+    catalogue.touch("movie", id, title="Titre modifié")
+
+    stats = sync_changes_from_tmdb()
+    assert stats["rows"] == 1
+    assert _title(id) == "Titre modifié"
+    assert get_sync_state("pending_watermark") is None
+
+
+def test_a_deleted_item_is_dropped_and_the_watermark_moves(db, fake_tmdb):
+    catalogue, _, _ = fake_tmdb
+    fill_db_from_tmdb(pages=2)
+    id = _top_movie_id()
+    catalogue.remove("movie", id)
+
+    stats = sync_changes_from_tmdb()
+    assert stats["removed"] == 1
+    assert _title(id) is None
+    assert connection().execute("SELECT COUNT(*) FROM sync_queue").fetchone()[0] == 0
+    assert get_sync_state("pending_watermark") is None
+
+
+def test_an_outage_fails_the_run_and_counts_the_attempt(db, fake_tmdb):
+    catalogue, faults, _ = fake_tmdb
+    fill_db_from_tmdb(pages=2)
+    id = _top_movie_id()
+    catalogue.touch("movie", id, title="Titre modifié")
+    # The change feeds answer, the detail calls do not
+    faults.error_rate, faults.paths = 1.0, re.compile(r"^/movie/\d+$")
+
+    assert sync_changes_from_tmdb() is None
+    assert connection().execute("SELECT attempts FROM sync_queue WHERE id = ?", (id,)).fetchone()[0] == 1
+    assert get_sync_state("pending_watermark") is not None
@@ -0,0 +1,39 @@
+# tests/test_towatch.py
+from app import database
+
+
+def test_item_without_vote_is_listed(client):
+    response = client.post("/to-watch/batch", json={"items": [
+        {"key": "a", "id": 42, "media_type": "movie", "title": "Sans note"},
+        {"key": "b", "id": 43, "media_type": "tv", "title": "Note vide", "vote_average": ""},
+        {"key": "c", "id": 44, "media_type": "movie", "title": "Note None", "vote_average": "None"},
+    ]})
+    assert response.status_code == 200
+    assert [result["status"] for result in response.get_json()["results"]] == ["added"] * 3
+
+    response = client.get("/to-watch")
+    assert response.status_code == 200
+    assert "Sans note" in response.get_data(as_text=True)
+
+
+def test_rows_stored_without_vote_still_render(client):
+    # Rows written before votes were defaulted have a NULL vote_average
+    with database.transaction() as conn:
+        conn.execute("INSERT INTO towatch (id, media_type, title) VALUES (7, 'movie', 'Ancienne ligne')")
+
+    response = client.get("/to-watch")
+    assert response.status_code == 200
+    assert "Ancienne ligne" in response.get_data(as_text=True)
+
+
+def test_out_of_range_values_only_invalidate_their_item(client):
+    response = client.post("/to-watch/batch", json={"items": [
+        {"key": "a", "id": 1e30, "media_type": "movie", "title": "Id flottant"},
+        {"key": "b", "id": 10 ** 30, "media_type": "movie", "title": "Id énorme"},
+        {"key": "c", "id": 45, "media_type": "movie", "title": "Note NaN", "vote_average": "nan"},
+        {"key": "d", "id": 46, "media_type": "movie", "title": "Note infinie", "vote_average": "inf"},
+        {"key": "e", "id": 47, "media_type": "movie", "title": "Note trop haute", "vote_average": 11},
+        {"key": "f", "id": 48, "media_type": "movie", "title": "Valide", "vote_average": 7.5},
+    ]})
+    assert response.status_code == 200
+    assert [result["status"] for result in response.get_json()["results"]] == ["invalid"] * 5 + ["added"]
@@ -0,0 +1,21 @@
+# tests/test_transport.py
+import time
+
+from app import transport
+
+
+def test_retried_errors_return_the_last_response(fake_tmdb):
+    _, faults, base_url = fake_tmdb
+    faults.error_rate = 1.0
+    response = transport.get(f"{base_url}/movie/popular", "/movie/popular")
+    assert response.status_code == 503
+    assert faults.stats["errors"] == transport.MAX_RETRIES + 1
+
+
+def test_a_stalled_call_stops_at_the_budget(fake_tmdb):
+    _, faults, base_url = fake_tmdb
+    faults.stall_rate, faults.stall = 1.0, 5.0
+    start = time.perf_counter()
+    response = transport.get(f"{base_url}/movie/popular", "/movie/popular", budget=1.0)
+    assert response is None
+    assert time.perf_counter() - start < 1.5
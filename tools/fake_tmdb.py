@@ -0,0 +1,436 @@
+# tools/fake_tmdb.py
+"""
+Local stand-in for the TMDB API, to run the app and the importer offline.
+
+    python -m tools.fake_tmdb --port 8001
+    TMDB_BASE_URL=http://127.0.0.1:8001 python run.py
+
+It serves a deterministic generated catalogue on the endpoints the app uses
+(discover, search, now_playing, details, genre lists and change feeds), and
+stands in for the image CDN under /t/p/<size>/<file>
+(TMDB_IMAGE_BASE_URL=http://127.0.0.1:8001/t/p).
+From Python, start_fake_tmdb() runs it in a background thread and returns
+the server, its catalogue and its base URL; catalogue.touch() edits an
+item and records it in the change feeds.
+
+Recorded responses can be replayed instead of the generated catalogue:
+
+    API_SECRET=... python -m tools.fake_tmdb --record fixtures/ --upstream https://api.themoviedb.org/3
+    python -m tools.fake_tmdb --fixtures fixtures/
+
+and latency and errors injected, e.g. 80 ms ± 40 ms with 5% of 503s on
+the listings:
+
+    python -m tools.fake_tmdb --latency 80 --jitter 40 --error-rate 0.05 --faults-path '^/(discover|search)/'
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import struct
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 20
+CHANGES_PAGE_SIZE = 100
+# Paramètres ignorés pour retrouver une réponse enregistrée (authentification, langue)
+IGNORED_PARAMS = {"api_key", "language"}
+# Réponses enregistrées par --record : listes, recherches, genres, puis les fiches des premiers résultats
+RECORD_PATHS = [
+    ("/discover/movie", {"sort_by": "popularity.desc", "page": "1"}),
+    ("/discover/movie", {"sort_by": "popularity.desc", "page": "2"}),
+    ("/discover/tv", {"sort_by": "popularity.desc", "page": "1"}),
+    ("/discover/tv", {"sort_by": "popularity.desc", "page": "2"}),
+    ("/movie/now_playing", {"page": "1"}),
+    ("/search/movie", {"query": "nuit", "page": "1"}),
+    ("/search/tv", {"query": "nuit", "page": "1"}),
+    ("/genre/movie/list", {}),
+    ("/genre/tv/list", {}),
+]
+RECORD_DETAILS = 5
+DETAIL_APPEND = {"movie": "credits,videos,similar,recommendations", "tv": "credits,videos,similar,recommendations,seasons"}
+# Largeur de l'image "original" renvoyée par le faux CDN (les vraies font souvent plusieurs Mo)
+ORIGINAL_WIDTH = 2000
+
+MOVIE_GENRES = [
+    {"id": 28, "name": "Action"}, {"id": 12, "name": "Aventure"}, {"id": 16, "name": "Animation"},
+    {"id": 35, "name": "Comédie"}, {"id": 80, "name": "Crime"}, {"id": 18, "name": "Drame"},
+    {"id": 14, "name": "Fantastique"}, {"id": 27, "name": "Horreur"}, {"id": 10749, "name": "Romance"},
+    {"id": 878, "name": "Science-Fiction"},
+]
+TV_GENRES = [
+    {"id": 10759, "name": "Action & Adventure"}, {"id": 16, "name": "Animation"}, {"id": 35, "name": "Comédie"},
+    {"id": 80, "name": "Crime"}, {"id": 18, "name": "Drame"}, {"id": 10765, "name": "Science-Fiction & Fantastique"},
+]
+WORDS = ["éclipse", "nuit", "océan", "mémoire", "cité", "étoile", "forêt", "silence", "héros", "voyage",
+         "ombre", "lumière", "révolte", "dernier", "premier", "secret", "empire", "rivière", "été", "hiver"]
+
+
+class FakeCatalogue:
+    """Deterministic movies and TV shows, plus a change log for the /changes feeds."""
+
+    def __init__(self, movies=500, tv=300, seed=42):
+        rng = random.Random(seed)
+        today = date.today()
+        self.lock = threading.Lock()
+        self.changes = []  # (UTC timestamp, media_type, id)
+        self.items = {"movie": {}, "tv": {}}
+        for media_type, count, genres, first_id in (("movie", movies, MOVIE_GENRES, 1000), ("tv", tv, TV_GENRES, 5000)):
+            for i in range(count):
+                id = first_id + i
+                title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).capitalize()
+                released = (today - timedelta(days=rng.randint(-30, 20 * 365))).isoformat()
+                item = {
+                    "id": id,
+                    "overview": f"{title} : " + " ".join(rng.choice(WORDS) for _ in range(30)),
+                    "poster_path": f"/{media_type}{id}.jpg",
+                    "backdrop_path": f"/{media_type}{id}_backdrop.jpg",
+                    "vote_average": round(rng.uniform(1, 9.5), 1),
+                    "vote_count": rng.randint(0, 20000),
+                    "popularity": round(rng.uniform(1, 5000), 3),
+                    "genre_ids": sorted({rng.choice(genres)["id"] for _ in range(rng.randint(1, 3))}),
+                    "original_language": "fr",
+                    "adult": False,
+                }
+                if media_type == "movie":
+                    item.update({"title": title, "original_title": title, "release_date": released})
+                else:
+                    item.update({"name": title, "original_name": title, "first_air_date": released})
+                self.items[media_type][id] = item
+
+    def touch(self, media_type, id, **fields):
+        """Edit an item and record the change for today's change feed."""
+        with self.lock:
+            self.items[media_type][id].update(fields)
+            self.changes.append((datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), media_type, id))
+
+    def remove(self, media_type, id):
+        """Delete an item (its detail becomes a 404) and record the change for today's change feed."""
+        with self.lock:
+            del self.items[media_type][id]
+            self.changes.append((datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), media_type, id))
+
+    def listing(self, media_type, query=None, genre_id=None, now_playing=False, since=None, until=None):
+        with self.lock:
+            items = list(self.items[media_type].values())
+        if query:
+            query = query.lower()
+            items = [item for item in items if query in (item.get("title") or item.get("name")).lower()]
+        if genre_id:
+            wanted = {int(genre) for genre in re.split(r"[,|]", genre_id) if genre}
+            items = [item for item in items if wanted & set(item["genre_ids"])]
+        if now_playing:
+            since, until = (date.today() - timedelta(days=45)).isoformat(), date.today().isoformat()
+        if since or until:
+            dated = "release_date" if media_type == "movie" else "first_air_date"
+            items = [item for item in items if (since or "") <= item[dated] <= (until or "9999")]
+        return sorted(items, key=lambda item: -item["popularity"])
+
+    def detail(self, media_type, id):
+        with self.lock:
+            item = self.items[media_type].get(id)
+        if item is None:
+            return None
+        genres = MOVIE_GENRES if media_type == "movie" else TV_GENRES
+        others = self.listing(media_type)[:20]
+        detail = dict(item)
+        detail.pop("genre_ids")
+        detail.update({
+            "genres": [genre for genre in genres if genre["id"] in item["genre_ids"]],
+            "tagline": "",
+            "status": "Released",
+            "credits": {
+                "cast": [
+                    {"id": id * 100 + n, "name": f"Acteur {n}", "character": f"Rôle {n}",
+                     "profile_path": f"/person{id}_{n}.jpg", "order": n}
+                    for n in range(30)
+                ],
+                "crew": [{"id": id * 100 + 99, "name": "Réalisateur", "job": "Director"}],
+            },
+            "videos": {"results": [{"key": f"yt{id}", "site": "YouTube", "type": "Trailer", "name": "Bande-annonce"}]},
+            "similar": {"page": 1, "results": others, "total_pages": 1},
+            "recommendations": {"page": 1, "results": others, "total_pages": 1},
+        })
+        if media_type == "movie":
+            detail["runtime"] = 90 + id % 60
+        else:
+            detail.update({
+                "number_of_seasons": 1 + id % 6,
+                "number_of_episodes": (1 + id % 6) * 10,
+                "networks": [{"id": 1, "name": "Fake Network"}],
+                "seasons": [
+                    {"id": id * 10 + n, "season_number": n, "name": f"Saison {n}", "episode_count": 10,
+                     "poster_path": f"/tv{id}_s{n}.jpg"}
+                    for n in range(1, 2 + id % 6)
+                ],
+            })
+        return detail
+
+    def changed(self, media_type, start_date, end_date):
+        # Bornes en date seule (journée entière) ou en horodatage UTC, comparées comme chaînes ISO
+        start = start_date if "T" in start_date else start_date + "T00:00:00Z"
+        end = end_date if "T" in end_date else end_date + "T23:59:59Z"
+        with self.lock:
+            ids = {id for moment, kind, id in self.changes if kind == media_type and start <= moment <= end}
+        return [{"id": id, "adult": False} for id in sorted(ids)]
+
+
+def fake_image(size, filename):
+    """
+    Plain-colour 8-bit BMP of the requested width (2:3 portrait), coloured from the file name.
+
+    Browsers display it whatever the extension, and its weight grows with
+    the width like real images do.
+    """
+    width = ORIGINAL_WIDTH if size == "original" else int(size[1:])
+    height = width * 3 // 2
+    row = (width + 3) & ~3
+    colour = hashlib.md5(filename.encode()).digest()[:3]
+    palette = bytes((colour[2], colour[1], colour[0], 0)) + bytes(4 * 255)
+    pixels = bytes(row * height)
+    offset = 14 + 40 + len(palette)
+    header = struct.pack("<2sIHHI", b"BM", offset + len(pixels), 0, 0, offset)
+    info = struct.pack("<IiiHHIIiiII", 40, width, height, 1, 8, 0, len(pixels), 2835, 2835, 256, 0)
+    return header + info + palette + pixels
+
+
+class Fixtures:
+    """
+    Recorded TMDB responses, one JSON file each ({"path", "params", "status", "body"}).
+
+    A request whose path and parameters (minus api_key and language) match
+    a fixture gets the recorded response; anything else falls through to
+    the generated catalogue.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.responses = {}
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".json"):
+                    with open(os.path.join(directory, name), encoding="utf-8") as f:
+                        fixture = json.load(f)
+                    self.responses[self.key(fixture["path"], fixture["params"])] = (fixture["status"], fixture["body"])
+
+    @staticmethod
+    def key(path, params):
+        return path, tuple(sorted((key, str(value)) for key, value in params.items() if key not in IGNORED_PARAMS))
+
+    def get(self, path, params):
+        """(status, body) recorded for this request, or None."""
+        return self.responses.get(self.key(path, params))
+
+    def save(self, path, params, status, body):
+        key = self.key(path, params)
+        self.responses[key] = (status, body)
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r"\W+", "_", path).strip("_") + "-" + hashlib.sha1(repr(key).encode()).hexdigest()[:10]
+        with open(os.path.join(self.directory, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump({"path": path, "params": dict(key[1]), "status": status, "body": body}, f, ensure_ascii=False)
+
+
+def record_fixtures(directory, upstream, headers=None, paths=RECORD_PATHS, details=RECORD_DETAILS):
+    """Fetch paths (then the details of the first results of each listing) from upstream into fixtures."""
+    import requests
+
+    fixtures = Fixtures(directory)
+    queue = list(paths)
+    seen = set()
+    while queue:
+        path, params = queue.pop(0)
+        key = Fixtures.key(path, params)
+        if key in seen:
+            continue
+        seen.add(key)
+        response = requests.get(upstream + path, params={"language": "fr-FR", **params}, headers=headers, timeout=10)
+        body = response.json()
+        fixtures.save(path, params, response.status_code, body)
+        print(f"{response.status_code} {path} {params}")
+        listing = re.fullmatch(r"/(discover|search)/(movie|tv)|/movie/now_playing", path)
+        if listing and response.status_code == 200:
+            media_type = listing.group(2) or "movie"
+            for item in body.get("results", [])[:details]:
+                queue.append((f"/{media_type}/{item['id']}", {"append_to_response": DETAIL_APPEND[media_type]}))
+    return fixtures
+
+
+class Faults:
+    """
+    Latency and error injection, on the requests whose path matches `paths` (a regex, all by default).
+
+    Every matching request waits latency ± jitter seconds. Then a share
+    error_rate of them gets an error_status response, and a share stall_rate
+    hangs for `stall` seconds (longer than the app's read timeout) before
+    answering. Draws come from a seeded generator, so runs can be replayed.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, stall_rate=0.0, stall=15.0,
+                 paths=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.paths = re.compile(paths) if paths else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"delayed": 0, "errors": 0, "stalls": 0}
+
+    def apply(self, path):
+        """Sleep as configured for this path. Returns the error status to answer with, or None."""
+        if self.paths is not None and not self.paths.search(path):
+            return None
+        with self._lock:
+            delay = max(self.latency + self._rng.uniform(-self.jitter, self.jitter), 0.0)
+            draw = self._rng.random()
+            stalled = draw < self.stall_rate
+            failed = not stalled and draw < self.stall_rate + self.error_rate
+            self.stats["delayed"] += bool(delay or stalled)
+            self.stats["stalls"] += stalled
+            self.stats["errors"] += failed
+        time.sleep(delay + (self.stall if stalled else 0))
+        return self.error_status if failed else None
+
+
+def _page(results, page, size=PAGE_SIZE, empty_pages=1):
+    # Les listes vides ont une page, les flux de changements vides aucune (comme TMDB)
+    total_pages = max((len(results) + size - 1) // size, empty_pages)
+    return {
+        "page": page,
+        "results": results[(page - 1) * size:page * size],
+        "total_pages": total_pages,
+        "total_results": len(results),
+    }
+
+
+class FakeTMDBHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    catalogue = None
+    fixtures = None
+    faults = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        args = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = re.sub(r"^/3", "", url.path)
+        page = int(args.get("page", 1))
+        catalogue = self.catalogue
+
+        if self.faults is not None:
+            status = self.faults.apply(path)
+            if status is not None:
+                return self._send(status, {"success": False, "status_code": 0, "status_message": "Injected error."})
+        if self.fixtures is not None:
+            recorded = self.fixtures.get(path, args)
+            if recorded is not None:
+                return self._send(*recorded)
+
+        image = re.fullmatch(r"/t/p/(w\d+|original)/([\w-]+\.\w+)", url.path)
+        if image:
+            return self._send_bytes(200, fake_image(*image.groups()), "image/bmp")
+
+        match = re.fullmatch(r"/(movie|tv)/(\d+)", path)
+        if re.fullmatch(r"/discover/(movie|tv)", path):
+            body = _page(catalogue.listing(path.split("/")[2], genre_id=args.get("with_genres"),
+                                           since=args.get("release_date.gte"), until=args.get("release_date.lte")), page)
+        elif re.fullmatch(r"/search/(movie|tv)", path):
+            body = _page(catalogue.listing(path.split("/")[2], query=args.get("query", "")), page)
+        elif path == "/movie/now_playing":
+            body = _page(catalogue.listing("movie", now_playing=True), page)
+        elif re.fullmatch(r"/genre/(movie|tv)/list", path):
+            body = {"genres": MOVIE_GENRES if "/movie/" in path else TV_GENRES}
+        elif re.fullmatch(r"/(movie|tv)/changes", path):
+            today = datetime.now(timezone.utc).date().isoformat()
+            changed = catalogue.changed(path.split("/")[1], args.get("start_date", today), args.get("end_date", today))
+            body = _page(changed, page, CHANGES_PAGE_SIZE, empty_pages=0)
+        elif match:
+            body = catalogue.detail(match.group(1), int(match.group(2)))
+            if body is None:
+                return self._send(404, {"success": False, "status_code": 34,
+                                        "status_message": "The resource you requested could not be found."})
+        else:
+            return self._send(404, {"success": False, "status_code": 34, "status_message": "Unknown endpoint."})
+        self._send(200, body)
+
+    def _send(self, status, body):
+        self._send_bytes(status, json.dumps(body).encode(), "application/json;charset=utf-8")
+
+    def _send_bytes(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _server(port, catalogue, fixtures, faults):
+    handler = type("Handler", (FakeTMDBHandler,), {"catalogue": catalogue, "fixtures": fixtures, "faults": faults})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_fake_tmdb(port=0, catalogue=None, fixtures=None, faults=None):
+    """Start the fake API in a daemon thread. Returns (server, catalogue, base_url)."""
+    catalogue = catalogue or FakeCatalogue()
+    server = _server(port, catalogue, fixtures, faults)
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-tmdb").start()
+    return server, catalogue, f"http://127.0.0.1:{server.server_port}"
+
+
+def add_fault_arguments(parser):
+    """Fault injection options, shared with the load generator."""
+    parser.add_argument("--latency", type=float, default=0, help="added latency per request (ms)")
+    parser.add_argument("--jitter", type=float, default=0, help="latency spread, ± (ms)")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--stall-rate", type=float, default=0, help="share of requests that hang past the read timeout")
+    parser.add_argument("--faults-path", help="only inject on paths matching this regex")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def faults_from_args(args):
+    """Faults configured by add_fault_arguments(), or None if none is."""
+    if not (args.latency or args.jitter or args.error_rate or args.stall_rate):
+        return None
+    return Faults(latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate,
+                  error_status=args.error_status, stall_rate=args.stall_rate, paths=args.faults_path, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the TMDB API.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--movies", type=int, default=500)
+    parser.add_argument("--tv", type=int, default=300)
+    parser.add_argument("--fixtures", help="directory of recorded responses to replay")
+    parser.add_argument("--record", metavar="DIRECTORY", help="record fixtures from --upstream and exit")
+    parser.add_argument("--upstream", default="https://api.themoviedb.org/3")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    if args.record:
+        headers = {"Authorization": f"Bearer {os.environ['API_SECRET']}"} if os.environ.get("API_SECRET") else None
+        fixtures = record_fixtures(args.record, args.upstream, headers)
+        print(f"{len(fixtures.responses)} fixtures in {args.record}")
+        return
+
+    catalogue = FakeCatalogue(movies=args.movies, tv=args.tv)
+    fixtures = Fixtures(args.fixtures) if args.fixtures else None
+    server = _server(args.port, catalogue, fixtures, faults_from_args(args))
+    print(f"Fake TMDB listening on http://127.0.0.1:{args.port}"
+          + (f" ({len(fixtures.responses)} fixtures)" if fixtures else ""))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()